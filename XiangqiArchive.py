@@ -0,0 +1,201 @@
+# Description: Contains classes for writing and reading compact binary archives of Xiangqi games.
+#              Each move is stored as two bytes, the from and to square numbers, so games can be replayed
+#              into XiangqiGame straight from a memory-mapped file without any string conversion.
+#
+#              Archive layout, all little-endian:
+#                  header:  magic b'XQAR', version (u16), flags (u16), game count (u32), index offset (u64)
+#                  games:   move count (u16), result (u8), reserved (u8), then 2 bytes per move
+#                  index:   the offset of each game (u64), starting at the index offset
+
+import argparse
+import mmap
+import struct
+import sys
+import time
+
+from XiangqiGame import XiangqiGame, location_to_square
+from XiangqiReplay import parse_game
+
+MAGIC = b'XQAR'
+VERSION = 1
+_HEADER = struct.Struct('<4sHHIQ')
+_GAME_HEADER = struct.Struct('<HBB')
+
+# Game results stored in each game header
+RESULTS = ('UNFINISHED', 'RED_WON', 'BLACK_WON', 'DRAW')
+
+
+class ArchiveWriter:
+
+    """
+    Class representing a binary game archive being written.
+    Use as a context manager, or call close, so the index gets written at the end.
+    """
+
+    def __init__(self, path):
+        """Creates an instance of an ArchiveWriter class that writes to the inputted path."""
+        self._file = open(path, 'wb')
+        self._offsets = []
+        self._file.write(_HEADER.pack(MAGIC, VERSION, 0, 0, 0))
+
+    def add_game(self, moves, result='UNFINISHED'):
+        """
+        Adds a game to the archive. Takes a list of (from_square, to_square) moves, which may also
+        be given as (current_pos, new_pos) locations, and the game state the game ended in.
+        """
+        data = bytearray()
+        for from_square, to_square in moves:
+            if isinstance(from_square, str):
+                from_square, to_square = location_to_square(from_square), location_to_square(to_square)
+            data += bytes((from_square, to_square))
+
+        self._offsets.append(self._file.tell())
+        self._file.write(_GAME_HEADER.pack(len(data) // 2, RESULTS.index(result), 0))
+        self._file.write(data)
+
+    def close(self):
+        """Writes the index and the final header and closes the file."""
+        if self._file.closed:
+            return
+        index_offset = self._file.tell()
+        self._file.write(struct.pack(f'<{len(self._offsets)}Q', *self._offsets))
+        self._file.seek(0)
+        self._file.write(_HEADER.pack(MAGIC, VERSION, 0, len(self._offsets), index_offset))
+        self._file.close()
+
+    def __enter__(self):
+        """Returns the writer for use in a with statement."""
+        return self
+
+    def __exit__(self, *exc_info):
+        """Closes the writer at the end of a with statement."""
+        self.close()
+
+
+class ArchiveReader:
+
+    """
+    Class representing a binary game archive opened for reading.
+    The file is memory-mapped, so games are read on demand and several processes reading the same
+    archive share its pages. Each game's moves are copied out as bytes, which are only a couple of
+    hundred bytes long, so the reader can be closed whatever games are still held.
+    """
+
+    def __init__(self, path):
+        """Creates an instance of an ArchiveReader class for the archive at the inputted path."""
+        with open(path, 'rb') as archive_file:
+            self._mmap = mmap.mmap(archive_file.fileno(), 0, access=mmap.ACCESS_READ)
+        self._view = memoryview(self._mmap)
+
+        magic, version, _, self._game_count, index_offset = _HEADER.unpack_from(self._view, 0)
+        if magic != MAGIC or version != VERSION:
+            self.close()
+            raise ValueError(f'{path} is not a version {VERSION} Xiangqi game archive')
+        self._index = self._view[index_offset:index_offset + 8 * self._game_count].cast('Q')
+
+    def __len__(self):
+        """Returns the number of games in the archive."""
+        return self._game_count
+
+    def get_game(self, number):
+        """
+        Takes a game number and returns its result and the bytes of its moves, which hold the
+        from and to square of each move in turn.
+        """
+        offset = self._index[number]
+        move_count, result, _ = _GAME_HEADER.unpack_from(self._view, offset)
+        start = offset + _GAME_HEADER.size
+        return RESULTS[result], self._mmap[start:start + 2 * move_count]
+
+    @staticmethod
+    def iter_moves(moves):
+        """Takes the bytes of a game's moves and yields its (from_square, to_square) pairs."""
+        return zip(moves[0::2], moves[1::2])
+
+    def __iter__(self):
+        """Yields the result and moves of every game in the archive in order."""
+        for number in range(self._game_count):
+            yield self.get_game(number)
+
+    def replay(self, number):
+        """Takes a game number and returns a XiangqiGame with its moves applied and the index of any illegal move."""
+        _, moves = self.get_game(number)
+        game = XiangqiGame()
+        return game, game.apply_square_moves(self.iter_moves(moves))
+
+    def close(self):
+        """Releases the memory mapping."""
+        self._index = None
+        self._view.release()
+        self._mmap.close()
+
+    def __enter__(self):
+        """Returns the reader for use in a with statement."""
+        return self
+
+    def __exit__(self, *exc_info):
+        """Closes the reader at the end of a with statement."""
+        self.close()
+
+
+def pack_command(args):
+    """Converts text game files into a binary archive, recording each game's final state."""
+    games = 0
+    with ArchiveWriter(args.archive) as writer:
+        for path in args.paths:
+            with open(path) as game_file:
+                for line in game_file:
+                    line = line.strip()
+                    if not line or line.startswith('#'):
+                        continue
+                    game = XiangqiGame()
+                    moves = parse_game(line)
+                    illegal_index = game.apply_moves(moves)
+                    if illegal_index is not None:
+                        moves = moves[:illegal_index]
+                    writer.add_game(moves, game.get_game_state())
+                    games += 1
+    print(f'packed {games} games into {args.archive}')
+    return 0
+
+
+def validate_command(args):
+    """Replays every game in a binary archive and reports any illegal moves and the throughput."""
+    start = time.perf_counter()
+    invalid = 0
+    with ArchiveReader(args.archive) as reader:
+        for number in range(len(reader)):
+            result, moves = reader.get_game(number)
+            game = XiangqiGame()
+            illegal_index = game.apply_square_moves(reader.iter_moves(moves))
+            if illegal_index is not None or game.get_game_state() != result:
+                print(f'game {number}: illegal move {illegal_index + 1}' if illegal_index is not None
+                      else f'game {number}: ended {game.get_game_state()}, recorded {result}')
+                invalid += 1
+        games = len(reader)
+
+    seconds = time.perf_counter() - start
+    print(f'{games} games, {invalid} invalid in {seconds:.2f} s ({games / seconds:,.1f} games/s)')
+    return 1 if invalid else 0
+
+
+def main(argv=None):
+    """Parses the command line and packs or validates an archive."""
+    parser = argparse.ArgumentParser(description='Write and read binary Xiangqi game archives.')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    pack_parser = commands.add_parser('pack', help='convert text game files into an archive')
+    pack_parser.add_argument('archive')
+    pack_parser.add_argument('paths', nargs='+', help='game files with one game per line')
+    pack_parser.set_defaults(run=pack_command)
+
+    validate_parser = commands.add_parser('validate', help='replay every game in an archive')
+    validate_parser.add_argument('archive')
+    validate_parser.set_defaults(run=validate_command)
+
+    args = parser.parse_args(argv)
+    return args.run(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,280 @@
+# Description: Contains functions that label many Xiangqi positions at once with NumPy.
+#              Boards are (N, 10, 9) int8 arrays holding the same piece codes as XiangqiGame.get_position,
+#              indexed by row then column from a1, and the side to move is 0 for red and 1 for black.
+#              Computes attack maps, in-check flags and pseudo-legal move counts for every position
+#              with whole-array operations, following the same rules and tables as XiangqiGame.
+
+import numpy as np
+
+from XiangqiGame import _MOVE_TABLES, _RAYS, _build_line_tables
+
+# Piece codes for red, with black codes 7 higher, as used by XiangqiGame.get_position
+GENERAL, ADVISOR, ELEPHANT, HORSE, CHARIOT, CANNON, SOLDIER = range(1, 8)
+
+# Steps as (row change, column change, blocking row change, blocking column change)
+_STEPS = {
+    GENERAL: [(1, 0, None, None), (-1, 0, None, None), (0, 1, None, None), (0, -1, None, None)],
+    ADVISOR: [(1, 1, None, None), (1, -1, None, None), (-1, 1, None, None), (-1, -1, None, None)],
+    ELEPHANT: [(2, 2, 1, 1), (2, -2, 1, -1), (-2, 2, -1, 1), (-2, -2, -1, -1)],
+    HORSE: [
+        (2, 1, 1, 0), (2, -1, 1, 0), (-2, 1, -1, 0), (-2, -1, -1, 0),
+        (1, 2, 0, 1), (-1, 2, 0, 1), (1, -2, 0, -1), (-1, -2, 0, -1)
+    ],
+}
+
+
+def _region(min_row, max_row, min_column, max_column):
+    """Returns a (10, 9, 1) mask of the squares within the inputted rows and columns, counted from 0."""
+    mask = np.zeros((10, 9, 1), dtype=bool)
+    mask[min_row:max_row + 1, min_column:max_column + 1] = True
+    return mask
+
+
+# Squares each piece may move onto, indexed by color (0 for red, 1 for black), with None
+# for pieces that may move anywhere on the board
+_PALACE = (_region(0, 2, 3, 5), _region(7, 9, 3, 5))
+_OWN_SIDE = (_region(0, 4, 0, 8), _region(5, 9, 0, 8))
+_DESTINATIONS = {GENERAL: _PALACE, ADVISOR: _PALACE, ELEPHANT: _OWN_SIDE, HORSE: (None, None)}
+# Squares where soldiers have crossed the river and can also move sideways
+_CROSSED = (_OWN_SIDE[1], _OWN_SIDE[0])
+
+# The game's sliding tables as (position on the line, occupancy of the line) arrays of the
+# chariot moves, cannon moves, cannon capture targets and cannon reach, for ranks of 9 and
+# files of 10 squares
+_RANK_TABLES = [np.array(table, dtype=np.uint16).reshape(9, 1 << 9) for table in _build_line_tables(9)]
+_FILE_TABLES = [np.array(table, dtype=np.uint16).reshape(10, 1 << 10) for table in _build_line_tables(10)]
+_RANK_BITS = (1 << np.arange(9, dtype=np.uint16))[None, :, None]
+_FILE_BITS = (1 << np.arange(10, dtype=np.uint16))[:, None, None]
+_POPCOUNT = np.array([bin(mask).count('1') for mask in range(1 << 10)], dtype=np.uint8)
+_ROW_INDEX = np.arange(10)[:, None, None]
+_COLUMN_INDEX = np.arange(9)[None, :, None]
+
+
+def _step_slices(rows, columns, block_rows=None, block_columns=None):
+    """
+    Returns index tuples for boards selecting the squares a step of the inputted rows and
+    columns can start from, the squares it lands on and, for blocked steps, the squares that
+    must be empty, each the same shape so they can be combined square by square.
+    """
+    source_rows = slice(max(-rows, 0), 10 + min(-rows, 0))
+    source_columns = slice(max(-columns, 0), 9 + min(-columns, 0))
+    destination = (slice(max(rows, 0), 10 + min(rows, 0)), slice(max(columns, 0), 9 + min(columns, 0)))
+    block = None
+    if block_rows is not None:
+        block = (
+            slice(source_rows.start + block_rows, source_rows.stop + block_rows),
+            slice(source_columns.start + block_columns, source_columns.stop + block_columns)
+        )
+    return (source_rows, source_columns), destination, block
+
+
+# Slices of every step of the stepping pieces, and of the soldiers' steps forward and sideways
+_STEP_SLICES = {code: [_step_slices(*step) for step in steps] for code, steps in _STEPS.items()}
+_SOLDIER_SLICES = (_step_slices(1, 0), _step_slices(-1, 0))
+_SIDEWAYS_SLICES = (_step_slices(0, 1), _step_slices(0, -1))
+
+
+def encode_positions(positions):
+    """
+    Takes an iterable of compact positions from XiangqiGame.get_position and returns the
+    (N, 10, 9) int8 board array and (N,) int8 side to move array used by evaluate_batch.
+    """
+    data = np.frombuffer(b''.join(positions), dtype=np.int8).reshape(-1, 91)
+    return data[:, :90].reshape(-1, 10, 9).copy(), data[:, 90].copy()
+
+
+def encode_games(games):
+    """Takes an iterable of XiangqiGame objects and returns their board and side to move arrays."""
+    return encode_positions(game.get_position() for game in games)
+
+
+def evaluate_batch(boards, sides, chunk_size=4096):
+    """
+    Takes an (N, 10, 9) int8 array of boards and an (N,) array of sides to move, and returns a
+    dictionary of NumPy arrays:
+        'attacks':   (N, 2, 10, 9) bool, the squares red (index 0) and black (index 1) pieces
+                     could capture on if an enemy piece stood there, not counting facing Generals
+        'in_check':  (N,) bool, whether the player to move is in check, as XiangqiGame.is_in_check
+        'mobility':  (N,) int32, the number of valid moves of the player to move's pieces before
+                     checking whether they leave the General in check, as in Piece.get_valid_moves
+    Every board must have one General of each color. Positions are worked through chunk_size
+    at a time, which keeps the working arrays small enough to stay in the CPU caches.
+    """
+    boards = np.asarray(boards, dtype=np.int8)
+    sides = np.asarray(sides, dtype=np.int8)
+    if boards.ndim != 3 or boards.shape[1:] != (10, 9) or sides.shape != boards.shape[:1]:
+        raise ValueError(f'Expected boards of shape (N, 10, 9) and sides of shape (N,), '
+                         f'got {boards.shape} and {sides.shape}')
+
+    count = len(boards)
+    result = {
+        'attacks': np.zeros((count, 2, 10, 9), dtype=bool),
+        'in_check': np.zeros(count, dtype=bool),
+        'mobility': np.zeros(count, dtype=np.int32),
+    }
+    for start in range(0, count, chunk_size):
+        chunk = slice(start, start + chunk_size)
+        attacks, in_check, mobility = _evaluate_chunk(boards[chunk], sides[chunk])
+        result['attacks'][chunk] = attacks
+        result['in_check'][chunk] = in_check
+        result['mobility'][chunk] = mobility
+    return result
+
+
+def _evaluate_chunk(boards, sides):
+    """
+    Evaluates a chunk of boards and returns its attack maps, in-check flags and move counts.
+    Works on the boards turned into (10, 9, N) arrays, so every operation on a square or a
+    slice of squares runs over all of the positions together.
+    """
+    count = len(boards)
+    positions = np.arange(count)
+    squares = boards.transpose(1, 2, 0).copy()
+    empty = squares == 0
+    colors = (~empty & (squares < 8), squares >= 8)
+    # Squares each color could move onto, which are the empty squares and the other color's
+    not_own = (empty | colors[1], empty | colors[0])
+    attacks = np.zeros((2, 10, 9, count), dtype=bool)
+    # Attacks on the other color's General, as XiangqiGame._general_attacked counts them
+    checks = np.zeros((2, 10, 9, count), dtype=bool)
+    mobility = np.zeros((2, count), dtype=np.int32)
+
+    # Occupancy of every rank and file as a mask, and of each color, for the sliding tables
+    rank_colors = [(own * _RANK_BITS).sum(axis=1, dtype=np.uint16) for own in colors]
+    file_colors = [(own * _FILE_BITS).sum(axis=0, dtype=np.uint16) for own in colors]
+    rank_occupancy = rank_colors[0] | rank_colors[1]
+    file_occupancy = file_colors[0] | file_colors[1]
+    # The four sliding tables looked up for a piece on every square of every board
+    rank_lines = [table[_COLUMN_INDEX, rank_occupancy[:, None, :]] for table in _RANK_TABLES]
+    file_lines = [table[_ROW_INDEX, file_occupancy[None, :, :]] for table in _FILE_TABLES]
+
+    for color in (0, 1):
+        enemy = 1 - color
+        offset = 7 * color
+        # Number of stepping pieces that reach each square, kept apart for the Horses and
+        # Soldiers as they are the only stepping pieces that can check a General
+        reached = np.zeros((10, 9, count), dtype=np.uint8)
+        checking = np.zeros((10, 9, count), dtype=np.uint8)
+
+        # Pieces that step, with an optional horse leg or elephant eye that must be empty
+        for code, slices in _STEP_SLICES.items():
+            pieces = squares == code + offset
+            counts = checking if code == HORSE else reached
+            destinations = _DESTINATIONS[code][color]
+            for source, destination, block in slices:
+                movable = pieces[source]
+                if block is not None:
+                    movable = movable & empty[block]
+                if destinations is not None:
+                    movable = movable & destinations[destination]
+                counts[destination] += movable
+
+        # Soldiers step forward, and sideways once they have crossed the river
+        soldiers = squares == SOLDIER + offset
+        source, destination, _ = _SOLDIER_SLICES[color]
+        checking[destination] += soldiers[source]
+        crossed = soldiers & _CROSSED[color]
+        for source, destination, _ in _SIDEWAYS_SLICES:
+            checking[destination] += crossed[source]
+
+        reached += checking
+        np.greater(reached, 0, out=attacks[color])
+        np.greater(checking, 0, out=checks[color])
+        mobility[color] = (reached * not_own[color]).sum(axis=(0, 1), dtype=np.int32)
+
+        # Chariots slide to the first piece, and cannons jump exactly one screen to capture the
+        # first piece behind it, both looked up by the occupancy of the piece's rank and file.
+        # A cannon attacks every empty square behind its screen as well as the piece it could
+        # capture, but only checks a General standing on the square of that piece
+        for code, table, reach_table in ((CHARIOT, 0, 0), (CANNON, 2, 3)):
+            pieces = squares == code + offset
+            rank_reach = np.where(pieces, rank_lines[table], 0)
+            file_reach = np.where(pieces, file_lines[table], 0)
+            targets = _line_squares(rank_reach, file_reach)
+            checks[color] |= targets
+            if reach_table == table:
+                attacks[color] |= targets
+            else:
+                attacks[color] |= _line_squares(
+                    np.where(pieces, rank_lines[reach_table], 0), np.where(pieces, file_lines[reach_table], 0)
+                )
+
+            # Chariots can move to any square they reach that isn't their own, and cannons
+            # capture enemy pieces on the squares they reach as well as sliding to empty squares
+            if code == CHARIOT:
+                rank_moves = rank_reach & ~rank_colors[color][:, None, :]
+                file_moves = file_reach & ~file_colors[color][None, :, :]
+            else:
+                rank_moves = (rank_reach & rank_colors[enemy][:, None, :]) | np.where(pieces, rank_lines[1], 0)
+                file_moves = (file_reach & file_colors[enemy][None, :, :]) | np.where(pieces, file_lines[1], 0)
+            mobility[color] += _POPCOUNT[rank_moves].sum(axis=(0, 1), dtype=np.int32)
+            mobility[color] += _POPCOUNT[file_moves].sum(axis=(0, 1), dtype=np.int32)
+
+    # The player to move is in check if their General is on a square the other color checks,
+    # or if the first piece along the file from it is the other General
+    sides = sides.astype(np.intp)
+    flat_boards = boards.reshape(count, 90)
+    general_codes = np.where(sides == 0, GENERAL, GENERAL + 7)[:, None]
+    rows, columns = np.divmod((flat_boards == general_codes).argmax(axis=1), 9)
+    enemy_rows, enemy_columns = np.divmod((flat_boards == 2 * GENERAL + 7 - general_codes).argmax(axis=1), 9)
+    facing = (
+        (columns == enemy_columns)
+        & (file_lines[0][rows, columns, positions] >> enemy_rows & 1).astype(bool)
+    )
+    in_check = checks[1 - sides, rows, columns, positions] | facing
+    return attacks.transpose(3, 0, 1, 2), in_check, mobility[sides, positions]
+
+
+def _line_squares(rank_reach, file_reach):
+    """
+    Takes (10, 9, N) arrays of the rank and file masks reached from each square and returns the
+    (10, 9, N) bool array of the squares reached from any of them.
+    """
+    return (
+        (np.bitwise_or.reduce(rank_reach, axis=1)[:, None, :] & _RANK_BITS).astype(bool)
+        | (np.bitwise_or.reduce(file_reach, axis=0)[None, :, :] & _FILE_BITS).astype(bool)
+    )
+
+
+def evaluate_games(games):
+    """Takes an iterable of XiangqiGame objects and returns evaluate_batch's results for their positions."""
+    return evaluate_batch(*encode_games(games))
+
+
+def check_game(game):
+    """
+    Returns the in-check flag and move count that evaluate_batch should give for a XiangqiGame,
+    worked out one position at a time with the game's own methods.
+    """
+    turn = game.get_turn()
+    mobility = sum(len(piece.get_valid_squares()) for piece in game.get_pieces() if piece.get_color() == turn)
+    return game.is_in_check(turn), mobility
+
+
+def check_attacks(game):
+    """
+    Returns the (2, 10, 9) bool attack map that evaluate_batch should give for a XiangqiGame,
+    worked out by walking each piece's move table or lines on the game's board.
+    """
+    attacks = np.zeros((2, 90), dtype=bool)
+    for piece in game.get_pieces():
+        rank = piece.get_rank()
+        square = piece.get_square()
+        attacked = attacks[0 if piece.get_color() == 'red' else 1]
+        if rank == 'Chariot' or rank == 'Cannon':
+            for ray in _RAYS[square]:
+                # Chariots reach up to the first piece, and cannons from past it up to the next one
+                screens = 0 if rank == 'Chariot' else 1
+                for current in ray:
+                    occupied = game.piece_at(current) is not None
+                    if screens == 0:
+                        attacked[current] = True
+                        if occupied:
+                            break
+                    elif occupied:
+                        screens -= 1
+        else:
+            for destination, block in _MOVE_TABLES[rank, piece.get_color()][square]:
+                if block is None or game.piece_at(block) is None:
+                    attacked[destination] = True
+    return attacks.reshape(2, 10, 9)
@@ -0,0 +1,377 @@
+# Description: Command line benchmarks and correctness checks for XiangqiGame.
+#              Contains a suite of perft positions with known node counts and a runner that reports
+#              nodes per second and per-phase timings for the move generator.
+#              Also measures how the parallel search scales with the number of worker processes,
+#              the memory held by live games and by each move made, and the NumPy batch labelling,
+#              profiles where make_move spends its time, and times game serialization round trips.
+
+import argparse
+import os
+import pickle
+import random
+import sys
+import time
+import tracemalloc
+
+from XiangqiEngine import XiangqiEngine, parallel_search
+from XiangqiGame import TABLE_BUILD_TIME, XiangqiGame
+from XiangqiProfile import GameProfiler, format_stats
+
+# Where the node counts of a suite position come from: published reference counts that other
+# engines agree on, or counts generated by this code, which only show that a change didn't alter
+# the move generator's results rather than that they are right
+PUBLISHED = 'published'
+GENERATED = 'generated'
+
+# Perft positions given either as FEN or as the moves played from the starting position, along
+# with the known node counts for depths 1, 2, 3, ... and their source
+PERFT_SUITE = {
+    'start': ('', [44, 1920, 79666, 3290240], PUBLISHED),
+    'published-2': (
+        'r1ba1a3/4kn3/2n1b4/pNp1p1p1p/4c4/6P2/P1P2R2P/1CcC5/9/2BAKAB2 w - - 0 1',
+        [38, 1128, 43929], PUBLISHED
+    ),
+    'published-3': (
+        '1cbak4/9/n2a5/2p1p3p/5cp2/2n2N3/6PCP/3AB4/2C6/3A1K1N1 w - - 0 1',
+        [7, 281, 8620, 326201], PUBLISHED
+    ),
+    'published-4': ('5a3/3k5/3aR4/9/5r3/5n3/9/3A1A3/5K3/2BC2B2 w - - 0 1', [25, 424, 9850, 202884], PUBLISHED),
+    'published-5': ('CRN1k1b2/3ca4/4ba3/9/2nr5/9/9/4B4/4A4/4KA3 w - - 0 1', [28, 516, 14808, 395483], PUBLISHED),
+    'published-6': ('R1N1k1b2/9/3aba3/9/2nr5/2B6/9/4B4/4A4/4KA3 w - - 0 1', [21, 364, 7626, 162837], PUBLISHED),
+    'published-7': ('C1nNk4/9/9/9/9/9/n1pp5/B3C4/9/3A1K3 w - - 0 1', [28, 222, 6241, 64971], PUBLISHED),
+    'published-8': ('4ka3/4a4/9/9/4N4/p8/9/4C3c/7n1/2BK5 w - - 0 1', [23, 345, 8124, 149272], PUBLISHED),
+    'published-9': ('2b1ka3/9/b3N4/4n4/9/9/9/4C4/2p6/2BK5 w - - 0 1', [21, 195, 3883, 48060], PUBLISHED),
+    'published-10': (
+        '1C2ka3/9/C1Nab1n2/p3p3p/6p2/9/P3P3P/3AB4/3p2c2/c1BAK4 w - - 0 1',
+        [30, 830, 22787, 649866], PUBLISHED
+    ),
+    'published-11': (
+        'CnN1k1b2/c3a4/4ba3/9/2nr5/9/9/4C4/4A4/4KA3 w - - 0 1',
+        [19, 583, 11714, 376467], PUBLISHED
+    ),
+    'central-cannon': (
+        'h3-e3 h10-g8 h1-g3 i10-h10 i1-h1 b10-c8',
+        [37, 1292, 49161], GENERATED
+    ),
+    'cannon-raid': (
+        'b3-b10 a10-a9 b10-a10 i10-i9 h3-h10 i9-h9',
+        [26, 1273, 35540], GENERATED
+    ),
+    'middlegame': (
+        'h3-e3 h10-g8 h1-g3 g7-g6 i1-h1 i10-h10 g4-g5 g6-g5 e3-e7 b10-c8 e7-e5 g8-f6 e5-e6 f6-e4',
+        [49, 1955, 91557], GENERATED
+    ),
+    'check-evasion': (
+        'b3-b4 h8-c8 h3-b3 h10-i8 b3-e3 g7-g6 c4-c5 c10-a8 e1-e2 g6-g5 a4-a5 b8-b5 b4-b10',
+        [5, 163, 5498], GENERATED
+    ),
+    'chariot-endgame': ('4k4/9/9/9/9/9/9/9/9/3K4R w - - 0 1', [14, 24, 421, 883], GENERATED),
+    'horse-soldier': ('3ak4/4a4/9/9/4P4/9/9/4N4/9/4K4 w - - 0 1', [14, 55, 571, 2120], GENERATED),
+    'cannon-screens': ('2bak4/4a4/4b4/9/2c1C4/9/4R4/9/4A4/3AK4 b - - 0 1', [13, 284, 4729, 130445], GENERATED),
+}
+
+
+def setup_position(name, **options):
+    """Takes the name of a suite position and returns a XiangqiGame set up at that position."""
+    setup = PERFT_SUITE[name][0]
+    if '/' in setup:
+        return XiangqiGame.from_fen(setup, **options)
+
+    game = XiangqiGame(**options)
+    for move in setup.split():
+        if not game.make_move(*move.split('-')):
+            raise ValueError(f'Illegal move {move} in perft position {name}')
+    return game
+
+
+def run_perft(name, depth, divide=False, **options):
+    """
+    Takes the name of a suite position and a maximum depth and runs perft at every depth up to it.
+    Returns a list of dictionaries with the depth, nodes, expected nodes, seconds and nodes per second.
+    """
+    _, expected, source = PERFT_SUITE[name]
+    start = time.perf_counter()
+    game = setup_position(name, **options)
+    setup_time = time.perf_counter() - start
+    print(f'{name} ({source} counts): setup {setup_time * 1000:.2f} ms')
+
+    results = []
+    for current_depth in range(1, depth + 1):
+        start = time.perf_counter()
+        if divide and current_depth == depth:
+            counts = game.divide(current_depth)
+            nodes = sum(counts.values())
+        else:
+            nodes = game.perft(current_depth)
+        seconds = time.perf_counter() - start
+
+        known = expected[current_depth - 1] if current_depth <= len(expected) else None
+        results.append({
+            'depth': current_depth, 'nodes': nodes, 'expected': known,
+            'seconds': seconds, 'nps': nodes / seconds if seconds else 0.0
+        })
+        status = '' if known is None else ('ok' if nodes == known else f'FAILED, expected {known}')
+        print(f'  depth {current_depth}: {nodes} nodes in {seconds:.3f} s '
+              f'({results[-1]["nps"]:,.0f} nodes/s) {status}')
+
+    if divide:
+        for (current_pos, new_pos), nodes in sorted(counts.items()):
+            print(f'    {current_pos}-{new_pos}: {nodes}')
+    return results
+
+
+def perft_command(args):
+    """Runs the perft suite from the parsed command line arguments and returns the exit status."""
+    print(f'move tables built in {TABLE_BUILD_TIME * 1000:.2f} ms')
+    names = PERFT_SUITE if args.position == 'all' else [args.position]
+    failed = False
+    total_nodes = 0
+    total_seconds = 0.0
+    for name in names:
+        for result in run_perft(name, args.depth, args.divide, bitboards=args.bitboards):
+            failed = failed or (result['expected'] is not None and result['nodes'] != result['expected'])
+            total_nodes += result['nodes']
+            total_seconds += result['seconds']
+
+    if total_seconds:
+        print(f'total: {total_nodes} nodes in {total_seconds:.3f} s '
+              f'({total_nodes / total_seconds:,.0f} nodes/s)')
+    return 1 if failed else 0
+
+
+def parallel_command(args):
+    """
+    Searches a suite position to a fixed depth with one process and then with the parallel search
+    at increasing worker counts, reporting the time and speedup of each.
+    """
+    game = setup_position(args.position)
+    print(f'{args.position}: fixed depth {args.depth}, {os.cpu_count()} cpus available')
+
+    result = XiangqiEngine(game).search(max_depth=args.depth)
+    serial_seconds = result['seconds']
+    print(f'  serial: {result["move"]} score {result["score"]}, {result["nodes"]} nodes '
+          f'in {serial_seconds:.2f} s')
+
+    workers = 1
+    while workers <= args.workers:
+        result = parallel_search(game, args.depth, workers)
+        print(f'  {workers} workers: {result["move"]} score {result["score"]}, {result["nodes"]} nodes '
+              f'in {result["seconds"]:.2f} s, speedup {serial_seconds / result["seconds"]:.2f}x')
+        workers *= 2
+    return 0
+
+
+def _traced_memory():
+    """Returns the bytes and number of memory blocks currently traced by tracemalloc."""
+    statistics = tracemalloc.take_snapshot().statistics('filename')
+    return sum(stat.size for stat in statistics), sum(stat.count for stat in statistics)
+
+
+def memory_command(args):
+    """
+    Measures the bytes and memory blocks held by each live game in the starting position and
+    kept for each move made, including its undo record, over random games.
+    """
+    rng = random.Random(args.seed)
+    tracemalloc.start()
+
+    base_bytes, base_blocks = _traced_memory()
+    games = [XiangqiGame() for _ in range(args.games)]
+    game_bytes, game_blocks = _traced_memory()
+    print(f'live game: {(game_bytes - base_bytes) / args.games:,.0f} bytes, '
+          f'{(game_blocks - base_blocks) / args.games:,.1f} blocks')
+
+    # Play random moves in every game without undoing them so the undo records stay alive
+    moves_made = 0
+    start = time.perf_counter()
+    for game in games:
+        for _ in range(args.moves):
+            moves = list(game.legal_square_moves())
+            if not moves:
+                break
+            game.push_move(*rng.choice(moves))
+            moves_made += 1
+    seconds = time.perf_counter() - start
+    moves_bytes, moves_blocks = _traced_memory()
+    tracemalloc.stop()
+
+    print(f'per move: {(moves_bytes - game_bytes) / moves_made:,.0f} bytes, '
+          f'{(moves_blocks - game_blocks) / moves_made:,.1f} blocks kept over {moves_made} moves '
+          f'({moves_made / seconds:,.0f} moves/s traced)')
+    return 0
+
+
+def random_positions(count, seed, max_moves=150):
+    """Returns a list of count games, each set up by playing random legal moves from the start."""
+    rng = random.Random(seed)
+    games = []
+    while len(games) < count:
+        game = XiangqiGame()
+        for _ in range(rng.randint(0, max_moves)):
+            moves = list(game.legal_square_moves())
+            if not moves:
+                break
+            game.push_move(*rng.choice(moves))
+        games.append(game)
+    return games
+
+
+def batch_command(args):
+    """
+    Labels random positions with the NumPy batch functions and one game at a time, checking that
+    the attack maps, in-check flags and move counts agree and reporting the positions per second of each.
+    """
+    # NumPy is only needed for this benchmark
+    import numpy as np
+    from XiangqiBatch import check_attacks, check_game, encode_positions, evaluate_batch
+
+    games = random_positions(args.positions, args.seed)
+    positions = [game.get_position() for game in games] * args.repeat
+
+    start = time.perf_counter()
+    boards, sides = encode_positions(positions)
+    result = evaluate_batch(boards, sides)
+    batch_seconds = time.perf_counter() - start
+
+    # Labelling one at a time from the same compact positions means building a game for each
+    start = time.perf_counter()
+    for position in positions[:len(games)]:
+        check_game(XiangqiGame(position=position))
+    single_seconds = time.perf_counter() - start
+
+    mismatches = 0
+    for index, game in enumerate(games):
+        if (
+            check_game(game) != (result['in_check'][index], result['mobility'][index])
+            or not np.array_equal(check_attacks(game), result['attacks'][index])
+        ):
+            print(f'  mismatch: {game.to_fen()}')
+            mismatches += 1
+
+    batch_rate = len(positions) / batch_seconds
+    single_rate = len(games) / single_seconds
+    print(f'batch: {len(positions)} positions in {batch_seconds:.2f} s ({batch_rate:,.0f} positions/s)')
+    print(f'one at a time: {len(games)} positions in {single_seconds:.2f} s ({single_rate:,.0f} positions/s)')
+    print(f'speedup {batch_rate / single_rate:.1f}x, {mismatches} mismatches, '
+          f'{int(result["in_check"][:len(games)].sum())} in check')
+    return 1 if mismatches else 0
+
+
+def profile_command(args):
+    """
+    Plays random games with profiling enabled and prints the calls and time spent in each
+    profiled method, then plays the same games unprofiled to show the profiling overhead.
+    """
+    profiler = GameProfiler()
+    seconds = {}
+    for profiled in (True, False):
+        rng = random.Random(args.seed)
+        start = time.perf_counter()
+        for _ in range(args.games):
+            game = XiangqiGame()
+            if profiled:
+                game.enable_profiling(profiler=profiler)
+            for _ in range(args.moves):
+                if game.get_game_state() != 'UNFINISHED':
+                    break
+                game.make_move(*rng.choice(list(game.legal_moves())))
+        seconds[profiled] = time.perf_counter() - start
+
+    print(format_stats(profiler.snapshot()))
+    print(f'{args.games} games in {seconds[True]:.2f} s profiled, {seconds[False]:.2f} s unprofiled '
+          f'({seconds[True] / seconds[False] - 1:+.0%} overhead)')
+    return 0
+
+
+def _time_per_game(function, games, repeat):
+    """Returns the microseconds function takes per game, calling it on every game repeat times."""
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for game in games:
+            function(game)
+    return (time.perf_counter() - start) / (repeat * len(games)) * 1e6
+
+
+def serialize_command(args):
+    """
+    Measures the size and round trip time of random games as plain bytes, as bytes with their
+    move history and as pickles with and without it, compared with pickling a game's full attributes.
+    """
+    games = random_positions(args.games, args.seed, args.moves)
+    # The same games again, as clones can't undo the moves made before cloning
+    history_games = random_positions(args.games, args.seed, args.moves)
+    for game in history_games:
+        game.pickle_history = True
+    plain = [game.to_bytes() for game in games]
+    with_history = [game.to_bytes(history=True) for game in games]
+    pickled = [pickle.dumps(game) for game in games]
+    pickled_history = [pickle.dumps(game) for game in history_games]
+    attributes = [pickle.dumps(vars(game)) for game in games]
+
+    rows = [
+        ('bytes', plain, lambda game: XiangqiGame.from_bytes(game.to_bytes())),
+        ('bytes, moves used', plain, lambda game: next(XiangqiGame.from_bytes(game.to_bytes()).legal_moves(), None)),
+        ('bytes with history', with_history, lambda game: XiangqiGame.from_bytes(game.to_bytes(history=True))),
+        ('pickle', pickled, lambda game: pickle.loads(pickle.dumps(game))),
+        ('pickle with history', pickled_history, lambda game: pickle.loads(pickle.dumps(game))),
+        ('pickle of attributes', attributes, lambda game: pickle.loads(pickle.dumps(vars(game)))),
+    ]
+    moves = sum(len(game.get_hash_history()) - 1 for game in games)
+    print(f'{len(games)} games of up to {args.moves} moves, {moves} moves')
+    for name, data, round_trip in rows:
+        timed_games = history_games if data is pickled_history else games
+        print(f'{name:<22} {sum(map(len, data)) / len(data):>8,.0f} bytes '
+              f'{_time_per_game(round_trip, timed_games, args.repeat):>9,.1f} us round trip')
+    return 0
+
+
+def main(argv=None):
+    """Parses the command line and runs the chosen benchmark."""
+    parser = argparse.ArgumentParser(description='Benchmarks and correctness checks for XiangqiGame.')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    perft_parser = commands.add_parser('perft', help='count move tree nodes for the perft suite')
+    perft_parser.add_argument('--position', default='all', choices=['all', *PERFT_SUITE])
+    perft_parser.add_argument('--depth', type=int, default=3)
+    perft_parser.add_argument('--divide', action='store_true', help='print counts for each root move')
+    perft_parser.add_argument('--bitboards', action='store_true', help='use bitboard sliding moves')
+    perft_parser.set_defaults(run=perft_command)
+
+    parallel_parser = commands.add_parser('parallel', help='measure parallel search scaling')
+    parallel_parser.add_argument('--position', default='central-cannon', choices=list(PERFT_SUITE))
+    parallel_parser.add_argument('--depth', type=int, default=3)
+    parallel_parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                                 help='largest number of worker processes to try')
+    parallel_parser.set_defaults(run=parallel_command)
+
+    memory_parser = commands.add_parser('memory', help='measure memory per live game and per move')
+    memory_parser.add_argument('--games', type=int, default=200)
+    memory_parser.add_argument('--moves', type=int, default=100, help='random moves played in each game')
+    memory_parser.add_argument('--seed', type=int, default=1)
+    memory_parser.set_defaults(run=memory_command)
+
+    batch_parser = commands.add_parser('batch', help='compare NumPy batch labelling with one game at a time')
+    batch_parser.add_argument('--positions', type=int, default=2000, help='random positions to check')
+    batch_parser.add_argument('--repeat', type=int, default=50, help='copies of them labelled by the batch')
+    batch_parser.add_argument('--seed', type=int, default=1)
+    batch_parser.set_defaults(run=batch_command)
+
+    profile_parser = commands.add_parser('profile', help='profile make_move over random games')
+    profile_parser.add_argument('--games', type=int, default=20)
+    profile_parser.add_argument('--moves', type=int, default=150, help='most random moves played in each game')
+    profile_parser.add_argument('--seed', type=int, default=1)
+    profile_parser.set_defaults(run=profile_command)
+
+    serialize_parser = commands.add_parser('serialize', help='measure game serialization size and round trips')
+    serialize_parser.add_argument('--games', type=int, default=200)
+    serialize_parser.add_argument('--moves', type=int, default=60, help='most random moves played in each game')
+    serialize_parser.add_argument('--repeat', type=int, default=5, help='round trips timed for each game')
+    serialize_parser.add_argument('--seed', type=int, default=1)
+    serialize_parser.set_defaults(run=serialize_command)
+
+    args = parser.parse_args(argv)
+    return args.run(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
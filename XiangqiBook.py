@@ -0,0 +1,242 @@
+# Description: Contains a class for an opening book of Xiangqi moves keyed by position hash, and the
+#              functions that build one from recorded games.
+#              The book file is memory-mapped, so every process using it shares the same pages and
+#              opening it costs nothing up front, and positions are found by binary search.
+#
+#              Book layout, all little-endian:
+#                  header:   magic b'XQBK', version (u16), flags (u16), entry count (u32), max plies (u32)
+#                  keys:     the position hash of each entry (u64), sorted
+#                  entries:  count (u32), weight (u32), from square (u8), to square (u8), padding (u16)
+#              Entries for the same position are next to each other, heaviest first.
+
+import argparse
+import bisect
+import mmap
+import struct
+import sys
+import time
+
+from XiangqiArchive import MAGIC as ARCHIVE_MAGIC, ArchiveReader
+from XiangqiGame import XiangqiGame, location_to_square, square_to_location
+from XiangqiReplay import parse_game
+
+MAGIC = b'XQBK'
+VERSION = 1
+_HEADER = struct.Struct('<4sHHII')
+_ENTRY = struct.Struct('<IIBBxx')
+
+# Points a move earns for the player who made it from the way the game ended, counted in half
+# points so a draw or an unfinished game is worth 1 and a win 2
+_POINTS = {
+    ('red', 'RED_WON'): 2, ('black', 'BLACK_WON'): 2,
+    ('red', 'BLACK_WON'): 0, ('black', 'RED_WON'): 0,
+}
+
+
+class OpeningBook:
+
+    """
+    Class representing an opening book file opened for lookups.
+    The file is memory-mapped and its sorted keys are searched in place, so opening a book
+    reads nothing and looking up a position takes a few microseconds.
+    """
+
+    def __init__(self, path):
+        """Creates an instance of an OpeningBook class for the book at the inputted path."""
+        with open(path, 'rb') as book_file:
+            self._mmap = mmap.mmap(book_file.fileno(), 0, access=mmap.ACCESS_READ)
+        self._view = memoryview(self._mmap)
+
+        magic, version, _, self._entry_count, self._max_plies = _HEADER.unpack_from(self._view, 0)
+        if magic != MAGIC or version != VERSION:
+            self.close()
+            raise ValueError(f'{path} is not a version {VERSION} Xiangqi opening book')
+        keys_end = _HEADER.size + 8 * self._entry_count
+        self._keys = self._view[_HEADER.size:keys_end].cast('Q')
+        self._entries_offset = keys_end
+
+    def __len__(self):
+        """Returns the number of position and move entries in the book."""
+        return self._entry_count
+
+    def get_max_plies(self):
+        """Returns the number of plies from the start of each game that the book was built from."""
+        return self._max_plies
+
+    def probe(self, position_hash):
+        """
+        Takes a position hash and returns a list of (from_square, to_square, count, weight) for
+        every book move from that position, heaviest first, or an empty list if it isn't in the book.
+        """
+        keys = self._keys
+        index = bisect.bisect_left(keys, position_hash)
+        moves = []
+        while index < self._entry_count and keys[index] == position_hash:
+            count, weight, from_square, to_square = _ENTRY.unpack_from(
+                self._view, self._entries_offset + index * _ENTRY.size)
+            moves.append((from_square, to_square, count, weight))
+            index += 1
+        return moves
+
+    def get_moves(self, game):
+        """Returns a list of ((current_pos, new_pos), count, weight) for the book moves in a game's position."""
+        return [
+            ((square_to_location(from_square), square_to_location(to_square)), count, weight)
+            for from_square, to_square, count, weight in self.probe(game.position_hash())
+        ]
+
+    def choose_move(self, game, rng=None):
+        """
+        Returns a book move as a (from_square, to_square) pair for the player to move in a game,
+        or None if the position isn't in the book. Takes the heaviest move, or picks one at random
+        in proportion to the weights if a random.Random is given. Moves that aren't valid in the
+        game, which could only come from two positions sharing a hash, are skipped.
+        """
+        turn = game.get_turn()
+        moves = []
+        for from_square, to_square, _, weight in self.probe(game.position_hash()):
+            piece = game.piece_at(from_square)
+            if weight and piece and piece.get_color() == turn and to_square in piece.get_valid_squares():
+                moves.append(((from_square, to_square), weight))
+        if not moves:
+            return None
+        if rng is None:
+            return moves[0][0]
+        return rng.choices([move for move, _ in moves], [weight for _, weight in moves])[0]
+
+    def close(self):
+        """Releases the memory mapping."""
+        self._keys = None
+        self._view.release()
+        self._mmap.close()
+
+    def __enter__(self):
+        """Returns the book for use in a with statement."""
+        return self
+
+    def __exit__(self, *exc_info):
+        """Closes the book at the end of a with statement."""
+        self.close()
+
+
+def read_games(paths):
+    """
+    Yields (moves, result) for every game in the inputted game archives and text game files,
+    with moves as (from_square, to_square) pairs. Text games are replayed to find their result.
+    """
+    for path in paths:
+        with open(path, 'rb') as game_file:
+            is_archive = game_file.read(len(ARCHIVE_MAGIC)) == ARCHIVE_MAGIC
+
+        if is_archive:
+            with ArchiveReader(path) as reader:
+                for result, moves in reader:
+                    yield list(reader.iter_moves(moves)), result
+            continue
+
+        with open(path) as game_file:
+            for line in game_file:
+                line = line.strip()
+                if not line or line.startswith('#'):
+                    continue
+                game = XiangqiGame()
+                moves = parse_game(line)
+                illegal_index = game.apply_moves(moves)
+                if illegal_index is not None:
+                    moves = moves[:illegal_index]
+                yield [(location_to_square(current_pos), location_to_square(new_pos))
+                       for current_pos, new_pos in moves], game.get_game_state()
+
+
+def build_book(paths, output, max_plies=20, min_count=2):
+    """
+    Builds an opening book from the games in the inputted archives and game files, counting every
+    move made in the first max_plies plies of each game from its position and weighting it by the
+    points the player who made it went on to score. Moves made fewer than min_count times are left
+    out. Writes the book to output and returns the number of games and entries.
+    """
+    # Count and weight of each (position hash, from square, to square)
+    totals = {}
+    games = 0
+    for moves, result in read_games(paths):
+        games += 1
+        game = XiangqiGame()
+        for from_square, to_square in moves[:max_plies]:
+            position_hash = game.position_hash()
+            points = _POINTS.get((game.get_turn(), result), 1)
+            if game.apply_square_moves([(from_square, to_square)]) is not None:
+                break
+            total = totals.setdefault((position_hash, from_square, to_square), [0, 0])
+            total[0] += 1
+            total[1] += points
+
+    # Sort by position, then heaviest and most played first
+    entries = sorted(
+        (
+            (position_hash, from_square, to_square, count, weight)
+            for (position_hash, from_square, to_square), (count, weight) in totals.items()
+            if count >= min_count
+        ),
+        key=lambda entry: (entry[0], -entry[4], -entry[3])
+    )
+    with open(output, 'wb') as book_file:
+        book_file.write(_HEADER.pack(MAGIC, VERSION, 0, len(entries), max_plies))
+        book_file.write(struct.pack(f'<{len(entries)}Q', *(entry[0] for entry in entries)))
+        for _, from_square, to_square, count, weight in entries:
+            book_file.write(_ENTRY.pack(min(count, 0xffffffff), min(weight, 0xffffffff), from_square, to_square))
+    return games, len(entries)
+
+
+def build_command(args):
+    """Builds a book from the parsed command line arguments."""
+    start = time.perf_counter()
+    games, entries = build_book(args.paths, args.book, args.plies, args.min_count)
+    print(f'{entries} entries from {games} games written to {args.book} '
+          f'in {time.perf_counter() - start:.2f} s')
+    return 0
+
+
+def probe_command(args):
+    """Prints the book moves for the position after the inputted moves and times the lookup."""
+    game = XiangqiGame()
+    for move in args.moves:
+        positions = move.split('-')
+        if len(positions) != 2 or not game.make_move(*positions):
+            raise ValueError(f'Illegal move {move}')
+
+    with OpeningBook(args.book) as book:
+        for (current_pos, new_pos), count, weight in book.get_moves(game):
+            print(f'{current_pos}-{new_pos}: played {count} times, weight {weight}')
+
+        position_hash = game.position_hash()
+        start = time.perf_counter()
+        for _ in range(args.repeat):
+            book.probe(position_hash)
+        print(f'{len(book)} entries, lookup {(time.perf_counter() - start) / args.repeat * 1e6:.2f} us')
+    return 0
+
+
+def main(argv=None):
+    """Parses the command line and builds or probes an opening book."""
+    parser = argparse.ArgumentParser(description='Build and probe Xiangqi opening books.')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    build_parser = commands.add_parser('build', help='build a book from game archives or game files')
+    build_parser.add_argument('book')
+    build_parser.add_argument('paths', nargs='+', help='binary game archives or text game files')
+    build_parser.add_argument('--plies', type=int, default=20, help='plies from the start of each game to use')
+    build_parser.add_argument('--min-count', type=int, default=2, help='fewest times a move must be played')
+    build_parser.set_defaults(run=build_command)
+
+    probe_parser = commands.add_parser('probe', help='print the book moves for a position')
+    probe_parser.add_argument('book')
+    probe_parser.add_argument('moves', nargs='*', help='moves from the starting position such as h3-e3')
+    probe_parser.add_argument('--repeat', type=int, default=100000, help='lookups to time')
+    probe_parser.set_defaults(run=probe_command)
+
+    args = parser.parse_args(argv)
+    return args.run(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
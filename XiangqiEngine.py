@@ -0,0 +1,450 @@
+# Description: Contains a class for an alpha-beta search engine that picks moves for a XiangqiGame.
+#              The engine searches with iterative deepening under a time or node budget, using the
+#              game's own move generation and check detection.
+#              Contains a fixed-size transposition table for storing search results by position hash.
+#              Contains a parallel search that splits the root moves across a pool of processes.
+
+import os
+import time
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+
+from XiangqiGame import XiangqiGame, square_to_location
+
+# Score for delivering checkmate, reduced by the number of plies it takes
+MATE_SCORE = 100000
+
+# Bound types stored with transposition table scores
+EXACT = 0
+LOWER_BOUND = 1
+UPPER_BOUND = 2
+
+
+class TranspositionTable:
+
+    """
+    Class representing a fixed-size table of search results keyed by position hash.
+    Each entry takes 16 bytes, a 64-bit key plus a 64-bit packed depth, bound, score and best move,
+    held in two typed arrays so the memory used never grows past the size asked for.
+    Entries are grouped in buckets of two. With the 'depth' policy the first slot keeps the deepest
+    result and the second is always replaced, and with the 'always' policy new results always take
+    the first slot and push the old first slot into the second.
+    """
+
+    ENTRY_BYTES = 16
+
+    def __init__(self, size_mb=16, policy='depth'):
+        """Creates an instance of a TranspositionTable class using at most size_mb megabytes."""
+        if policy not in ('depth', 'always'):
+            raise ValueError(f"Unknown replacement policy {policy!r}, expected 'depth' or 'always'")
+        self._policy = policy
+
+        # Use the largest power of two number of buckets that fits in the memory allowed
+        buckets = max(1, int(size_mb * 1024 * 1024) // (2 * self.ENTRY_BYTES))
+        self._mask = (1 << (buckets.bit_length() - 1)) - 1
+        self._keys = array('Q', [0]) * (2 * (self._mask + 1))
+        self._data = array('Q', [0]) * (2 * (self._mask + 1))
+        self._hits = 0
+        self._misses = 0
+        self._collisions = 0
+        self._stores = 0
+        self._overwrites = 0
+
+    def get_size_bytes(self):
+        """Returns the number of bytes used by the table's entries."""
+        return len(self._keys) * self.ENTRY_BYTES
+
+    def clear(self):
+        """Empties the table and resets its counters."""
+        self.__init__(self.get_size_bytes() / (1024 * 1024), self._policy)
+
+    def probe(self, key):
+        """
+        Takes a position hash and returns the stored (depth, bound, score, move) for it, where
+        move is a (from_square, to_square) pair or None, or returns None if it isn't stored.
+        """
+        index = (key & self._mask) << 1
+        keys = self._keys
+        for slot in (index, index + 1):
+            if keys[slot] == key:
+                self._hits += 1
+                return self._unpack(self._data[slot])
+
+        self._misses += 1
+        if keys[index] or keys[index + 1]:
+            self._collisions += 1
+        return None
+
+    def store(self, key, depth, bound, score, move):
+        """Stores a search result for a position hash using the table's replacement policy."""
+        index = (key & self._mask) << 1
+        keys = self._keys
+        data = self._data
+        packed = self._pack(depth, bound, score, move)
+        self._stores += 1
+
+        # Results for a position already stored always replace the old ones
+        for slot in (index, index + 1):
+            if keys[slot] == key:
+                data[slot] = packed
+                return
+
+        # Either way the entry in the second slot is the one that gets evicted
+        if keys[index + 1]:
+            self._overwrites += 1
+        if self._policy == 'depth' and depth < data[index] & 0xff:
+            keys[index + 1] = key
+            data[index + 1] = packed
+        else:
+            keys[index + 1] = keys[index]
+            data[index + 1] = data[index]
+            keys[index] = key
+            data[index] = packed
+
+    def stats(self):
+        """Returns a dictionary of the table's size and hit, miss, collision and store counters."""
+        return {
+            'entries': len(self._keys), 'used': sum(1 for key in self._keys if key),
+            'size_bytes': self.get_size_bytes(), 'hits': self._hits, 'misses': self._misses,
+            'collisions': self._collisions, 'stores': self._stores, 'overwrites': self._overwrites
+        }
+
+    @staticmethod
+    def _pack(depth, bound, score, move):
+        """Packs an entry into 64 bits: depth, bound, score offset to be positive, then the move squares."""
+        from_square, to_square = move if move else (-1, 0)
+        return (
+            min(depth, 255) | bound << 8 | (score + (1 << 19)) << 10
+            | (from_square + 1) << 30 | to_square << 37
+        )
+
+    @staticmethod
+    def _unpack(packed):
+        """Unpacks a 64-bit entry into (depth, bound, score, move)."""
+        from_square = (packed >> 30 & 0x7f) - 1
+        move = (from_square, packed >> 37 & 0x7f) if from_square >= 0 else None
+        return packed & 0xff, packed >> 8 & 0x3, (packed >> 10 & 0xfffff) - (1 << 19), move
+
+
+def order_moves(game, moves, first_move=None):
+    """
+    Sorts (from_square, to_square) moves in the game so the inputted first move comes first,
+    followed by captures ordered from the most valuable victim and least valuable attacker,
+    valued by the material weights of the game's evaluation.
+    """
+    material = game.get_weights().get_material
+
+    def priority(move):
+        if move == first_move:
+            return -1000000
+        victim = game.piece_at(move[1])
+        if not victim:
+            return 0
+        return -10 * material(victim.get_rank()) + material(game.piece_at(move[0]).get_rank())
+
+    return sorted(moves, key=priority)
+
+
+class _SearchAborted(Exception):
+
+    """Raised inside the search when the time or node budget runs out."""
+
+
+class XiangqiEngine:
+
+    """
+    Class representing a search engine for a game of Xiangqi.
+    Searches the game it is given in place and always puts the position back afterwards.
+    """
+
+    def __init__(self, game, transposition_table=None, book=None, tablebases=None):
+        """
+        Creates an instance of a XiangqiEngine class for the inputted XiangqiGame.
+        Takes an optional TranspositionTable to share between searches, otherwise uses a 16 MB one,
+        an optional OpeningBook and optional endgame Tablebases whose moves are played without searching.
+        """
+        self._game = game
+        self._table = transposition_table if transposition_table is not None else TranspositionTable()
+        self._book = book
+        self._tablebases = tablebases
+        self._nodes = 0
+        self._deadline = None
+        self._max_nodes = None
+
+    def best_move(self, time_ms=1000):
+        """
+        Takes a time limit in milliseconds and returns the best (current_pos, new_pos) move
+        found for the player whose turn it is, or None if the game is over.
+        """
+        return self.search(time_ms=time_ms)['move']
+
+    def get_transposition_table(self):
+        """Returns the transposition table used by the engine."""
+        return self._table
+
+    def get_nodes(self):
+        """Returns the number of nodes searched by the last search."""
+        return self._nodes
+
+    def search(self, time_ms=None, max_depth=64, max_nodes=None):
+        """
+        Searches the current position with iterative deepening until the time limit in
+        milliseconds, the maximum depth or the node budget is reached.
+        Returns a dictionary with the best move, its score for the player to move, the depth
+        completed, the principal variation, the nodes searched, the seconds taken and whether
+        the move came from the opening book or the endgame tablebases.
+        """
+        start = time.perf_counter()
+        self._deadline = start + time_ms / 1000 if time_ms is not None else None
+        self._max_nodes = max_nodes
+        self._nodes = 0
+
+        result = {
+            'move': None, 'score': 0, 'depth': 0, 'pv': [], 'nodes': 0, 'seconds': 0.0,
+            'book': False, 'tablebase': False
+        }
+        if self._game.get_game_state() != 'UNFINISHED':
+            return result
+
+        # Positions in the opening book or the tablebases are played without searching
+        known_move = self._book.choose_move(self._game) if self._book is not None else None
+        if known_move is not None:
+            result.update(score=self._game.evaluate(), pv=[known_move], book=True)
+        elif self._tablebases is not None:
+            probe = self._tablebases.best_move(self._game)
+            if probe is not None:
+                known_move, outcome, plies = probe
+                score = {'WIN': MATE_SCORE - plies, 'LOSS': plies - MATE_SCORE, 'DRAW': 0}[outcome]
+                result.update(score=score, pv=[known_move], tablebase=True)
+
+        pv = []
+        for depth in range(1, max_depth + 1 if known_move is None else 1):
+            try:
+                score, pv = self._negamax(depth, -MATE_SCORE - 1, MATE_SCORE + 1, 0, pv)
+            except _SearchAborted:
+                break
+            result.update(score=score, depth=depth, pv=pv)
+
+            # Stop early once a forced mate is found or the next iteration is unlikely to finish
+            elapsed = time.perf_counter() - start
+            if abs(score) >= MATE_SCORE - max_depth:
+                break
+            if self._deadline is not None and elapsed > (self._deadline - start) / 2:
+                break
+
+        # Fall back to any legal move if not even the first iteration finished
+        if not result['pv']:
+            result['pv'] = [next(self._game.legal_square_moves(), None)]
+            if result['pv'][0] is None:
+                result['pv'] = []
+
+        result['pv'] = [
+            (square_to_location(from_square), square_to_location(to_square))
+            for from_square, to_square in result['pv']
+        ]
+        result['move'] = result['pv'][0] if result['pv'] else None
+        result['nodes'] = self._nodes
+        result['seconds'] = time.perf_counter() - start
+        return result
+
+    def search_root_moves(self, moves, depth):
+        """
+        Takes a list of (from_square, to_square) root moves and searches only those moves to the
+        inputted depth with iterative deepening. Returns the best score and its principal variation.
+        """
+        self._deadline = None
+        self._max_nodes = None
+        self._nodes = 0
+        game = self._game
+
+        alpha = -MATE_SCORE - 1
+        pv = []
+        for current_depth in range(1, depth + 1):
+            alpha = -MATE_SCORE - 1
+            best_pv = []
+            for move in self._ordered_moves(moves, pv[0] if pv else None):
+                child_hint = pv[1:] if pv and move == pv[0] else []
+                game.push_move(*move)
+                try:
+                    score, child_pv = self._negamax(current_depth - 1, -MATE_SCORE - 1, -alpha, 1, child_hint)
+                finally:
+                    game.pop_move()
+
+                if -score > alpha:
+                    alpha = -score
+                    best_pv = [move] + child_pv
+            pv = best_pv
+        return alpha, pv
+
+    def _count_node(self):
+        """Counts a searched node and aborts the search if the budget has run out."""
+        self._nodes += 1
+        if self._max_nodes is not None and self._nodes >= self._max_nodes:
+            raise _SearchAborted
+        # Reading the clock is comparatively slow, so only do it every 1024 nodes
+        if self._deadline is not None and not self._nodes & 1023 and time.perf_counter() >= self._deadline:
+            raise _SearchAborted
+
+    def _negamax(self, depth, alpha, beta, ply, pv_hint):
+        """
+        Searches the current position to the inputted depth with an alpha-beta window.
+        pv_hint is the principal variation from the previous iteration, searched first.
+        Returns the score for the player to move and the principal variation found.
+        """
+        self._count_node()
+        if depth <= 0:
+            return self._quiescence(alpha, beta), []
+
+        game = self._game
+        key = game.position_hash()
+        entry = self._table.probe(key)
+        table_move = None
+        if entry:
+            entry_depth, bound, score, table_move = entry
+            # Mate scores are stored relative to the position, so convert back to plies from the root
+            if score > MATE_SCORE - 1000:
+                score -= ply
+            elif score < -MATE_SCORE + 1000:
+                score += ply
+            if ply > 0 and entry_depth >= depth and (
+                bound == EXACT
+                or (bound == LOWER_BOUND and score >= beta)
+                or (bound == UPPER_BOUND and score <= alpha)
+            ):
+                return score, [table_move] if table_move else []
+
+        first_move = pv_hint[0] if pv_hint else table_move
+        moves = self._ordered_moves(list(game.legal_square_moves()), first_move)
+        # Having no legal moves loses, whether in check or not
+        if not moves:
+            return -MATE_SCORE + ply, []
+
+        original_alpha = alpha
+        best_pv = []
+        for move in moves:
+            child_hint = pv_hint[1:] if pv_hint and move == pv_hint[0] else []
+            game.push_move(*move)
+            try:
+                score, child_pv = self._negamax(depth - 1, -beta, -alpha, ply + 1, child_hint)
+            finally:
+                game.pop_move()
+
+            score = -score
+            if score > alpha:
+                alpha = score
+                best_pv = [move] + child_pv
+                if alpha >= beta:
+                    break
+
+        if alpha >= beta:
+            bound = LOWER_BOUND
+        elif alpha > original_alpha:
+            bound = EXACT
+        else:
+            bound = UPPER_BOUND
+        # Store mate scores relative to this position rather than the root
+        stored_score = alpha
+        if alpha > MATE_SCORE - 1000:
+            stored_score += ply
+        elif alpha < -MATE_SCORE + 1000:
+            stored_score -= ply
+        self._table.store(key, depth, bound, stored_score, best_pv[0] if best_pv else None)
+        return alpha, best_pv
+
+    def _quiescence(self, alpha, beta):
+        """Searches captures only until the position is quiet and returns the score for the player to move."""
+        self._count_node()
+        stand_pat = self.evaluate()
+        if stand_pat >= beta:
+            return stand_pat
+        alpha = max(alpha, stand_pat)
+
+        game = self._game
+        captures = [move for move in game.legal_square_moves() if game.piece_at(move[1])]
+        for move in self._ordered_moves(captures, None):
+            game.push_move(*move)
+            try:
+                score = -self._quiescence(-beta, -alpha)
+            finally:
+                game.pop_move()
+
+            if score > alpha:
+                alpha = score
+                if alpha >= beta:
+                    break
+        return alpha
+
+    def _ordered_moves(self, moves, first_move):
+        """Orders moves for searching in the engine's game."""
+        return order_moves(self._game, moves, first_move)
+
+    def evaluate(self):
+        """
+        Returns the game's static evaluation of the position from the point of view of the player
+        to move, which the game keeps up to date as moves are made.
+        """
+        return self._game.evaluate()
+
+
+# Transposition table of each worker process, kept between the chunks it searches, and the
+# options, including the evaluation weights, of the game being searched
+_worker_table = None
+_worker_options = {}
+
+
+def _init_worker(hash_mb, options):
+    """Sets up the transposition table and game options for a worker process."""
+    global _worker_table, _worker_options
+    _worker_table = TranspositionTable(hash_mb)
+    _worker_options = options
+
+
+def _search_chunk(position, moves, depth):
+    """Searches a chunk of root moves of a compact position in a worker process."""
+    engine = XiangqiEngine(XiangqiGame(position=position, **_worker_options), _worker_table)
+    score, pv = engine.search_root_moves(moves, depth)
+    return score, pv, engine.get_nodes()
+
+
+def parallel_search(game, depth, workers=None, hash_mb=16):
+    """
+    Searches the game's current position to a fixed depth by splitting the root moves across
+    a pool of worker processes. Each worker gets the position as the 91 bytes from get_position
+    rather than a pickled game, along with the game's options and evaluation weights once when it
+    starts, and keeps its own transposition table of hash_mb megabytes.
+    Returns a dictionary like XiangqiEngine.search with the number of workers added.
+    """
+    workers = workers or os.cpu_count() or 1
+    start = time.perf_counter()
+    result = {
+        'move': None, 'score': 0, 'depth': depth, 'pv': [], 'nodes': 0, 'seconds': 0.0, 'workers': workers
+    }
+    moves = list(game.legal_square_moves())
+    if game.get_game_state() != 'UNFINISHED' or not moves:
+        return result
+
+    # Deal the moves out round-robin, after putting captures first, so each chunk gets a mix,
+    # and use more chunks than workers so a slow chunk doesn't hold up the rest
+    moves = order_moves(game, moves)
+    chunk_count = min(len(moves), workers * 2)
+    chunks = [moves[index::chunk_count] for index in range(chunk_count)]
+    position = game.get_position()
+
+    with ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(hash_mb, game.get_options())) as executor:
+        futures = [executor.submit(_search_chunk, position, chunk, depth) for chunk in chunks]
+        best_score = -MATE_SCORE - 1
+        for future in futures:
+            score, pv, nodes = future.result()
+            result['nodes'] += nodes
+            if score > best_score:
+                best_score = score
+                result['pv'] = pv
+
+    result['score'] = best_score
+    result['pv'] = [
+        (square_to_location(from_square), square_to_location(to_square))
+        for from_square, to_square in result['pv']
+    ]
+    result['move'] = result['pv'][0]
+    result['seconds'] = time.perf_counter() - start
+    return result
@@ -0,0 +1,181 @@
+# Description: Contains a class holding the weights of the static evaluation used by XiangqiGame.
+#              The evaluation is material plus a piece-square table for each rank plus a mobility
+#              bonus per valid move, and XiangqiGame keeps the total up to date as moves are made.
+#              Weights can be saved to and loaded from JSON files so they can be tuned offline.
+
+import json
+
+RANKS = ('General', 'Advisor', 'Elephant', 'Horse', 'Chariot', 'Cannon', 'Soldier')
+
+_DEFAULT_MATERIAL = {
+    'General': 0, 'Advisor': 200, 'Elephant': 200, 'Horse': 400,
+    'Chariot': 900, 'Cannon': 450, 'Soldier': 100
+}
+
+_DEFAULT_MOBILITY = {
+    'General': 0, 'Advisor': 0, 'Elephant': 0, 'Horse': 6,
+    'Chariot': 3, 'Cannon': 2, 'Soldier': 0
+}
+
+# Piece-square tables from red's side, written as the board is printed: the first row is row 10
+# at the top and the last is row 1. Black uses the same tables turned around.
+_DEFAULT_PIECE_SQUARE = {
+    'General': [
+        [0, 0, 0, 0, 0, 0, 0, 0, 0],
+        [0, 0, 0, 0, 0, 0, 0, 0, 0],
+        [0, 0, 0, 0, 0, 0, 0, 0, 0],
+        [0, 0, 0, 0, 0, 0, 0, 0, 0],
+        [0, 0, 0, 0, 0, 0, 0, 0, 0],
+        [0, 0, 0, 0, 0, 0, 0, 0, 0],
+        [0, 0, 0, 0, 0, 0, 0, 0, 0],
+        [0, 0, 0, -20, -20, -20, 0, 0, 0],
+        [0, 0, 0, -10, -10, -10, 0, 0, 0],
+        [0, 0, 0, 5, 10, 5, 0, 0, 0],
+    ],
+    'Advisor': [
+        [0, 0, 0, 0, 0, 0, 0, 0, 0],
+        [0, 0, 0, 0, 0, 0, 0, 0, 0],
+        [0, 0, 0, 0, 0, 0, 0, 0, 0],
+        [0, 0, 0, 0, 0, 0, 0, 0, 0],
+        [0, 0, 0, 0, 0, 0, 0, 0, 0],
+        [0, 0, 0, 0, 0, 0, 0, 0, 0],
+        [0, 0, 0, 0, 0, 0, 0, 0, 0],
+        [0, 0, 0, 0, 0, 0, 0, 0, 0],
+        [0, 0, 0, 0, 10, 0, 0, 0, 0],
+        [0, 0, 0, 0, 0, 0, 0, 0, 0],
+    ],
+    'Elephant': [
+        [0, 0, 0, 0, 0, 0, 0, 0, 0],
+        [0, 0, 0, 0, 0, 0, 0, 0, 0],
+        [0, 0, 0, 0, 0, 0, 0, 0, 0],
+        [0, 0, 0, 0, 0, 0, 0, 0, 0],
+        [0, 0, 0, 0, 0, 0, 0, 0, 0],
+        [0, 0, -5, 0, 0, 0, -5, 0, 0],
+        [0, 0, 0, 0, 0, 0, 0, 0, 0],
+        [0, 0, 0, 0, 10, 0, 0, 0, 0],
+        [0, 0, 0, 0, 0, 0, 0, 0, 0],
+        [0, 0, 0, 0, 0, 0, 0, 0, 0],
+    ],
+    'Horse': [
+        [0, 0, 5, 10, 5, 10, 5, 0, 0],
+        [0, 10, 20, 25, 10, 25, 20, 10, 0],
+        [5, 15, 20, 25, 25, 25, 20, 15, 5],
+        [5, 20, 20, 25, 20, 25, 20, 20, 5],
+        [0, 10, 15, 20, 20, 20, 15, 10, 0],
+        [0, 10, 15, 15, 20, 15, 15, 10, 0],
+        [0, 5, 10, 10, 10, 10, 10, 5, 0],
+        [0, 0, 5, 5, 5, 5, 5, 0, 0],
+        [-5, 0, 0, 0, -10, 0, 0, 0, -5],
+        [0, -10, 0, 0, 0, 0, 0, -10, 0],
+    ],
+    'Chariot': [
+        [10, 10, 10, 15, 10, 15, 10, 10, 10],
+        [10, 15, 10, 20, 20, 20, 10, 15, 10],
+        [5, 10, 10, 15, 15, 15, 10, 10, 5],
+        [5, 10, 10, 15, 15, 15, 10, 10, 5],
+        [5, 10, 10, 15, 15, 15, 10, 10, 5],
+        [5, 5, 5, 10, 10, 10, 5, 5, 5],
+        [0, 5, 5, 10, 10, 10, 5, 5, 0],
+        [0, 0, 0, 5, 5, 5, 0, 0, 0],
+        [0, 5, 0, 5, 0, 5, 0, 5, 0],
+        [-5, 5, 0, 5, 0, 5, 0, 5, -5],
+    ],
+    'Cannon': [
+        [5, 5, 0, -5, -10, -5, 0, 5, 5],
+        [0, 5, 0, -5, -5, -5, 0, 5, 0],
+        [0, 5, 0, 0, 0, 0, 0, 5, 0],
+        [0, 0, 0, 0, 5, 0, 0, 0, 0],
+        [0, 0, 0, 0, 5, 0, 0, 0, 0],
+        [0, 0, 5, 0, 5, 0, 5, 0, 0],
+        [0, 0, 0, 0, 5, 0, 0, 0, 0],
+        [0, 5, 5, 10, 15, 10, 5, 5, 0],
+        [0, 0, 0, 5, 5, 5, 0, 0, 0],
+        [0, 0, 5, 5, 5, 5, 5, 0, 0],
+    ],
+    'Soldier': [
+        [0, 0, 0, 5, 10, 5, 0, 0, 0],
+        [80, 100, 120, 140, 140, 140, 120, 100, 80],
+        [80, 100, 120, 140, 150, 140, 120, 100, 80],
+        [80, 100, 110, 120, 130, 120, 110, 100, 80],
+        [70, 90, 100, 110, 110, 110, 100, 90, 70],
+        [0, 0, 0, 0, 0, 0, 0, 0, 0],
+        [0, 0, 0, 0, 0, 0, 0, 0, 0],
+        [0, 0, 0, 0, 0, 0, 0, 0, 0],
+        [0, 0, 0, 0, 0, 0, 0, 0, 0],
+        [0, 0, 0, 0, 0, 0, 0, 0, 0],
+    ],
+}
+
+
+class EvalWeights:
+
+    """
+    Class representing the weights of the static evaluation.
+    Contains the material value, piece-square table and mobility bonus of each piece rank, and
+    builds the per-square value tables that XiangqiGame adds and subtracts as pieces move.
+    """
+
+    def __init__(self, material=None, piece_square=None, mobility=None):
+        """
+        Creates an instance of an EvalWeights class. Takes optional dictionaries keyed by rank of
+        material values, piece-square tables of 10 rows of 9 values from row 10 down to row 1 on
+        red's side, and bonuses per valid move. Ranks left out keep the default weights.
+        """
+        self._material = dict(_DEFAULT_MATERIAL, **(material or {}))
+        self._piece_square = dict(_DEFAULT_PIECE_SQUARE, **(piece_square or {}))
+        self._mobility = dict(_DEFAULT_MOBILITY, **(mobility or {}))
+
+        for weights in (self._material, self._piece_square, self._mobility):
+            unknown = set(weights) - set(RANKS)
+            if unknown:
+                raise ValueError(f'Unknown piece ranks in evaluation weights: {sorted(unknown)}')
+        for rank, table in self._piece_square.items():
+            if len(table) != 10 or any(len(row) != 9 for row in table):
+                raise ValueError(f'Piece-square table for {rank} must be 10 rows of 9 values')
+
+        self._square_values = {}
+        self._mobility_values = {}
+        for rank in RANKS:
+            # Square 0 is a1, which is the first value of the last row of the table for red
+            red_values = [
+                self._material[rank] + self._piece_square[rank][9 - square // 9][square % 9]
+                for square in range(90)
+            ]
+            self._square_values[rank, 'red'] = red_values
+            # Black's squares are red's turned half way around the board, and count against red
+            self._square_values[rank, 'black'] = [-value for value in reversed(red_values)]
+            self._mobility_values[rank, 'red'] = self._mobility[rank]
+            self._mobility_values[rank, 'black'] = -self._mobility[rank]
+
+    @classmethod
+    def load(cls, path):
+        """Takes the path of a JSON file written by save and returns the weights in it."""
+        with open(path) as weights_file:
+            data = json.load(weights_file)
+        return cls(data.get('material'), data.get('piece_square'), data.get('mobility'))
+
+    def save(self, path):
+        """Writes the weights to a JSON file at the inputted path."""
+        with open(path, 'w') as weights_file:
+            json.dump({
+                'material': self._material, 'piece_square': self._piece_square, 'mobility': self._mobility
+            }, weights_file, indent=1)
+
+    def get_material(self, rank):
+        """Returns the material value of the inputted piece rank."""
+        return self._material[rank]
+
+    def square_values(self, rank, color):
+        """
+        Returns a list of the value of a piece of the inputted rank and color on each square,
+        material included, counted positive for red and negative for black.
+        """
+        return self._square_values[rank, color]
+
+    def mobility_value(self, rank, color):
+        """Returns the bonus per valid move for a piece of the inputted rank and color, negative for black."""
+        return self._mobility_values[rank, color]
+
+
+# Weights used by games that aren't given their own
+DEFAULT_WEIGHTS = EvalWeights()
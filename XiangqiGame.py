@@ -3,24 +3,243 @@
 # Description: Contains classes for a piece which has children classes for each piece in a game of Xiangqi.
 #              Contains a class representing a game of Xiangqi which has methods that allow the game to be played.
 
+import operator
+import random
+import struct
+import time
+
+from XiangqiEval import DEFAULT_WEIGHTS
+from XiangqiProfile import PROFILED_METHODS, GameProfiler
+
+# Squares are numbered 0-89 starting at a1, moving across each row before moving up the board,
+# so the square for column c (1-9) and row r (1-10) is (r - 1) * 9 + (c - 1).
+_SQUARE_NAMES = [column + str(row) for row in range(1, 11) for column in 'abcdefghi']
+_SQUARE_INDEX = {name: square for square, name in enumerate(_SQUARE_NAMES)}
+
+
+def square_to_location(square):
+    """Takes a square number as input and returns its location in algebraic notation."""
+    return _SQUARE_NAMES[square]
+
+
+def location_to_square(location):
+    """Takes a location in algebraic notation as input and returns its square number."""
+    return _SQUARE_INDEX[location]
+
+
+def _build_move_tables():
+    """
+    Builds the move tables for the General, Advisor, Elephant, Horse and Soldier.
+    Each table maps a square to a tuple of (destination, blocking square) pairs, where the
+    blocking square is the horse leg or elephant eye that must be empty, or None.
+    """
+    # Column and row bounds of the area each piece is allowed to move within
+    palace = {'red': (4, 6, 1, 3), 'black': (4, 6, 8, 10)}
+    own_side = {'red': (1, 9, 1, 5), 'black': (1, 9, 6, 10)}
+    whole_board = (1, 9, 1, 10)
+
+    # Each step is (column change, row change, blocking column change, blocking row change)
+    steps = {
+        'General': [(-1, 0, None, None), (1, 0, None, None), (0, -1, None, None), (0, 1, None, None)],
+        'Advisor': [(1, 1, None, None), (-1, 1, None, None), (1, -1, None, None), (-1, -1, None, None)],
+        'Elephant': [(2, 2, 1, 1), (-2, 2, -1, 1), (2, -2, 1, -1), (-2, -2, -1, -1)],
+        'Horse': [
+            (1, 2, 0, 1), (-1, 2, 0, 1), (1, -2, 0, -1), (-1, -2, 0, -1),
+            (2, 1, 1, 0), (2, -1, 1, 0), (-2, 1, -1, 0), (-2, -1, -1, 0)
+        ],
+    }
+
+    tables = {}
+    for color in ('red', 'black'):
+        bounds = {
+            'General': palace[color], 'Advisor': palace[color],
+            'Elephant': own_side[color], 'Horse': whole_board
+        }
+        for rank, rank_steps in steps.items():
+            table = []
+            for square in range(90):
+                row, column = divmod(square, 9)
+                row, column = row + 1, column + 1
+                min_column, max_column, min_row, max_row = bounds[rank]
+                moves = []
+                for column_step, row_step, block_column, block_row in rank_steps:
+                    if (
+                        min_column <= column + column_step <= max_column
+                        and min_row <= row + row_step <= max_row
+                    ):
+                        block = None
+                        if block_column is not None:
+                            block = (row + block_row - 1) * 9 + column + block_column - 1
+                        moves.append(((row + row_step - 1) * 9 + column + column_step - 1, block))
+                table.append(tuple(moves))
+            tables[rank, color] = tuple(table)
+
+        # Soldiers move forward, and also sideways once they have crossed the river
+        forward = 1 if color == 'red' else -1
+        table = []
+        for square in range(90):
+            row, column = divmod(square, 9)
+            row, column = row + 1, column + 1
+            crossed = row > 5 if color == 'red' else row < 6
+            moves = []
+            if 1 <= row + forward <= 10:
+                moves.append((square + 9 * forward, None))
+            if crossed and column < 9:
+                moves.append((square + 1, None))
+            if crossed and column > 1:
+                moves.append((square - 1, None))
+            table.append(tuple(moves))
+        tables['Soldier', color] = tuple(table)
+
+    return tables
+
+
+def _build_ray_tables():
+    """Builds the squares a sliding piece passes over moving up, down, right and left from each square."""
+    rays = []
+    for square in range(90):
+        row, column = divmod(square, 9)
+        rays.append((
+            tuple(range(square + 9, 90, 9)),
+            tuple(range(square - 9, -1, -9)),
+            tuple(range(square + 1, square + 9 - column)),
+            tuple(range(square - 1, square - column - 1, -1))
+        ))
+    return tuple(rays)
+
+
+def _build_attack_tables(move_tables):
+    """
+    Inverts the move tables so that each square maps to the (source, blocking square) pairs
+    a piece of that rank and color could attack it from.
+    """
+    attack_tables = {}
+    for key, table in move_tables.items():
+        attacks = [[] for _ in range(90)]
+        for source, moves in enumerate(table):
+            for destination, block in moves:
+                attacks[destination].append((source, block))
+        attack_tables[key] = tuple(tuple(sources) for sources in attacks)
+    return attack_tables
+
+
+def _build_zobrist_keys():
+    """
+    Builds a random 64-bit key for every piece rank and color on every square, plus the key
+    for black to move. Uses a fixed seed so position hashes are the same in every process.
+    """
+    generator = random.Random(0x58514731)
+    keys = {}
+    for rank in ('General', 'Advisor', 'Elephant', 'Horse', 'Chariot', 'Cannon', 'Soldier'):
+        for color in ('red', 'black'):
+            keys[rank, color] = tuple(generator.getrandbits(64) for _ in range(90))
+    return keys, generator.getrandbits(64)
+
+
+_build_start = time.perf_counter()
+_MOVE_TABLES = _build_move_tables()
+_ATTACK_TABLES = _build_attack_tables(_MOVE_TABLES)
+_RAYS = _build_ray_tables()
+_ZOBRIST_KEYS, _ZOBRIST_BLACK_TO_MOVE = _build_zobrist_keys()
+# Seconds spent building the move tables when the module was imported
+TABLE_BUILD_TIME = time.perf_counter() - _build_start
+
+
+def general_attacked(square, enemy_color, board, describe, empty=None):
+    """
+    Returns whether a general on the inputted square could be captured by the enemy color.
+    Takes a board indexed by square holding empty on empty squares, and a function returning
+    the (rank, color) of anything else on it, so boards other than the game's can be checked.
+    Works outward from the square instead of relying on the enemy pieces' move lists.
+    """
+    # Look for a chariot, or a facing general on the file, as the first piece along each
+    # line and a cannon as the second
+    for direction, ray in enumerate(_RAYS[square]):
+        screened = False
+        for current in ray:
+            piece = board[current]
+            if piece == empty:
+                continue
+            rank, color = describe(piece)
+            if color == enemy_color:
+                if screened:
+                    if rank == 'Cannon':
+                        return True
+                elif rank == 'Chariot' or (rank == 'General' and direction < 2):
+                    return True
+            if screened:
+                break
+            screened = True
+
+    # Look for horses whose leg is not blocked
+    horse = ('Horse', enemy_color)
+    for source, leg in _ATTACK_TABLES[horse][square]:
+        piece = board[source]
+        if piece != empty and board[leg] == empty and describe(piece) == horse:
+            return True
+
+    # Look for soldiers that could step onto the square
+    soldier = ('Soldier', enemy_color)
+    for source, _ in _ATTACK_TABLES[soldier][square]:
+        piece = board[source]
+        if piece != empty and describe(piece) == soldier:
+            return True
+
+    return False
+
+
+def sensitive_squares(general_square, enemy_color, board, describe, empty=None):
+    """
+    Returns the set of squares where moving a piece away or onto could expose the General
+    on the inputted square: every square on a line from the General that holds an enemy
+    chariot, cannon or facing general, and the leg squares of enemy horses aimed at it.
+    Takes the same board, describe and empty as general_attacked.
+    """
+    squares = set()
+    for direction, ray in enumerate(_RAYS[general_square]):
+        for square in ray:
+            piece = board[square]
+            if piece == empty:
+                continue
+            rank, color = describe(piece)
+            if color == enemy_color and (rank in ('Chariot', 'Cannon') or (rank == 'General' and direction < 2)):
+                squares.update(ray)
+                break
+
+    horse = ('Horse', enemy_color)
+    for source, leg in _ATTACK_TABLES[horse][general_square]:
+        piece = board[source]
+        if piece != empty and describe(piece) == horse:
+            squares.add(leg)
+
+    return squares
+
 
 class Piece:
 
     """
     Parent class that all pieces will inherit from.
     Contain private data members for location and color of the piece.
+    The location is kept as a square number and the valid moves as a list of square numbers, and
+    are only converted to algebraic notation when asked for through the public methods.
     """
 
+    __slots__ = ('_square', '_color', '_valid_moves', '_rank')
+
     def __init__(self, starting_pos, color):
         """Creates an instance of a Piece class."""
-        self._location = starting_pos
+        self._square = _SQUARE_INDEX[starting_pos]
         self._color = color
         self._valid_moves = []
         self._rank = None
 
     def get_location(self):
         """Returns the location of the piece."""
-        return self._location
+        return _SQUARE_NAMES[self._square]
+
+    def get_square(self):
+        """Returns the square number of the piece."""
+        return self._square
 
     def get_color(self):
         """Returns the color of the piece."""
@@ -32,82 +251,78 @@ class Piece:
 
     def set_location(self, new_pos):
         """Moves the piece to the inputted position."""
-        self._location = new_pos
+        self._square = _SQUARE_INDEX[new_pos]
+
+    def set_square(self, square):
+        """Moves the piece to the inputted square number."""
+        self._square = square
 
     def location_to_list(self):
-        """Converts the _location attribute to a list representing the location."""
-        letter_conversion = {
-            'a': 1, 'b': 2, 'c': 3, 'd': 4, 'e': 5, 'f': 6, 'g': 7, 'h': 8, 'i': 9
-        }
-        return [letter_conversion[self._location[0]], int(self._location[1:])]
+        """Converts the location of the piece to a [column, row] list, both counted from 1."""
+        row, column = divmod(self._square, 9)
+        return [column + 1, row + 1]
 
     @staticmethod
     def location_from_list(loc_list):
         """Converts a list representing a location back to an actual location."""
-        list_conversion = {
-            1: 'a', 2: 'b', 3: 'c', 4: 'd', 5: 'e', 6: 'f', 7: 'g', 8: 'h', 9: 'i'
-        }
-        return list_conversion[loc_list[0]] + str(loc_list[1])
+        return _SQUARE_NAMES[(loc_list[1] - 1) * 9 + loc_list[0] - 1]
+
+    def copy(self):
+        """
+        Returns a new piece of the same rank and color on the same square. The list of valid moves
+        is shared rather than copied, which is safe because it is always replaced, never changed.
+        """
+        piece = object.__new__(type(self))
+        piece._square = self._square
+        piece._color = self._color
+        piece._valid_moves = self._valid_moves
+        piece._rank = self._rank
+        return piece
 
     def get_valid_moves(self):
-        """Returns a list of valid moves for the piece."""
+        """Returns a list of the locations of the valid moves for the piece."""
+        return [_SQUARE_NAMES[square] for square in self._valid_moves]
+
+    def get_valid_squares(self):
+        """Returns the list of the square numbers of the valid moves for the piece. Don't modify it."""
         return self._valid_moves
 
+    def set_valid_squares(self, valid_squares):
+        """Replaces the list of square numbers of valid moves for the piece, used when a move is undone."""
+        self._valid_moves = valid_squares
+
+    def update_valid_moves(self, board, bitboards=None):
+        """
+        Updates the list of valid moves for the piece by walking its move table.
+        Takes the game's board array. Doesn't check if the move puts the General in check.
+        """
+        valid_moves = []
+        for destination, block in _MOVE_TABLES[self._rank, self._color][self._square]:
+            # Skip moves through an occupied horse leg or elephant eye
+            if block is not None and board[block]:
+                continue
+            target = board[destination]
+            if not target or target.get_color() != self._color:
+                valid_moves.append(destination)
+
+        self._valid_moves = valid_moves
+
     def __repr__(self):
         """Returns a representation of the object."""
-        return f'{self.__class__.__name__}({self._location}, {self._color})'
+        return f'{self.__class__.__name__}({_SQUARE_NAMES[self._square]}, {self._color})'
 
 
 class General(Piece):
 
     """Class representing a General piece."""
 
+    __slots__ = ()
+
     def __init__(self, starting_pos, color):
         """Creates an instance of a General class."""
         super().__init__(starting_pos, color)
         self._rank = 'General'
 
-    def update_valid_moves(self, other_pieces):
-        """
-        Updates the list of valid moves for the piece.
-        Doesn't check if the move puts the General in check.
-        """
-        team_pieces = [
-            piece for piece in other_pieces if piece.get_color() == self._color]
-        team_locations = [piece.location_to_list() for piece in team_pieces]
-
-        location = self.location_to_list()
-        valid_moves = []
-        # Check move to left
-        if location[0] > 4 and [location[0] - 1, location[1]] not in team_locations:
-            valid_moves.append(self.location_from_list(
-                [location[0] - 1, location[1]]))
-
-        # Check move to right
-        if location[0] < 6 and [location[0] + 1, location[1]] not in team_locations:
-            valid_moves.append(self.location_from_list(
-                [location[0] + 1, location[1]]))
-
-        # Check moves up and down for red
-        if self._color == 'red':
-            if location[1] > 1 and [location[0], location[1] - 1] not in team_locations:
-                valid_moves.append(self.location_from_list(
-                    [location[0], location[1] - 1]))
-            if location[1] < 3 and [location[0], location[1] + 1] not in team_locations:
-                valid_moves.append(self.location_from_list(
-                    [location[0], location[1] + 1]))
-
-        # Check moves up and down for black
-        if self._color == 'black':
-            if location[1] > 8 and [location[0], location[1] - 1] not in team_locations:
-                valid_moves.append(self.location_from_list(
-                    [location[0], location[1] - 1]))
-            if location[1] < 10 and [location[0], location[1] + 1] not in team_locations:
-                valid_moves.append(self.location_from_list(
-                    [location[0], location[1] + 1]))
-
-        self._valid_moves = valid_moves
-
     def __str__(self):
         """Returns a string representing the piece used in print statements."""
         return self._color.upper()[0] + 'G'
@@ -117,92 +332,13 @@ class Advisor(Piece):
 
     """Class representing an Advisor piece."""
 
+    __slots__ = ()
+
     def __init__(self, starting_pos, color):
         """Creates an instance of an Advisor class."""
         super().__init__(starting_pos, color)
         self._rank = 'Advisor'
 
-    def update_valid_moves(self, other_pieces):
-        """
-        Updates the list of valid moves for the piece.
-        Doesn't check if the move puts the General in check.
-        """
-        team_pieces = [
-            piece for piece in other_pieces if piece.get_color() == self._color]
-        team_locations = [piece.location_to_list() for piece in team_pieces]
-
-        location = self.location_to_list()
-        valid_moves = []
-        # Check moves for red
-        if self._color == 'red':
-            # Check up-right
-            if (
-                location[0] < 6 and location[1] < 3
-                and [location[0] + 1, location[1] + 1] not in team_locations
-            ):
-                valid_moves.append(self.location_from_list(
-                    [location[0] + 1, location[1] + 1]))
-
-            # Check up-left
-            if (
-                location[0] > 4 and location[1] < 3
-                and [location[0] - 1, location[1] + 1] not in team_locations
-            ):
-                valid_moves.append(self.location_from_list(
-                    [location[0] - 1, location[1] + 1]))
-
-            # Check down-right
-            if (
-                location[0] < 6 and location[1] > 1
-                and [location[0] + 1, location[1] - 1] not in team_locations
-            ):
-                valid_moves.append(self.location_from_list(
-                    [location[0] + 1, location[1] - 1]))
-
-            # Check down-left
-            if (
-                location[0] > 4 and location[1] > 1
-                and [location[0] - 1, location[1] - 1] not in team_locations
-            ):
-                valid_moves.append(self.location_from_list(
-                    [location[0] - 1, location[1] - 1]))
-
-        # Check moves for black
-        if self._color == 'black':
-            # Check up-right
-            if (
-                location[0] < 6 and location[1] < 10
-                and [location[0] + 1, location[1] + 1] not in team_locations
-            ):
-                valid_moves.append(self.location_from_list(
-                    [location[0] + 1, location[1] + 1]))
-
-            # Check up-left
-            if (
-                location[0] > 4 and location[1] < 10
-                and [location[0] - 1, location[1] + 1] not in team_locations
-            ):
-                valid_moves.append(self.location_from_list(
-                    [location[0] - 1, location[1] + 1]))
-
-            # Check down-right
-            if (
-                location[0] < 6 and location[1] > 8
-                and [location[0] + 1, location[1] - 1] not in team_locations
-            ):
-                valid_moves.append(self.location_from_list(
-                    [location[0] + 1, location[1] - 1]))
-
-            # Check down-left
-            if (
-                location[0] > 4 and location[1] > 8
-                and [location[0] - 1, location[1] - 1] not in team_locations
-            ):
-                valid_moves.append(self.location_from_list(
-                    [location[0] - 1, location[1] - 1]))
-
-        self._valid_moves = valid_moves
-
     def __str__(self):
         """Returns a string representing the piece used in print statements."""
         return self._color.upper()[0] + 'A'
@@ -212,101 +348,13 @@ class Elephant(Piece):
 
     """Class representing an Elephant piece."""
 
+    __slots__ = ()
+
     def __init__(self, starting_pos, color):
         """Creates an instance of an Elephant class."""
         super().__init__(starting_pos, color)
         self._rank = 'Elephant'
 
-    def update_valid_moves(self, other_pieces):
-        """
-        Updates the list of valid moves for the piece.
-        Doesn't check if the move puts the General in check.
-        """
-        team_pieces = [
-            piece for piece in other_pieces if piece.get_color() == self._color]
-        other_locations = [piece.location_to_list() for piece in other_pieces]
-        team_locations = [piece.location_to_list() for piece in team_pieces]
-
-        location = self.location_to_list()
-        valid_moves = []
-        # Check moves for red
-        if self._color == 'red':
-            # Check up-right
-            if (
-                location[0] < 8 and location[1] < 4
-                and [location[0] + 1, location[1] + 1] not in other_locations
-                and [location[0] + 2, location[1] + 2] not in team_locations
-            ):
-                valid_moves.append(self.location_from_list(
-                    [location[0] + 2, location[1] + 2]))
-
-            # Check up-left
-            if (
-                location[0] > 2 and location[1] < 4
-                and [location[0] - 1, location[1] + 1] not in other_locations
-                and [location[0] - 2, location[1] + 2] not in team_locations
-            ):
-                valid_moves.append(self.location_from_list(
-                    [location[0] - 2, location[1] + 2]))
-
-            # Check down-right
-            if (
-                location[0] < 8 and location[1] > 2
-                and [location[0] + 1, location[1] - 1] not in other_locations
-                and [location[0] + 2, location[1] - 2] not in team_locations
-            ):
-                valid_moves.append(self.location_from_list(
-                    [location[0] + 2, location[1] - 2]))
-
-            # Check down-left
-            if (
-                location[0] > 2 and location[1] > 2
-                and [location[0] - 1, location[1] - 1] not in other_locations
-                and [location[0] - 2, location[1] - 2] not in team_locations
-            ):
-                valid_moves.append(self.location_from_list(
-                    [location[0] - 2, location[1] - 2]))
-
-        # Check moves for black
-        if self._color == 'black':
-            # Check up-right
-            if (
-                location[0] < 8 and location[1] < 9
-                and [location[0] + 1, location[1] + 1] not in other_locations
-                and [location[0] + 2, location[1] + 2] not in team_locations
-            ):
-                valid_moves.append(self.location_from_list(
-                    [location[0] + 2, location[1] + 2]))
-
-            # Check up-left
-            if (
-                location[0] > 2 and location[1] < 9
-                and [location[0] - 1, location[1] + 1] not in other_locations
-                and [location[0] - 2, location[1] + 2] not in team_locations
-            ):
-                valid_moves.append(self.location_from_list(
-                    [location[0] - 2, location[1] + 2]))
-
-            # Check down-right
-            if (
-                location[0] < 8 and location[1] > 7
-                and [location[0] + 1, location[1] - 1] not in other_locations
-                and [location[0] + 2, location[1] - 2] not in team_locations
-            ):
-                valid_moves.append(self.location_from_list(
-                    [location[0] + 2, location[1] - 2]))
-
-            # Check down-left
-            if (
-                location[0] > 2 and location[1] > 7
-                and [location[0] - 1, location[1] - 1] not in other_locations
-                and [location[0] - 2, location[1] - 2] not in team_locations
-            ):
-                valid_moves.append(self.location_from_list(
-                    [location[0] - 2, location[1] - 2]))
-
-        self._valid_moves = valid_moves
-
     def __str__(self):
         """Returns a string representing the piece used in print statements."""
         return self._color.upper()[0] + 'E'
@@ -316,97 +364,13 @@ class Horse(Piece):
 
     """Class representing a Horse piece."""
 
+    __slots__ = ()
+
     def __init__(self, starting_pos, color):
         """Creates an instance of a Horse class."""
         super().__init__(starting_pos, color)
         self._rank = 'Horse'
 
-    def update_valid_moves(self, other_pieces):
-        """
-        Updates the list of valid moves for the piece.
-        Doesn't check if the move puts the General in check.
-        """
-        team_pieces = [
-            piece for piece in other_pieces if piece.get_color() == self._color]
-        other_locations = [piece.location_to_list() for piece in other_pieces]
-        team_locations = [piece.location_to_list() for piece in team_pieces]
-
-        location = self.location_to_list()
-        valid_moves = []
-        # Check up-right
-        if (
-            location[0] < 9 and location[1] < 9
-            and [location[0], location[1] + 1] not in other_locations
-            and [location[0] + 1, location[1] + 2] not in team_locations
-        ):
-            valid_moves.append(self.location_from_list(
-                [location[0] + 1, location[1] + 2]))
-
-        # Check up-left
-        if (
-            location[0] > 1 and location[1] < 9
-            and [location[0], location[1] + 1] not in other_locations
-            and [location[0] - 1, location[1] + 2] not in team_locations
-        ):
-            valid_moves.append(self.location_from_list(
-                [location[0] - 1, location[1] + 2]))
-
-        # Check down-right
-        if (
-            location[0] < 9 and location[1] > 2
-            and [location[0], location[1] - 1] not in other_locations
-            and [location[0] + 1, location[1] - 2] not in team_locations
-        ):
-            valid_moves.append(self.location_from_list(
-                [location[0] + 1, location[1] - 2]))
-
-        # Check down-left
-        if (
-            location[0] > 1 and location[1] > 2
-            and [location[0], location[1] - 1] not in other_locations
-            and [location[0] - 1, location[1] - 2] not in team_locations
-        ):
-            valid_moves.append(self.location_from_list(
-                [location[0] - 1, location[1] - 2]))
-
-        # Check right-up
-        if (
-            location[0] < 8 and location[1] < 10
-            and [location[0] + 1, location[1]] not in other_locations
-            and [location[0] + 2, location[1] + 1] not in team_locations
-        ):
-            valid_moves.append(self.location_from_list(
-                [location[0] + 2, location[1] + 1]))
-
-        # Check right-down
-        if (
-            location[0] < 8 and location[1] > 1
-            and [location[0] + 1, location[1]] not in other_locations
-            and [location[0] + 2, location[1] - 1] not in team_locations
-        ):
-            valid_moves.append(self.location_from_list(
-                [location[0] + 2, location[1] - 1]))
-
-        # Check left-up
-        if (
-            location[0] > 2 and location[1] < 10
-            and [location[0] - 1, location[1]] not in other_locations
-            and [location[0] - 2, location[1] + 1] not in team_locations
-        ):
-            valid_moves.append(self.location_from_list(
-                [location[0] - 2, location[1] + 1]))
-
-        # Check left-down
-        if (
-            location[0] > 2 and location[1] > 1
-            and [location[0] - 1, location[1]] not in other_locations
-            and [location[0] - 2, location[1] - 1] not in team_locations
-        ):
-            valid_moves.append(self.location_from_list(
-                [location[0] - 2, location[1] - 1]))
-
-        self._valid_moves = valid_moves
-
     def __str__(self):
         """Returns a string representing the piece used in print statements."""
         return self._color.upper()[0] + 'H'
@@ -416,83 +380,36 @@ class Chariot(Piece):
 
     """Class representing a Chariot piece."""
 
+    __slots__ = ()
+
     def __init__(self, starting_pos, color):
         """Creates an instance of a Chariot class."""
         super().__init__(starting_pos, color)
         self._rank = 'Chariot'
 
-    def update_valid_moves(self, other_pieces):
+    def update_valid_moves(self, board, bitboards=None):
         """
         Updates the list of valid moves for the piece.
+        Uses the rank and file tables when the game's bitboards are passed in.
         Doesn't check if the move puts the General in check.
         """
-        team_pieces = [
-            piece for piece in other_pieces if piece.get_color() == self._color]
-        enemy_pieces = [
-            piece for piece in other_pieces if piece.get_color() != self._color]
-        team_locations = [piece.location_to_list() for piece in team_pieces]
-        enemy_locations = [piece.location_to_list() for piece in enemy_pieces]
+        if bitboards:
+            moves = bitboards.chariot_moves(self._square, self._color)
+            self._valid_moves = bitboards.squares(moves)
+            return
 
         valid_moves = []
-        # Check all moves if piece is moving up
-        location = self.location_to_list()
-        # Loop until another piece is encountered
-        while location[1] < 10:
-            if [location[0], location[1] + 1] in team_locations:
-                break
-            elif [location[0], location[1] + 1] in enemy_locations:
-                valid_moves.append(self.location_from_list(
-                    [location[0], location[1] + 1]))
-                break
-            else:
-                valid_moves.append(self.location_from_list(
-                    [location[0], location[1] + 1]))
-            location[1] += 1
-
-        # Check all moves if piece is moving down
-        location = self.location_to_list()
-        # Loop until another piece is encountered
-        while location[1] > 1:
-            if [location[0], location[1] - 1] in team_locations:
-                break
-            elif [location[0], location[1] - 1] in enemy_locations:
-                valid_moves.append(self.location_from_list(
-                    [location[0], location[1] - 1]))
-                break
-            else:
-                valid_moves.append(self.location_from_list(
-                    [location[0], location[1] - 1]))
-            location[1] -= 1
-
-        # Check all moves if piece is moving right
-        location = self.location_to_list()
-        # Loop until another piece is encountered
-        while location[0] < 9:
-            if [location[0] + 1, location[1]] in team_locations:
-                break
-            elif [location[0] + 1, location[1]] in enemy_locations:
-                valid_moves.append(self.location_from_list(
-                    [location[0] + 1, location[1]]))
-                break
-            else:
-                valid_moves.append(self.location_from_list(
-                    [location[0] + 1, location[1]]))
-            location[0] += 1
-
-        # Check all moves if piece is moving left
-        location = self.location_to_list()
-        # Loop until another piece is encountered
-        while location[0] > 1:
-            if [location[0] - 1, location[1]] in team_locations:
+        # Check all moves up, down, right and left
+        for ray in _RAYS[self._square]:
+            # Loop until another piece is encountered
+            for square in ray:
+                target = board[square]
+                if not target:
+                    valid_moves.append(square)
+                    continue
+                if target.get_color() != self._color:
+                    valid_moves.append(square)
                 break
-            elif [location[0] - 1, location[1]] in enemy_locations:
-                valid_moves.append(self.location_from_list(
-                    [location[0] - 1, location[1]]))
-                break
-            else:
-                valid_moves.append(self.location_from_list(
-                    [location[0] - 1, location[1]]))
-            location[0] -= 1
 
         self._valid_moves = valid_moves
 
@@ -505,97 +422,41 @@ class Cannon(Piece):
 
     """Class representing a Cannon piece."""
 
+    __slots__ = ()
+
     def __init__(self, starting_pos, color):
         """Creates an instance of a Cannon class."""
         super().__init__(starting_pos, color)
         self._rank = 'Cannon'
 
-    def update_valid_moves(self, other_pieces):
+    def update_valid_moves(self, board, bitboards=None):
         """
         Updates the list of valid moves for the piece.
+        Uses the rank and file tables when the game's bitboards are passed in.
         Doesn't check if the move puts the General in check.
         """
-        enemy_pieces = [
-            piece for piece in other_pieces if piece.get_color() != self._color]
-        other_locations = [piece.location_to_list() for piece in other_pieces]
-        enemy_locations = [piece.location_to_list() for piece in enemy_pieces]
+        if bitboards:
+            moves = bitboards.cannon_moves(self._square, self._color)
+            self._valid_moves = bitboards.squares(moves)
+            return
 
         valid_moves = []
-        # Check all moves if piece is moving up
-        location = self.location_to_list()
-        collisions = 0
-        while location[1] < 10:
-            # Check if cannon has encountered another piece yet
-            if collisions == 1:
-                if [location[0], location[1] + 1] in enemy_locations:
-                    valid_moves.append(self.location_from_list(
-                        [location[0], location[1] + 1]))
-                    break
-            else:
+        # Check all moves up, down, right and left
+        for ray in _RAYS[self._square]:
+            collisions = 0
+            for square in ray:
+                target = board[square]
+                # Check if cannon has encountered another piece yet
+                if collisions == 1:
+                    if target:
+                        if target.get_color() != self._color:
+                            valid_moves.append(square)
+                        break
                 # Check if next spot is occupied
-                if [location[0], location[1] + 1] in other_locations:
+                elif target:
                     collisions += 1
                 else:
-                    valid_moves.append(self.location_from_list(
-                        [location[0], location[1] + 1]))
-            location[1] += 1
-
-        # Check all moves if piece is moving down
-        location = self.location_to_list()
-        collisions = 0
-        while location[1] > 1:
-            # Check if cannon has encountered another piece yet
-            if collisions == 1:
-                if [location[0], location[1] - 1] in enemy_locations:
-                    valid_moves.append(self.location_from_list(
-                        [location[0], location[1] - 1]))
-                    break
-            else:
-                # Check if next spot is occupied
-                if [location[0], location[1] - 1] in other_locations:
-                    collisions += 1
-                else:
-                    valid_moves.append(self.location_from_list(
-                        [location[0], location[1] - 1]))
-            location[1] -= 1
-
-        # Check all moves if piece is moving right
-        location = self.location_to_list()
-        collisions = 0
-        while location[0] < 9:
-            # Check if cannon has encountered another piece yet
-            if collisions == 1:
-                if [location[0] + 1, location[1]] in enemy_locations:
-                    valid_moves.append(self.location_from_list(
-                        [location[0] + 1, location[1]]))
-                    break
-            else:
-                # Check if next spot is occupied
-                if [location[0] + 1, location[1]] in other_locations:
-                    collisions += 1
-                else:
-                    valid_moves.append(self.location_from_list(
-                        [location[0] + 1, location[1]]))
-            location[0] += 1
-
-        # Check all moves if piece is moving left
-        location = self.location_to_list()
-        collisions = 0
-        while location[0] > 1:
-            # Check if cannon has encountered another piece yet
-            if collisions == 1:
-                if [location[0] - 1, location[1]] in enemy_locations:
-                    valid_moves.append(self.location_from_list(
-                        [location[0] - 1, location[1]]))
-                    break
-            else:
-                # Check if next spot is occupied
-                if [location[0] - 1, location[1]] in other_locations:
-                    collisions += 1
-                else:
-                    valid_moves.append(self.location_from_list(
-                        [location[0] - 1, location[1]]))
-            location[0] -= 1
+                    valid_moves.append(square)
 
         self._valid_moves = valid_moves
 
@@ -608,65 +469,182 @@ class Soldier(Piece):
 
     """Class representing a Soldier piece."""
 
+    __slots__ = ()
+
     def __init__(self, starting_pos, color):
         """Creates an instance of a Soldier class."""
         super().__init__(starting_pos, color)
         self._rank = 'Soldier'
 
-    def update_valid_moves(self, other_pieces):
+    def __str__(self):
+        """Returns a string representing the piece used in print statements."""
+        return self._color.upper()[0] + 'S'
+
+
+def _build_line_tables(length):
+    """
+    Builds sliding move tables for a line of the inputted length, indexed by the position of
+    the piece on the line times 2 ** length plus the occupancy of the line.
+    Returns the chariot moves, the cannon's non-capturing moves, the cannon's capture
+    targets and the cannon's reach, which is every position past the screen up to and
+    including the next piece, all as masks of positions on the line including any occupied squares.
+    """
+    slides = []
+    cannon_moves = []
+    cannon_targets = []
+    cannon_reaches = []
+    for position in range(length):
+        for occupancy in range(1 << length):
+            slide = 0
+            cannon_move = 0
+            cannon_target = 0
+            cannon_reach = 0
+            for step in (1, -1):
+                current = position + step
+                # Walk to the first blocker, which is the cannon's screen
+                while 0 <= current < length and not occupancy >> current & 1:
+                    slide |= 1 << current
+                    cannon_move |= 1 << current
+                    current += step
+                if 0 <= current < length:
+                    slide |= 1 << current
+                    current += step
+                    # The cannon can only capture the first piece behind its screen, but could
+                    # capture on any empty square before it if an enemy piece stood there
+                    while 0 <= current < length and not occupancy >> current & 1:
+                        cannon_reach |= 1 << current
+                        current += step
+                    if 0 <= current < length:
+                        cannon_target |= 1 << current
+                        cannon_reach |= 1 << current
+            slides.append(slide)
+            cannon_moves.append(cannon_move)
+            cannon_targets.append(cannon_target)
+            cannon_reaches.append(cannon_reach)
+    return slides, cannon_moves, cannon_targets, cannon_reaches
+
+
+# Bit for each square in the file-major (rotated) occupancy bitboards
+_FILE_BITS = [1 << (square % 9 * 10 + square // 9) for square in range(90)]
+# Rank and file sliding tables, built the first time a Bitboards object is created
+_LINE_TABLES = {}
+
+
+# Returns the (rank, color) of a piece, as taken by general_attacked
+_describe_piece = operator.attrgetter('_rank', '_color')
+
+# Piece classes in the order used for compact position codes, where a red piece's code is its
+# index plus 1 and a black piece's code is its index plus 8
+_PIECE_CLASSES = (General, Advisor, Elephant, Horse, Chariot, Cannon, Soldier)
+_PIECE_CODES = {}
+for _index, _piece_class in enumerate(_PIECE_CLASSES):
+    _PIECE_CODES[_piece_class.__name__, 'red'] = _index + 1
+    _PIECE_CODES[_piece_class.__name__, 'black'] = _index + 8
+
+# Flags recorded for each move when the long check rulings are in use
+_GAVE_CHECK = 1
+_CHASED = 2
+
+# FEN letters for red pieces by position code, with black pieces using the lowercase letters
+_FEN_LETTERS = ' KABNRCP'
+# Letters accepted when reading FEN, including the E and H some sources use for elephants and horses
+_FEN_CODES = {letter: code for code, letter in enumerate(_FEN_LETTERS) if letter != ' '}
+_FEN_CODES.update({'E': _FEN_CODES['B'], 'H': _FEN_CODES['N']})
+
+# Game states in the order they are numbered by to_bytes
+_GAME_STATES = ('UNFINISHED', 'RED_WON', 'BLACK_WON', 'DRAW')
+# Version, flags, game state, plies since the last capture and full move number, before the position
+_STATE_HEADER = struct.Struct('<BBBHH')
+_STATE_VERSION = 1
+# Flag for bytes that also hold the starting position and the moves made from it
+_STATE_HISTORY = 1
+# Plies since the last capture, full move number and number of moves, before the moves
+_HISTORY_HEADER = struct.Struct('<HHH')
+# Largest move counter or number of moves the 2 byte fields hold
+_MAX_COUNTER = 0xFFFF
+
+
+class Bitboards:
+
+    """
+    Optional bitboard representation of a game's pieces that provides sliding moves.
+    Keeps a 90-bit integer for each color and for each piece type of each color, along with
+    a file-major copy of each color's occupancy so that a file can be read as 10 contiguous bits.
+    """
+
+    def __init__(self, pieces):
+        """Creates an instance of a Bitboards class from a list of pieces."""
+        if not _LINE_TABLES:
+            _LINE_TABLES['rank'] = _build_line_tables(9)
+            _LINE_TABLES['file'] = _build_line_tables(10)
+            # Converts a mask of rows on the first file into board squares
+            _LINE_TABLES['spread'] = [
+                sum(1 << row * 9 for row in range(10) if line >> row & 1) for line in range(1 << 10)
+            ]
+
+        self._colors = {'red': 0, 'black': 0}
+        self._files = {'red': 0, 'black': 0}
+        self._ranks = {}
+        for piece in pieces:
+            self.add(piece, piece.get_square())
+
+    def get_pieces(self, rank, color):
+        """Returns the bitboard of the pieces of the inputted rank and color."""
+        return self._ranks.get((rank, color), 0)
+
+    def get_color(self, color):
+        """Returns the bitboard of all pieces of the inputted color."""
+        return self._colors[color]
+
+    def add(self, piece, square):
+        """Adds a piece to the bitboards on the inputted square."""
+        color = piece.get_color()
+        key = (piece.get_rank(), color)
+        self._colors[color] |= 1 << square
+        self._files[color] |= _FILE_BITS[square]
+        self._ranks[key] = self._ranks.get(key, 0) | 1 << square
+
+    def remove(self, piece, square):
+        """Removes a piece from the bitboards on the inputted square."""
+        color = piece.get_color()
+        key = (piece.get_rank(), color)
+        self._colors[color] &= ~(1 << square)
+        self._files[color] &= ~_FILE_BITS[square]
+        self._ranks[key] &= ~(1 << square)
+
+    def _line_moves(self, square, table):
         """
-        Updates the list of valid moves for the piece.
-        Doesn't check if the move puts the General in check.
+        Looks up the rank and file masks for a sliding piece on the inputted square
+        in the inputted table and returns them combined as a board bitboard.
         """
-        team_pieces = [
-            piece for piece in other_pieces if piece.get_color() == self._color]
-        team_locations = [piece.location_to_list() for piece in team_pieces]
+        row, column = divmod(square, 9)
+        occupied = self._colors['red'] | self._colors['black']
+        occupied_files = self._files['red'] | self._files['black']
+        rank_table = _LINE_TABLES['rank'][table]
+        file_table = _LINE_TABLES['file'][table]
 
-        location = self.location_to_list()
-        valid_moves = []
-        # Check moves for red
-        if self._color == 'red':
-            # Check move forward
-            if location[1] < 10 and [location[0], location[1] + 1] not in team_locations:
-                valid_moves.append(self.location_from_list(
-                    [location[0], location[1] + 1]))
-
-            # Check if the piece has crossed the river
-            if location[1] > 5:
-                # Check move to right
-                if location[0] < 9 and [location[0] + 1, location[1]] not in team_locations:
-                    valid_moves.append(self.location_from_list(
-                        [location[0] + 1, location[1]]))
-
-                # Check move to left
-                if location[0] > 1 and [location[0] - 1, location[1]] not in team_locations:
-                    valid_moves.append(self.location_from_list(
-                        [location[0] - 1, location[1]]))
-
-        # Check moves for black
-        if self._color == 'black':
-            # Check move forward
-            if location[1] > 1 and [location[0], location[1] - 1] not in team_locations:
-                valid_moves.append(self.location_from_list(
-                    [location[0], location[1] - 1]))
-
-            # Check if the piece has crossed the river
-            if location[1] < 6:
-                # Check move to right
-                if location[0] < 9 and [location[0] + 1, location[1]] not in team_locations:
-                    valid_moves.append(self.location_from_list(
-                        [location[0] + 1, location[1]]))
-
-                # Check move to left
-                if location[0] > 1 and [location[0] - 1, location[1]] not in team_locations:
-                    valid_moves.append(self.location_from_list(
-                        [location[0] - 1, location[1]]))
+        rank_moves = rank_table[column << 9 | occupied >> row * 9 & 0x1ff] << row * 9
+        file_line = file_table[row << 10 | occupied_files >> column * 10 & 0x3ff]
+        return rank_moves | _LINE_TABLES['spread'][file_line] << column
 
-        self._valid_moves = valid_moves
+    def chariot_moves(self, square, color):
+        """Returns a bitboard of the moves for a chariot of the inputted color on the inputted square."""
+        return self._line_moves(square, 0) & ~self._colors[color]
 
-    def __str__(self):
-        """Returns a string representing the piece used in print statements."""
-        return self._color.upper()[0] + 'S'
+    def cannon_moves(self, square, color):
+        """Returns a bitboard of the moves for a cannon of the inputted color on the inputted square."""
+        enemy = self._colors['black' if color == 'red' else 'red']
+        return self._line_moves(square, 1) | self._line_moves(square, 2) & enemy
+
+    @staticmethod
+    def squares(bitboard):
+        """Returns a list of the squares set in a bitboard."""
+        squares = []
+        while bitboard:
+            lowest = bitboard & -bitboard
+            squares.append(lowest.bit_length() - 1)
+            bitboard ^= lowest
+        return squares
 
 
 class XiangqiGame:
@@ -676,12 +654,319 @@ class XiangqiGame:
     Will contain all of the methods and members needed to make the game playable.
     """
 
-    def __init__(self):
-        """Creates an instance of a XiangqiGame class."""
+    # Whether pickles of games hold the moves made so they can still be undone after unpickling,
+    # which replays every move when unpickling. Set it on a game or on the class to turn it on.
+    pickle_history = False
+
+    def __init__(
+        self, incremental=True, verify_moves=False, bitboards=False, position=None, weights=None,
+        repetition_limit=None, no_capture_limit=None, ply_limit=None, long_check_rules=False
+    ):
+        """
+        Creates an instance of a XiangqiGame class.
+        incremental only regenerates the moves of pieces affected by each move, and
+        verify_moves checks every incremental update against a full rebuild for debugging.
+        bitboards generates Chariot and Cannon moves from bitboard rank and file tables.
+        position takes a compact position from get_position to start from instead of the
+        starting position.
+        weights takes the EvalWeights used by evaluate, otherwise the default weights are used.
+
+        The draw rules are all off by default. repetition_limit draws the game when a position
+        occurs that many times, no_capture_limit when that many plies pass without a capture,
+        and ply_limit when that many plies have been played. long_check_rules decides repetitions
+        by the long check and long chase rulings instead of always drawing them.
+        """
+        self._set_options(
+            incremental, verify_moves, bitboards, weights,
+            repetition_limit, no_capture_limit, ply_limit, long_check_rules
+        )
+        if position is not None:
+            self._set_position(*self._decode_position(position))
+        else:
+            self._set_position(self._starting_pieces(), 'red')
+
+        # Populate all of the initial moves for the pieces
+        self.update_moves()
+
+        # A position given to start from may already be lost for the player to move
+        if position is not None and self.is_game_over(self._turn):
+            self._game_state = 'BLACK_WON' if self._turn == 'red' else 'RED_WON'
+
+    def _set_options(
+        self, incremental=True, verify_moves=False, bitboards=False, weights=None,
+        repetition_limit=None, no_capture_limit=None, ply_limit=None, long_check_rules=False
+    ):
+        """Sets the options described in __init__."""
+        self._incremental = incremental
+        self._verify_moves = verify_moves
+        # Replaced by the game's Bitboards once the pieces are placed
+        self._bitboards = bitboards
+        self._repetition_limit = repetition_limit
+        self._no_capture_limit = no_capture_limit
+        self._ply_limit = ply_limit
+        self._long_check_rules = long_check_rules
+        self._draw_rules = bool(repetition_limit or no_capture_limit or ply_limit)
+        # Static evaluation weights, with the evaluation itself set by update_moves
+        self._weights = weights if weights is not None else DEFAULT_WEIGHTS
+        # Counters and timings of the hot path methods, set up by enable_profiling
+        self._profiler = None
+        # Search engine and its transposition table, set up the first time best_move is called
+        self._engine = None
+
+    def get_options(self):
+        """
+        Returns a dictionary of the options the game was created with, which can be passed as keyword
+        arguments to XiangqiGame, from_fen or from_bytes to create another game with the same options.
+        """
+        return {
+            'incremental': self._incremental, 'verify_moves': self._verify_moves,
+            'bitboards': self._bitboards is not None,
+            'weights': self._weights if self._weights is not DEFAULT_WEIGHTS else None,
+            'repetition_limit': self._repetition_limit, 'no_capture_limit': self._no_capture_limit,
+            'ply_limit': self._ply_limit, 'long_check_rules': self._long_check_rules,
+        }
+
+    def _set_position(self, pieces, turn):
+        """
+        Sets the game up with the inputted pieces and turn and no moves made. The pieces' valid moves
+        are left to be generated by update_moves, which happens the first time they are needed.
+        """
         self._game_state = 'UNFINISHED'
-        self._turn = 'red'
-        # Initialize all pieces
-        self._pieces = [
+        self._turn = turn
+        # Plies since the last capture and the number of the current full move, as used in FEN
+        self._halfmove_clock = 0
+        self._fullmove_number = 1
+        self._pieces = pieces
+        self._captured_pieces = []
+
+        # Mailbox board indexed by square that holds the piece on each square or None
+        self._board = [None] * 90
+        self._generals = {}
+        for piece in self._pieces:
+            self._board[piece.get_square()] = piece
+            if piece.get_rank() == 'General':
+                self._generals[piece.get_color()] = piece
+        self._bitboards = Bitboards(self._pieces) if self._bitboards else None
+
+        # Records of every move made so they can be undone, most recent last
+        self._undo_stack = []
+
+        # Zobrist hash of the current position and of every position reached so far
+        self._hash = self._compute_hash()
+        self._hash_history = [self._hash]
+        # Number of times each position hash has occurred, kept when repetitions are counted
+        self._position_counts = {self._hash: 1} if self._repetition_limit else None
+        # Whether each move gave check or chased a piece, kept for the long check rulings
+        self._move_flags = [] if self._long_check_rules else None
+
+        # Static evaluation from red's side, kept up to date as moves are made
+        self._score = 0
+        # Whether the pieces' valid moves and the evaluation still need generating
+        self._moves_stale = True
+
+    def to_bytes(self, history=False):
+        """
+        Returns the game's state as 98 bytes: a version, flags, the game state, the move counters and
+        the position from get_position. history adds the position the game started from and the
+        moves made since, 2 bytes each, so that they can be undone after loading.
+        Options such as the draw rules aren't included, pass them to from_bytes. Move counters
+        past 65535 are saved as 65535, and a history of more moves than that raises ValueError.
+        """
+        data = bytearray(_STATE_HEADER.pack(
+            _STATE_VERSION, _STATE_HISTORY if history else 0, _GAME_STATES.index(self._game_state),
+            min(self._halfmove_clock, _MAX_COUNTER), min(self._fullmove_number, _MAX_COUNTER)
+        ))
+        data += self.get_position()
+        if not history:
+            return bytes(data)
+        if len(self._undo_stack) > _MAX_COUNTER:
+            raise ValueError(f'Can only save a history of up to {_MAX_COUNTER} moves')
+
+        # Work back to the starting position through the undo records rather than undoing the moves
+        codes = bytearray(self.get_position())
+        for record in reversed(self._undo_stack):
+            from_square, to_square, piece_to_capture = record[:3]
+            codes[from_square] = codes[to_square]
+            codes[to_square] = _PIECE_CODES[piece_to_capture.get_rank(), piece_to_capture.get_color()] \
+                if piece_to_capture else 0
+        if self._undo_stack:
+            first = self._undo_stack[0]
+            codes[90] = 0 if first[6] == 'red' else 1
+            halfmove_clock, fullmove_number = first[8], first[9]
+        else:
+            halfmove_clock, fullmove_number = self._halfmove_clock, self._fullmove_number
+        data += codes
+        data += _HISTORY_HEADER.pack(
+            min(halfmove_clock, _MAX_COUNTER), min(fullmove_number, _MAX_COUNTER), len(self._undo_stack)
+        )
+        for record in self._undo_stack:
+            data += bytes(record[:2])
+        return bytes(data)
+
+    @classmethod
+    def from_bytes(cls, data, **options):
+        """
+        Takes bytes from to_bytes and returns the game they hold. Any keyword arguments are options
+        passed on to XiangqiGame. Without a history the pieces' moves are only generated when first
+        needed, so loading a game just to look at its position or state stays cheap.
+        """
+        game = cls.__new__(cls)
+        game._set_options(**options)
+        game._load_bytes(data)
+        return game
+
+    def _load_bytes(self, data, trusted=False):
+        """
+        Sets the game up from bytes written by to_bytes, replaying any history they hold.
+        trusted replays the history without checking that each move is legal, for bytes known
+        to come from to_bytes such as the game's own pickles.
+        """
+        data = bytes(data)
+        if len(data) < _STATE_HEADER.size + 91:
+            raise ValueError('Game state bytes are too short')
+        version, flags, state, halfmove_clock, fullmove_number = _STATE_HEADER.unpack_from(data, 0)
+        if version != _STATE_VERSION or state >= len(_GAME_STATES):
+            raise ValueError(f'Game state bytes are not version {_STATE_VERSION}')
+        offset = _STATE_HEADER.size
+        position = data[offset:offset + 91]
+        offset += 91
+
+        if flags & _STATE_HISTORY:
+            self._set_position(*self._decode_position(data[offset:offset + 91]))
+            offset += 91
+            if len(data) < offset + _HISTORY_HEADER.size:
+                raise ValueError('Game state bytes are too short for their history')
+            self._halfmove_clock, self._fullmove_number, move_count = _HISTORY_HEADER.unpack_from(data, offset)
+            offset += _HISTORY_HEADER.size
+            moves = data[offset:offset + 2 * move_count]
+            if len(moves) != 2 * move_count:
+                raise ValueError('Game state bytes are too short for their moves')
+            for index in range(0, len(moves), 2):
+                if trusted:
+                    self.push_move(moves[index], moves[index + 1])
+                elif not self._play_square_move(moves[index], moves[index + 1]):
+                    raise ValueError(f'Illegal move {index // 2 + 1} in game state bytes')
+            if self.get_position() != position:
+                raise ValueError('Game state bytes do not replay to their position')
+        else:
+            self._set_position(*self._decode_position(position))
+
+        self._game_state = _GAME_STATES[state]
+        self._halfmove_clock = halfmove_clock
+        self._fullmove_number = fullmove_number
+
+    def __getstate__(self):
+        """
+        Returns the state pickled for the game: its bytes and options, and its hash history and long
+        check flags so the draw rules carry on as in clone. With pickle_history the bytes also hold the
+        moves made, so they can be undone after unpickling, and the rest comes from replaying them.
+        """
+        if self.pickle_history:
+            return {'data': self.to_bytes(history=True), 'options': self.get_options()}
+        return {
+            'data': self.to_bytes(), 'options': self.get_options(), 'hash_history': self._hash_history,
+            'move_flags': bytes(self._move_flags) if self._move_flags is not None else None,
+        }
+
+    def __setstate__(self, state):
+        """
+        Sets an unpickled game up from the state returned by __getstate__. Any history came from
+        to_bytes, so its moves are replayed without checking them again.
+        """
+        self._set_options(**state['options'])
+        self._load_bytes(state['data'], trusted=True)
+        if 'hash_history' in state:
+            self._hash_history = list(state['hash_history'])
+            if self._position_counts is not None:
+                self._position_counts = {}
+                for position_hash in self._hash_history:
+                    self._position_counts[position_hash] = self._position_counts.get(position_hash, 0) + 1
+            if self._move_flags is not None and state['move_flags'] is not None:
+                self._move_flags = list(state['move_flags'])
+
+    def clone(self):
+        """
+        Returns an independent copy of the game in its current position, much faster than
+        copy.deepcopy. Pieces are copied but share their lists of valid moves, and the hash history
+        and draw rule counts carry over, but moves made before cloning can't be undone in the copy.
+        Profiling and the search engine used by best_move aren't carried over.
+        """
+        game = object.__new__(type(self))
+        game.__dict__.update(self.__dict__)
+        for name in PROFILED_METHODS:
+            game.__dict__.pop(name, None)
+        game._profiler = None
+        game._engine = None
+
+        game._pieces = [piece.copy() for piece in self._pieces]
+        game._captured_pieces = [piece.copy() for piece in self._captured_pieces]
+        game._board = [None] * 90
+        game._generals = {}
+        for piece in game._pieces:
+            game._board[piece.get_square()] = piece
+            if piece.get_rank() == 'General':
+                game._generals[piece.get_color()] = piece
+        if self._bitboards:
+            game._bitboards = Bitboards(game._pieces)
+
+        game._undo_stack = []
+        game._hash_history = list(self._hash_history)
+        if self._position_counts is not None:
+            game._position_counts = dict(self._position_counts)
+        if self._move_flags is not None:
+            game._move_flags = list(self._move_flags)
+        return game
+
+    def snapshot(self):
+        """
+        Returns a snapshot of the game's current state that restore can put this game back to later,
+        for trying out moves and throwing them away. The snapshot isn't changed by later moves and
+        can be restored any number of times, but only to the game it was taken from.
+        """
+        if self._moves_stale:
+            self.update_moves()
+        pieces = tuple(self._pieces)
+        return (
+            self, pieces, tuple(piece.get_square() for piece in pieces),
+            tuple(piece.get_valid_squares() for piece in pieces), tuple(self._captured_pieces),
+            tuple(self._undo_stack), tuple(self._hash_history),
+            dict(self._position_counts) if self._position_counts is not None else None,
+            tuple(self._move_flags) if self._move_flags is not None else None,
+            self._turn, self._game_state, self._halfmove_clock, self._fullmove_number, self._score, self._hash
+        )
+
+    def restore(self, snapshot):
+        """Takes a snapshot from this game's snapshot method and puts the game back to the state it holds."""
+        (
+            game, pieces, squares, valid_moves, captured_pieces, undo_stack, hash_history,
+            position_counts, move_flags, self._turn, self._game_state, self._halfmove_clock,
+            self._fullmove_number, self._score, self._hash
+        ) = snapshot
+        if game is not self:
+            raise ValueError('A snapshot can only be restored to the game it was taken from')
+
+        board = [None] * 90
+        for piece, square, moves in zip(pieces, squares, valid_moves):
+            piece.set_square(square)
+            piece.set_valid_squares(moves)
+            board[square] = piece
+        self._board = board
+        self._pieces = list(pieces)
+        self._captured_pieces = list(captured_pieces)
+        if self._bitboards:
+            self._bitboards = Bitboards(self._pieces)
+
+        self._undo_stack = list(undo_stack)
+        self._hash_history = list(hash_history)
+        if position_counts is not None:
+            self._position_counts = dict(position_counts)
+        if move_flags is not None:
+            self._move_flags = list(move_flags)
+
+    @staticmethod
+    def _starting_pieces():
+        """Returns a list of the pieces in the starting position."""
+        return [
             General('e1', 'red'), General(
                 'e10', 'black'), Advisor('d1', 'red'),
             Advisor('f1', 'red'), Advisor(
@@ -699,147 +984,702 @@ class XiangqiGame:
                 'c7', 'black'), Soldier('e7', 'black'),
             Soldier('g7', 'black'), Soldier('i7', 'black')
         ]
-        self._captured_pieces = []
 
-        # Populate all of the initial moves for the pieces
-        self.update_moves()
+    def get_position(self):
+        """
+        Returns the current position as 91 bytes, a piece code for every square followed by the
+        turn, which is cheap to send to other processes. Pass it back in as position to rebuild it.
+        """
+        codes = bytearray(91)
+        for piece in self._pieces:
+            codes[piece.get_square()] = _PIECE_CODES[piece.get_rank(), piece.get_color()]
+        codes[90] = 0 if self._turn == 'red' else 1
+        return bytes(codes)
+
+    @classmethod
+    def from_fen(cls, fen, **options):
+        """
+        Takes a position in Xiangqi FEN, for example the starting position
+        'rnbakabnr/9/1c5c1/p1p1p1p1p/9/9/P1P1P1P1P/1C5C1/9/RNBAKABNR w - - 0 1', and returns a game
+        set up at that position. Red pieces are uppercase, ranks run from 10 down to 1, the side to
+        move is 'w' or 'r' for red and 'b' for black, and the move counters are optional.
+        Any other keyword arguments are passed on to XiangqiGame.
+        """
+        fields = fen.split()
+        ranks = fields[0].split('/') if fields else []
+        if len(ranks) != 10:
+            raise ValueError(f'FEN board must have 10 ranks: {fen!r}')
+
+        position = bytearray(91)
+        for rank_index, rank in enumerate(ranks):
+            row = 9 - rank_index
+            column = 0
+            for letter in rank:
+                if letter.isdigit():
+                    column += int(letter)
+                    continue
+                code = _FEN_CODES.get(letter.upper())
+                if code is None or column > 8:
+                    raise ValueError(f'Bad FEN rank {rank!r}: {fen!r}')
+                position[row * 9 + column] = code if letter.isupper() else code + 7
+                column += 1
+            if column != 9:
+                raise ValueError(f'FEN rank {rank!r} does not have 9 columns: {fen!r}')
+
+        side = fields[1].lower() if len(fields) > 1 else 'w'
+        if side not in ('w', 'r', 'b'):
+            raise ValueError(f'Bad FEN side to move {fields[1]!r}: {fen!r}')
+        position[90] = 1 if side == 'b' else 0
+
+        game = cls(position=bytes(position), **options)
+        # The move counters are the last two fields when present
+        if len(fields) >= 4 and fields[-1].isdigit() and fields[-2].isdigit():
+            halfmove_clock, fullmove_number = int(fields[-2]), int(fields[-1])
+            if halfmove_clock > _MAX_COUNTER or fullmove_number > _MAX_COUNTER:
+                raise ValueError(f'FEN move counters must be at most {_MAX_COUNTER}: {fen!r}')
+            game._halfmove_clock = halfmove_clock
+            game._fullmove_number = fullmove_number
+        return game
+
+    def to_fen(self):
+        """Returns the current position in Xiangqi FEN, including the side to move and move counters."""
+        ranks = []
+        for row in range(9, -1, -1):
+            rank = ''
+            empty = 0
+            for square in range(row * 9, row * 9 + 9):
+                piece = self._board[square]
+                if not piece:
+                    empty += 1
+                    continue
+                if empty:
+                    rank += str(empty)
+                    empty = 0
+                code = _PIECE_CODES[piece.get_rank(), piece.get_color()]
+                rank += _FEN_LETTERS[code] if code < 8 else _FEN_LETTERS[code - 7].lower()
+            if empty:
+                rank += str(empty)
+            ranks.append(rank)
+
+        side = 'w' if self._turn == 'red' else 'b'
+        return f'{"/".join(ranks)} {side} - - {self._halfmove_clock} {self._fullmove_number}'
+
+    @staticmethod
+    def _decode_position(position):
+        """Takes a compact position from get_position and returns a list of its pieces and the turn."""
+        if len(position) != 91 or position[90] > 1:
+            raise ValueError('A position must be 90 piece codes followed by the turn')
+
+        pieces = []
+        for square, code in enumerate(position[:90]):
+            if code > 2 * len(_PIECE_CLASSES):
+                raise ValueError(f'Bad piece code {code} on square {_SQUARE_NAMES[square]}')
+            if code:
+                color = 'red' if code < 8 else 'black'
+                pieces.append(_PIECE_CLASSES[code - 1 if code < 8 else code - 8](_SQUARE_NAMES[square], color))
+        generals = [piece.get_color() for piece in pieces if piece.get_rank() == 'General']
+        if sorted(generals) != ['black', 'red']:
+            raise ValueError('A position must have exactly one General of each color')
+        return pieces, 'red' if position[90] == 0 else 'black'
 
     def get_game_state(self):
-        """Returns the current state of the game."""
+        """Returns the current state of the game: 'UNFINISHED', 'RED_WON', 'BLACK_WON' or 'DRAW'."""
         return self._game_state
 
+    def get_turn(self):
+        """Returns the color of the player whose turn it is."""
+        return self._turn
+
     def is_in_check(self, color):
         """Takes a color as input and returns whether that player is in check."""
-        # Locate the general
-        for piece in self._pieces:
-            if piece.get_color() == color and piece.get_rank() == 'General':
-                general_location = piece.get_location()
-                break
-
-        enemy_pieces = [
-            piece for piece in self._pieces if piece.get_color() != color]
-
-        # See if the General is in any of the enemy pieces valid moves lists
-        for piece in enemy_pieces:
-            if general_location in piece.get_valid_moves():
-                return True
-
-        # Get other general location
-        for piece in self._pieces:
-            if piece.get_color() != color and piece.get_rank() == 'General':
-                enemy_general_location = piece.get_location()
-                break
+        general_square = self._generals[color].get_square()
+        return self._general_attacked(general_square, 'black' if color == 'red' else 'red')
 
-        # Check if Generals are on the same file with no intervening pieces
-        if general_location[0] == enemy_general_location[0]:
-            non_generals = [
-                piece for piece in self._pieces if piece.get_rank() != 'General']
-            # Loop through all pieces to see if any are on same file
-            for piece in non_generals:
-                if piece.get_location()[0] == general_location[0]:
-                    return False
-            return True
-
-        return False
+    def _general_attacked(self, square, enemy_color):
+        """Returns whether a general on the inputted square could be captured by the enemy color."""
+        return general_attacked(square, enemy_color, self._board, _describe_piece)
 
     def is_game_over(self, color):
         """Takes a color as input and returns whether that player has been defeated."""
-        friendly_pieces = [
-            piece for piece in self._pieces if piece.get_color() == color]
-
-        # Check if any possible moves do not result in check
-        for piece in friendly_pieces:
-            for move in piece.get_valid_moves():
-                # Make the move
-                previous_location = piece.get_location()
-                piece_to_capture = self.piece_from_location(move)
-                piece.set_location(move)
-                if piece_to_capture:
-                    self.remove_piece(piece_to_capture)
-                self.update_moves()
-                in_check = self.is_in_check(color)
-
-                # Undo the move
-                piece.set_location(previous_location)
-                if piece_to_capture:
-                    self.add_piece(piece_to_capture)
-                self.update_moves()
-
-                # Return false if the move does not result in check
-                if not in_check:
-                    return False
+        # The player has lost if they have no legal moves, so stop at the first one found
+        return next(self._legal_moves(color), None) is None
 
-        return True
+    def legal_moves(self, color=None):
+        """
+        Takes an optional color, defaulting to the player whose turn it is, and lazily yields
+        (current_pos, new_pos) pairs for every legal move that player has.
+        """
+        for from_square, to_square in self._legal_moves(color or self._turn):
+            yield _SQUARE_NAMES[from_square], _SQUARE_NAMES[to_square]
+
+    def legal_square_moves(self, color=None):
+        """
+        Takes an optional color, defaulting to the player whose turn it is, and lazily yields
+        (from_square, to_square) pairs of square numbers for every legal move that player has.
+        The position must be back to how it was before asking for the next move.
+        """
+        return self._legal_moves(color or self._turn)
+
+    def _legal_moves(self, color):
+        """
+        Lazily yields (from_square, to_square) pairs for every legal move of the inputted color.
+        Works out the checkers and pins up front so that only moves by the General, moves while
+        in check and moves touching a pinned or screening square need to be tested.
+        The position must be back to how it was before asking for the next move.
+        """
+        if self._moves_stale:
+            self.update_moves()
+        enemy_color = 'black' if color == 'red' else 'red'
+        general = self._generals[color]
+        general_square = general.get_square()
+        in_check = self._general_attacked(general_square, enemy_color)
+        sensitive_squares = self._sensitive_squares(general_square, enemy_color)
+
+        for piece in [piece for piece in self._pieces if piece.get_color() == color]:
+            from_square = piece.get_square()
+            test_all = in_check or piece is general or from_square in sensitive_squares
+            for to_square in piece.get_valid_squares():
+                if (
+                    (test_all or to_square in sensitive_squares)
+                    and not self._is_legal_move(from_square, to_square)
+                ):
+                    continue
+                yield from_square, to_square
+
+    def _sensitive_squares(self, general_square, enemy_color):
+        """Returns the squares where moving a piece away or onto could expose the General, see sensitive_squares."""
+        return sensitive_squares(general_square, enemy_color, self._board, _describe_piece)
+
+    def _is_legal_move(self, from_square, to_square):
+        """
+        Returns whether moving the piece on from_square to to_square leaves its General safe.
+        Only swaps the pieces on the board around the check test, so no move lists are touched.
+        """
+        board = self._board
+        piece = board[from_square]
+        piece_to_capture = board[to_square]
+        color = piece.get_color()
+        general_square = self._generals[color].get_square()
+        if general_square == from_square:
+            general_square = to_square
+
+        board[from_square] = None
+        board[to_square] = piece
+        in_check = self._general_attacked(general_square, 'black' if color == 'red' else 'red')
+        board[from_square] = piece
+        board[to_square] = piece_to_capture
+        return not in_check
 
     def piece_from_location(self, location):
         """Takes a location as input and returns the piece on that location."""
-        for piece in self._pieces:
-            if piece.get_location() == location:
-                return piece
+        if self._moves_stale:
+            self.update_moves()
+        square = _SQUARE_INDEX.get(location)
+        if square is not None:
+            return self._board[square]
 
-    def remove_piece(self, piece):
-        """Takes a piece as input and moves it to the captured pieces list."""
-        self._pieces.remove(piece)
-        self._captured_pieces.append(piece)
+    def piece_at(self, square):
+        """Takes a square number as input and returns the piece on that square."""
+        if self._moves_stale:
+            self.update_moves()
+        return self._board[square]
 
-    def add_piece(self, piece):
-        """Adds a piece back to the game in case of an illegal move."""
-        self._captured_pieces.remove(piece)
-        self._pieces.append(piece)
+    def get_pieces(self):
+        """Returns a list of the pieces still on the board."""
+        if self._moves_stale:
+            self.update_moves()
+        return list(self._pieces)
 
-    def make_move(self, current_pos, new_pos):
+    def make_move(self, current_pos, new_pos, update_state=True):
         """
         Takes a piece's current location and location to move to as input and makes
         the move if the move is determined to be valid. Returns True if the move is made
         and False otherwise.
+        update_state=False leaves checking whether the move ended the game to a later call
+        to update_game_state, for callers that want to run that search somewhere else.
+        """
+        if self._game_state != 'UNFINISHED' or not self._play_move(current_pos, new_pos):
+            return False
+
+        if update_state:
+            self.update_game_state()
+        return True
+
+    def apply_moves(self, moves):
+        """
+        Takes a sequence of (current_pos, new_pos) moves and makes them in order, stopping at the
+        first one that is not valid. Returns the index of that move, or None if every move was made.
+        Only checks whether the game is over once at the end, since a game that ended partway
+        through leaves no valid move for the next one to be.
         """
-        piece_to_move = self.piece_from_location(current_pos)
-        piece_to_capture = self.piece_from_location(new_pos)
+        return self.apply_square_moves(
+            (_SQUARE_INDEX.get(current_pos, -1), _SQUARE_INDEX.get(new_pos, -1))
+            for current_pos, new_pos in moves
+        )
+
+    def apply_square_moves(self, moves):
+        """
+        Takes an iterable of (from_square, to_square) moves given as square numbers and makes them
+        in order like apply_moves, without converting to and from algebraic notation.
+        Returns the index of the first move that is not valid, or None if every move was made.
+        """
+        if self._game_state != 'UNFINISHED':
+            # No move can be made once the game is over
+            return 0 if next(iter(moves), None) is not None else None
+
+        for index, (from_square, to_square) in enumerate(moves):
+            if self._game_state != 'UNFINISHED' or not self._play_square_move(from_square, to_square):
+                self.update_game_state()
+                return index
+            # A draw can end the game partway through, so the draw rules are checked after every move
+            if self._draw_rules:
+                self.update_game_state()
+
+        self.update_game_state()
+        return None
+
+    def _play_move(self, current_pos, new_pos):
+        """
+        Makes a move if it is valid for the player whose turn it is, without checking whether the
+        game is over afterwards. Returns True if the move is made and False otherwise.
+        """
+        return self._play_square_move(_SQUARE_INDEX.get(current_pos, -1), _SQUARE_INDEX.get(new_pos, -1))
+
+    def _play_square_move(self, from_square, to_square):
+        """Makes a move given by square numbers like _play_move. Returns whether the move was made."""
+        if not (0 <= from_square < 90 and 0 <= to_square < 90):
+            return False
+        if self._moves_stale:
+            self.update_moves()
+        piece_to_move = self._board[from_square]
 
         # Check for basic exceptions to a valid move
         if (
             not piece_to_move
-            or self._game_state != 'UNFINISHED'
             or self._turn != piece_to_move.get_color()
-            or new_pos not in piece_to_move.get_valid_moves()
+            or to_square not in piece_to_move.get_valid_squares()
         ):
             return False
 
-        # Make the move
-        piece_to_move.set_location(new_pos)
-        if piece_to_capture:
-            self.remove_piece(piece_to_capture)
-        self.update_moves()
-
-        # Revert the move if it puts the player moving in check
-        if self.is_in_check(self._turn):
-            piece_to_move.set_location(current_pos)
-            if piece_to_capture:
-                self.add_piece(piece_to_capture)
-            self.update_moves()
+        # Moves that put the player moving in check are not allowed
+        if not self._is_legal_move(from_square, to_square):
             return False
 
-        # Update the turn
-        if self._turn == 'red':
-            self._turn = 'black'
-        else:
-            self._turn = 'red'
+        # Make the move, which also updates the turn
+        self._make_move(from_square, to_square)
+        return True
 
-        # Check if the game is over
+    def update_game_state(self):
+        """
+        Checks if the player whose turn it is has been defeated, or the game has ended under the
+        draw rules in use, and updates the game state.
+        """
         if self.is_game_over(self._turn):
             if self._turn == 'red':
                 self._game_state = 'BLACK_WON'
             else:
                 self._game_state = 'RED_WON'
+        elif self._draw_rules:
+            self._game_state = self._draw_rules_state()
+
+    def _draw_rules_state(self):
+        """Returns the game state under the draw rules in use, 'UNFINISHED' if none of them end the game."""
+        if self._repetition_limit and self._position_counts[self._hash] >= self._repetition_limit:
+            return self._repetition_state() if self._long_check_rules else 'DRAW'
+        if self._no_capture_limit and self._halfmove_clock >= self._no_capture_limit:
+            return 'DRAW'
+        if self._ply_limit and len(self._hash_history) - 1 >= self._ply_limit:
+            return 'DRAW'
+        return 'UNFINISHED'
+
+    def _repetition_state(self):
+        """
+        Decides a repeated position by the long check and long chase rulings, looking at the moves
+        since the position last occurred. A player who gave check with every one of their moves
+        loses if the other player didn't, and the same goes for chasing a piece with every move
+        when neither player checked throughout. Any other repetition is a draw.
+        """
+        history = self._hash_history
+        plies = 2
+        while history[-1 - plies] != self._hash:
+            plies += 2
+        flags = self._move_flags[-plies:]
+        # Every other move in the cycle was made by the player who just moved
+        mover = 'black' if self._turn == 'red' else 'red'
+        for flag in (_GAVE_CHECK, _CHASED):
+            mover_always = all(move_flags & flag for move_flags in flags[-1::-2])
+            other_always = all(move_flags & flag for move_flags in flags[-2::-2])
+            if mover_always != other_always:
+                loser = mover if mover_always else self._turn
+                return 'BLACK_WON' if loser == 'red' else 'RED_WON'
+            if mover_always:
+                break
+        return 'DRAW'
+
+    def get_repetition_count(self):
+        """Returns the number of times the current position has occurred, including now."""
+        if self._position_counts is not None:
+            return self._position_counts[self._hash]
+        return self._hash_history.count(self._hash)
 
+    def undo_move(self):
+        """Takes back the last move made. Returns True if a move was undone and False otherwise."""
+        if not self._undo_stack:
+            return False
+        self._unmake_move()
         return True
 
+    def push_move(self, from_square, to_square):
+        """
+        Takes the square numbers of a legal move and plays it without checking it or updating
+        the game state, so search code can try moves cheaply. Undo it with pop_move.
+        """
+        if self._moves_stale:
+            self.update_moves()
+        self._make_move(from_square, to_square)
+
+    def pop_move(self):
+        """Undoes the last move played by push_move or make_move."""
+        self._unmake_move()
+
+    def _make_move(self, from_square, to_square):
+        """
+        Moves the piece on from_square to to_square, capturing any piece there, updates the
+        affected move lists and the turn, and pushes a record that _unmake_move uses to undo it.
+        Doesn't check if the move is valid.
+        """
+        board = self._board
+        piece = board[from_square]
+        piece_to_capture = board[to_square]
+
+        # Swap the captured piece out of the pieces list so it can be put back in the same place
+        captured_index = None
+        if piece_to_capture:
+            captured_index = self._pieces.index(piece_to_capture)
+            last_piece = self._pieces.pop()
+            if captured_index < len(self._pieces):
+                self._pieces[captured_index] = last_piece
+            self._captured_pieces.append(piece_to_capture)
+
+        board[from_square] = None
+        board[to_square] = piece
+        piece.set_square(to_square)
+        if self._bitboards:
+            if piece_to_capture:
+                self._bitboards.remove(piece_to_capture, to_square)
+            self._bitboards.remove(piece, from_square)
+            self._bitboards.add(piece, to_square)
+
+        # The moving piece's targets before the move, to tell which pieces it newly chases
+        previous_moves = piece.get_valid_squares() if self._move_flags is not None else None
+
+        # Keep the old move lists of every piece that gets updated
+        if self._incremental:
+            pieces_to_update = self.affected_pieces([from_square, to_square])
+        else:
+            pieces_to_update = list(self._pieces)
+        saved_moves = [current_piece.get_valid_squares() for current_piece in pieces_to_update]
+        for current_piece in pieces_to_update:
+            current_piece.update_valid_moves(board, self._bitboards)
+
+        self._undo_stack.append((
+            from_square, to_square, piece_to_capture, captured_index, pieces_to_update, saved_moves,
+            self._turn, self._game_state, self._halfmove_clock, self._fullmove_number, self._score
+        ))
+
+        # Update the evaluation with the piece's new square, any capture and the changed move counts
+        weights = self._weights
+        square_values = weights.square_values(piece.get_rank(), piece.get_color())
+        score = self._score + square_values[to_square] - square_values[from_square]
+        if piece_to_capture:
+            rank, color = piece_to_capture.get_rank(), piece_to_capture.get_color()
+            score -= weights.square_values(rank, color)[to_square]
+            score -= weights.mobility_value(rank, color) * len(piece_to_capture.get_valid_squares())
+        for current_piece, valid_moves in zip(pieces_to_update, saved_moves):
+            mobility = weights.mobility_value(current_piece.get_rank(), current_piece.get_color())
+            if mobility:
+                score += mobility * (len(current_piece.get_valid_squares()) - len(valid_moves))
+        self._score = score
+        self._halfmove_clock = 0 if piece_to_capture else self._halfmove_clock + 1
+        if self._turn == 'black':
+            self._fullmove_number += 1
+        self._turn = 'black' if self._turn == 'red' else 'red'
+
+        # Update the hash with the piece leaving, any capture, the piece arriving and the turn
+        piece_keys = _ZOBRIST_KEYS[piece.get_rank(), piece.get_color()]
+        self._hash ^= piece_keys[from_square] ^ piece_keys[to_square] ^ _ZOBRIST_BLACK_TO_MOVE
+        if piece_to_capture:
+            self._hash ^= _ZOBRIST_KEYS[piece_to_capture.get_rank(), piece_to_capture.get_color()][to_square]
+        self._hash_history.append(self._hash)
+        if self._position_counts is not None:
+            self._position_counts[self._hash] = self._position_counts.get(self._hash, 0) + 1
+        if self._move_flags is not None:
+            self._move_flags.append(self._long_check_flags(piece, previous_moves))
+
+        if self._verify_moves and self._incremental:
+            self.verify_moves()
+
+    def _long_check_flags(self, piece, previous_moves):
+        """
+        Returns the flags for the long check rulings of the move just made by the inputted piece,
+        given the squares it could move to before: whether it left the other player in check, and
+        whether it chases an enemy piece other than the General. A piece is chased when the move
+        newly attacks it and it is either undefended or worth more than the piece attacking it.
+        Moves by a General or Soldier never count as chasing.
+        """
+        flags = 0
+        if self._general_attacked(self._generals[self._turn].get_square(), piece.get_color()):
+            flags |= _GAVE_CHECK
+        if piece.get_rank() not in ('General', 'Soldier'):
+            board = self._board
+            value = self._weights.get_material(piece.get_rank())
+            for square in piece.get_valid_squares():
+                target = board[square]
+                if not target or target.get_rank() == 'General' or square in previous_moves:
+                    continue
+                if self._weights.get_material(target.get_rank()) > value or not self._defended(piece, square):
+                    flags |= _CHASED
+                    break
+        return flags
+
+    def _defended(self, piece, square):
+        """
+        Returns whether the piece on the inputted square could be captured back if the inputted piece
+        took it, ignoring whether the recapture would leave the General in check.
+        """
+        board = self._board
+        color = board[square].get_color()
+        from_square = piece.get_square()
+        # Look at the board as it would be after the capture, which can open or close lines
+        captured = board[square]
+        board[from_square] = None
+        board[square] = piece
+        try:
+            # A chariot as the first piece along each line, and a cannon as the second
+            for ray in _RAYS[square]:
+                screened = False
+                for current in ray:
+                    defender = board[current]
+                    if not defender:
+                        continue
+                    if defender.get_color() == color:
+                        rank = defender.get_rank()
+                        if rank == ('Cannon' if screened else 'Chariot'):
+                            return True
+                    if screened:
+                        break
+                    screened = True
+
+            # Pieces that step onto the square, through an empty horse leg or elephant eye
+            for rank in ('General', 'Advisor', 'Elephant', 'Horse', 'Soldier'):
+                for source, block in _ATTACK_TABLES[rank, color][square]:
+                    defender = board[source]
+                    if (
+                        defender and defender.get_rank() == rank and defender.get_color() == color
+                        and (block is None or not board[block])
+                    ):
+                        return True
+            return False
+        finally:
+            board[square] = captured
+            board[from_square] = piece
+
+    def _unmake_move(self):
+        """Undoes the last move made by _make_move and restores the state from before it."""
+        (
+            from_square, to_square, piece_to_capture, captured_index, pieces_to_update, saved_moves,
+            self._turn, self._game_state, self._halfmove_clock, self._fullmove_number, self._score
+        ) = self._undo_stack.pop()
+        if self._position_counts is not None:
+            count = self._position_counts[self._hash] - 1
+            if count:
+                self._position_counts[self._hash] = count
+            else:
+                del self._position_counts[self._hash]
+        if self._move_flags is not None:
+            self._move_flags.pop()
+        self._hash_history.pop()
+        self._hash = self._hash_history[-1]
+        board = self._board
+        piece = board[to_square]
+
+        board[from_square] = piece
+        board[to_square] = piece_to_capture
+        piece.set_square(from_square)
+        if self._bitboards:
+            self._bitboards.remove(piece, to_square)
+            self._bitboards.add(piece, from_square)
+            if piece_to_capture:
+                self._bitboards.add(piece_to_capture, to_square)
+
+        # Put the captured piece back where it was in the pieces list
+        if piece_to_capture:
+            self._captured_pieces.pop()
+            if captured_index < len(self._pieces):
+                self._pieces.append(self._pieces[captured_index])
+                self._pieces[captured_index] = piece_to_capture
+            else:
+                self._pieces.append(piece_to_capture)
+
+        for current_piece, valid_moves in zip(pieces_to_update, saved_moves):
+            current_piece.set_valid_squares(valid_moves)
+
+    def best_move(self, time_ms=1000):
+        """
+        Takes a time limit in milliseconds and searches for the best move for the player whose
+        turn it is. Returns a (current_pos, new_pos) pair, or None if the game is over.
+        The engine and its transposition table are kept on the game, so later calls reuse the
+        results of earlier searches instead of allocating a new table each time.
+        """
+        if self._engine is None:
+            from XiangqiEngine import XiangqiEngine
+            self._engine = XiangqiEngine(self)
+        return self._engine.best_move(time_ms)
+
+    def perft(self, depth):
+        """
+        Takes a depth as input and returns the number of leaf nodes in the tree of legal moves
+        of that depth from the current position. Used to test and time move generation.
+        """
+        if depth <= 0:
+            return 1
+        return self._perft(depth)
+
+    def divide(self, depth):
+        """
+        Takes a depth as input and returns a dictionary mapping each legal (current_pos, new_pos)
+        move in the current position to the perft count of the position after it.
+        """
+        counts = {}
+        for from_square, to_square in self._legal_moves(self._turn):
+            self._make_move(from_square, to_square)
+            counts[_SQUARE_NAMES[from_square], _SQUARE_NAMES[to_square]] = self.perft(depth - 1)
+            self._unmake_move()
+        return counts
+
+    def _perft(self, depth):
+        """Counts the leaf nodes of the legal move tree of the inputted depth, which must be at least 1."""
+        if depth == 1:
+            return sum(1 for _ in self._legal_moves(self._turn))
+
+        nodes = 0
+        for from_square, to_square in self._legal_moves(self._turn):
+            self._make_move(from_square, to_square)
+            nodes += self._perft(depth - 1)
+            self._unmake_move()
+        return nodes
+
+    def evaluate(self):
+        """
+        Returns the static evaluation of the position from the point of view of the player to move:
+        material, piece-square values and mobility from the game's EvalWeights. Kept up to date as
+        moves are made, so this doesn't rescan the board.
+        """
+        if self._moves_stale:
+            self.update_moves()
+        return self._score if self._turn == 'red' else -self._score
+
+    def get_weights(self):
+        """Returns the EvalWeights used by the game's evaluation."""
+        return self._weights
+
+    def _compute_evaluation(self):
+        """Computes the static evaluation from red's side from scratch."""
+        score = 0
+        for piece in self._pieces:
+            rank, color = piece.get_rank(), piece.get_color()
+            score += self._weights.square_values(rank, color)[piece.get_square()]
+            score += self._weights.mobility_value(rank, color) * len(piece.get_valid_squares())
+        return score
+
+    def enable_profiling(self, callback=None, profiler=None):
+        """
+        Starts counting and timing calls to move generation, check tests, trial moves and game end
+        detection on this game by wrapping those methods, and returns the GameProfiler collecting them.
+        Takes an optional callback that is called with the method name and seconds after every call,
+        and an optional GameProfiler to collect into, so several games can share one.
+        Games that aren't profiled call the methods directly, so profiling costs nothing until enabled.
+        """
+        if profiler is not None:
+            self._profiler = profiler
+        elif self._profiler is None:
+            self._profiler = GameProfiler()
+        if callback is not None:
+            self._profiler.set_callback(callback)
+        for name in PROFILED_METHODS:
+            method = getattr(type(self), name).__get__(self, type(self))
+            setattr(self, name, self._profiler.wrap(name, method))
+        return self._profiler
+
+    def disable_profiling(self):
+        """Stops profiling the game. The counts and timings collected so far are kept."""
+        for name in PROFILED_METHODS:
+            self.__dict__.pop(name, None)
+
+    def get_profile_stats(self):
+        """Returns a snapshot of the profiling counts, timings and histograms, empty if never enabled."""
+        return self._profiler.snapshot() if self._profiler is not None else {}
+
+    def position_hash(self):
+        """Returns the 64-bit Zobrist hash of the current position, including the turn."""
+        return self._hash
+
+    def get_hash_history(self):
+        """Returns a list of the hashes of every position reached so far, oldest first."""
+        return list(self._hash_history)
+
+    def _compute_hash(self):
+        """Computes the Zobrist hash of the current position from scratch."""
+        position_hash = _ZOBRIST_BLACK_TO_MOVE if self._turn == 'black' else 0
+        for piece in self._pieces:
+            position_hash ^= _ZOBRIST_KEYS[piece.get_rank(), piece.get_color()][piece.get_square()]
+        return position_hash
+
     def update_moves(self):
-        """Updates the valid_moves list for all pieces in the game."""
+        """
+        Updates the valid_moves list for all pieces in the game. Moves made after that only
+        update the pieces they affect, in _make_move.
+        """
+        for current_piece in self._pieces:
+            current_piece.update_valid_moves(self._board, self._bitboards)
+        self._score = self._compute_evaluation()
+        self._moves_stale = False
+
+    def affected_pieces(self, changed_squares):
+        """
+        Takes a list of squares whose occupancy changed and returns the pieces whose
+        valid moves may have changed as a result.
+        """
+        changed = [divmod(square, 9) for square in changed_squares]
+        affected = []
+        for piece in self._pieces:
+            row, column = divmod(piece.get_square(), 9)
+            if piece.get_rank() in ('Chariot', 'Cannon'):
+                # Sliding pieces see any change on their rank or file
+                if any(row == r or column == c for r, c in changed):
+                    affected.append(piece)
+            # Every other piece only reaches, or is blocked by, squares within two steps
+            elif any(abs(row - r) <= 2 and abs(column - c) <= 2 for r, c in changed):
+                affected.append(piece)
+        return affected
+
+    def verify_moves(self):
+        """Checks that the valid_moves lists and the evaluation match a full rebuild and raises otherwise."""
+        if self._moves_stale:
+            self.update_moves()
+        incremental_moves = [piece.get_valid_squares() for piece in self._pieces]
         for current_piece in self._pieces:
-            other_pieces = [
-                piece for piece in self._pieces if piece != current_piece]
-            current_piece.update_valid_moves(other_pieces)
+            current_piece.update_valid_moves(self._board, self._bitboards)
+
+        for piece, moves in zip(self._pieces, incremental_moves):
+            if moves != piece.get_valid_squares():
+                raise RuntimeError(
+                    f'Incremental moves for {piece!r} are {[_SQUARE_NAMES[square] for square in moves]}, '
+                    f'expected {piece.get_valid_moves()}')
+
+        if self._score != self._compute_evaluation():
+            raise RuntimeError(
+                f'Incremental evaluation is {self._score}, expected {self._compute_evaluation()}')
 
     def __str__(self):
         """Returns a string representation of the board."""
@@ -850,12 +1690,10 @@ class XiangqiGame:
                 board += '|'
 
                 # Determine if a piece is in current spot
-                piece_check = False
-                for piece in self._pieces:
-                    if piece.location_to_list() == [column, row]:
-                        board += ' ' + str(piece) + ' '
-                        piece_check = True
-                if not piece_check:
+                piece = self._board[(row - 1) * 9 + column - 1]
+                if piece:
+                    board += ' ' + str(piece) + ' '
+                else:
                     board += '    '
 
             # Print dividers to make board easily readable
@@ -0,0 +1,130 @@
+# Description: Contains a class that counts and times the calls XiangqiGame makes on its move and check hot path.
+#              XiangqiGame.enable_profiling wraps the methods listed here on that one game, so a game
+#              that isn't being profiled runs the plain methods with no overhead at all.
+#              Each method gets a call count, total and longest time and a histogram of call times in
+#              power of two buckets of nanoseconds, and every call can also be passed to a callback.
+
+import functools
+import time
+
+# Methods of XiangqiGame that are timed, and the phase of a move each one belongs to
+PROFILED_METHODS = {
+    'make_move': 'move',
+    'update_moves': 'move generation',
+    'affected_pieces': 'move generation',
+    '_legal_moves': 'move generation',
+    'is_in_check': 'check test',
+    '_general_attacked': 'check test',
+    '_is_legal_move': 'trial move',
+    '_make_move': 'trial move',
+    '_unmake_move': 'trial move',
+    'is_game_over': 'game end',
+    'update_game_state': 'game end',
+}
+
+# Methods that are generators, which are timed over every step rather than the call that creates them
+_GENERATORS = {'_legal_moves'}
+
+# Number of histogram buckets, where bucket n holds calls taking under 2 ** n nanoseconds
+_BUCKETS = 40
+
+
+class GameProfiler:
+
+    """
+    Class representing the counters and timings collected from a XiangqiGame.
+    Times include the time spent in other profiled methods that a method calls.
+    """
+
+    def __init__(self, callback=None):
+        """
+        Creates an instance of a GameProfiler class. Takes an optional callback that is called
+        with the method name and seconds taken after every profiled call.
+        """
+        self._callback = callback
+        # Calls, total nanoseconds, longest nanoseconds and histogram of each method
+        self._stats = {}
+
+    def set_callback(self, callback):
+        """Replaces the callback called after every profiled call, or removes it if None."""
+        self._callback = callback
+
+    def wrap(self, name, method):
+        """Takes the name of a profiled method and the bound method and returns a timed version of it."""
+        record = self.record
+        clock = time.perf_counter_ns
+
+        if name in _GENERATORS:
+            @functools.wraps(method)
+            def timed(*args, **kwargs):
+                iterator = method(*args, **kwargs)
+                elapsed = 0
+                try:
+                    while True:
+                        start = clock()
+                        try:
+                            item = next(iterator)
+                        except StopIteration:
+                            return
+                        finally:
+                            elapsed += clock() - start
+                        yield item
+                finally:
+                    # Also reached when the caller stops early and the generator is closed
+                    record(name, elapsed)
+            return timed
+
+        @functools.wraps(method)
+        def timed(*args, **kwargs):
+            start = clock()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                record(name, clock() - start)
+        return timed
+
+    def record(self, name, nanoseconds):
+        """Adds a call of the inputted method taking the inputted number of nanoseconds."""
+        stats = self._stats.get(name)
+        if stats is None:
+            stats = self._stats[name] = [0, 0, 0, [0] * _BUCKETS]
+        stats[0] += 1
+        stats[1] += nanoseconds
+        if nanoseconds > stats[2]:
+            stats[2] = nanoseconds
+        stats[3][min(nanoseconds.bit_length(), _BUCKETS - 1)] += 1
+        if self._callback is not None:
+            self._callback(name, nanoseconds / 1e9)
+
+    def snapshot(self):
+        """
+        Returns a dictionary mapping each method called so far to a dictionary of its phase, calls,
+        total_seconds, mean_seconds, max_seconds and histogram, which maps the upper bound of each
+        bucket in nanoseconds to the number of calls under it.
+        """
+        snapshot = {}
+        for name, (calls, total, longest, histogram) in self._stats.items():
+            snapshot[name] = {
+                'phase': PROFILED_METHODS[name],
+                'calls': calls,
+                'total_seconds': total / 1e9,
+                'mean_seconds': total / calls / 1e9,
+                'max_seconds': longest / 1e9,
+                'histogram': {1 << bucket: count for bucket, count in enumerate(histogram) if count},
+            }
+        return snapshot
+
+    def reset(self):
+        """Clears every count and timing collected so far."""
+        self._stats.clear()
+
+
+def format_stats(snapshot):
+    """Takes a snapshot from GameProfiler.snapshot and returns it as a table, grouped by phase."""
+    lines = [f'{"method":<20} {"phase":<16} {"calls":>10} {"total ms":>10} {"mean us":>9} {"max us":>9}']
+    for name, stats in sorted(snapshot.items(), key=lambda item: (item[1]['phase'], -item[1]['total_seconds'])):
+        lines.append(
+            f'{name:<20} {stats["phase"]:<16} {stats["calls"]:>10,} {stats["total_seconds"] * 1e3:>10.1f} '
+            f'{stats["mean_seconds"] * 1e6:>9.2f} {stats["max_seconds"] * 1e6:>9.1f}'
+        )
+    return '\n'.join(lines)
@@ -0,0 +1,115 @@
+# Description: Command line driver that validates recorded games of Xiangqi in bulk.
+#              Game files hold one game per line as space separated moves such as 'h3-e3 h10-g8', and
+#              are streamed in batches through a pool of processes that replay them with XiangqiGame.
+
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from XiangqiGame import XiangqiGame
+
+
+def parse_game(line):
+    """Takes a line from a game file and returns its list of (current_pos, new_pos) moves."""
+    return [tuple(move.split('-', 1)) if '-' in move else (move, '') for move in line.split()]
+
+
+def validate_game(moves):
+    """
+    Takes a list of (current_pos, new_pos) moves and replays them from the starting position.
+    Returns the index of the first illegal move, or None if they are all legal, and the game state.
+    """
+    game = XiangqiGame()
+    illegal_index = game.apply_moves(moves)
+    return illegal_index, game.get_game_state()
+
+
+def validate_batch(batch):
+    """
+    Takes a list of (file name, line number, line) games and validates each one.
+    Returns the number of games and moves checked and a list of (file name, line number,
+    illegal move index) for every game with an illegal move.
+    """
+    moves_checked = 0
+    invalid = []
+    for file_name, line_number, line in batch:
+        moves = parse_game(line)
+        illegal_index, _ = validate_game(moves)
+        if illegal_index is None:
+            moves_checked += len(moves)
+        else:
+            moves_checked += illegal_index + 1
+            invalid.append((file_name, line_number, illegal_index))
+    return len(batch), moves_checked, invalid
+
+
+def read_batches(paths, batch_size):
+    """Lazily reads the games from the game files and yields them in batches."""
+    batch = []
+    for path in paths:
+        with open(path) as game_file:
+            for line_number, line in enumerate(game_file, 1):
+                line = line.strip()
+                if not line or line.startswith('#'):
+                    continue
+                batch.append((path, line_number, line))
+                if len(batch) == batch_size:
+                    yield batch
+                    batch = []
+    if batch:
+        yield batch
+
+
+def validate_files(paths, workers=None, batch_size=500):
+    """
+    Validates every game in the game files across a pool of worker processes, keeping only a few
+    batches in flight at a time so files of any size can be streamed.
+    Returns a dictionary with the games, moves and invalid games found, the seconds taken and
+    the throughput in games per second.
+    """
+    workers = workers or os.cpu_count() or 1
+    start = time.perf_counter()
+    totals = {'games': 0, 'moves': 0, 'invalid': []}
+
+    def collect(done):
+        for future in done:
+            games, moves, invalid = future.result()
+            totals['games'] += games
+            totals['moves'] += moves
+            totals['invalid'].extend(invalid)
+
+    with ProcessPoolExecutor(workers) as executor:
+        pending = set()
+        for batch in read_batches(paths, batch_size):
+            if len(pending) >= workers * 2:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                collect(done)
+            pending.add(executor.submit(validate_batch, batch))
+        collect(wait(pending)[0])
+
+    totals['invalid'].sort()
+    totals['seconds'] = time.perf_counter() - start
+    totals['games_per_second'] = totals['games'] / totals['seconds'] if totals['seconds'] else 0.0
+    return totals
+
+
+def main(argv=None):
+    """Parses the command line, validates the game files and prints a report."""
+    parser = argparse.ArgumentParser(description='Validate recorded Xiangqi games in bulk.')
+    parser.add_argument('paths', nargs='+', help='game files with one game per line')
+    parser.add_argument('--workers', type=int, default=None, help='number of worker processes')
+    parser.add_argument('--batch-size', type=int, default=500, help='games sent to a worker at a time')
+    args = parser.parse_args(argv)
+
+    totals = validate_files(args.paths, args.workers, args.batch_size)
+    for file_name, line_number, illegal_index in totals['invalid']:
+        print(f'{file_name}:{line_number}: illegal move {illegal_index + 1}')
+    print(f'{totals["games"]} games, {totals["moves"]} moves, {len(totals["invalid"])} invalid '
+          f'in {totals["seconds"]:.2f} s ({totals["games_per_second"]:,.1f} games/s)')
+    return 1 if totals['invalid'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
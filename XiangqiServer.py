@@ -0,0 +1,359 @@
+# Description: Contains an asyncio server that hosts many games of Xiangqi in one process, and a client
+#              used to drive it from tests and load runs.
+#              Clients send one command per line over TCP or a Unix socket and get one reply line back:
+#                  NEW [fen]                 starts a game, replies OK <game id>
+#                  MOVE <id> <from> <to>     makes a move, replies OK <game state> <turn>
+#                  STATE <id>                replies OK <game state> <turn> <fen>
+#                  CHECK <id> [red|black]    replies OK true or OK false, for the player to move by default
+#                  LEGAL <id>                replies OK followed by every legal move as from-to
+#                  CLOSE <id>                ends a game and frees it
+#                  STATS                     replies OK followed by the server's statistics as JSON
+#                  QUIT                      closes the connection
+#              Errors are replied as ERR <message>.
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from XiangqiGame import XiangqiGame
+
+
+class GameServer:
+
+    """
+    Class representing a server hosting games of Xiangqi for many connections at once.
+    Every game is kept in this process with a lock so that commands for the same game run one at
+    a time. Moves are checked and made on the event loop, but when a move gives check, working out
+    whether it is checkmate can mean trying every reply, so that runs in a thread pool while the
+    event loop keeps serving other games. Keeps the latency of recent commands of each type.
+    """
+
+    def __init__(self, workers=4, latency_samples=10000):
+        """
+        Creates an instance of a GameServer class. Takes the number of threads used for
+        checkmate detection and how many recent latencies to keep for each command.
+        """
+        self._games = {}
+        self._locks = {}
+        self._next_id = 1
+        self._executor = ThreadPoolExecutor(workers, thread_name_prefix='xiangqi-mate')
+        self._latency_samples = latency_samples
+        self._latencies = {}
+        self._commands = 0
+        self._connections = 0
+        self._servers = []
+        # Handler of each command and its least and most arguments, with None for no limit
+        self._handlers = {
+            'NEW': (self._new, 0, None), 'MOVE': (self._move, 3, 3), 'STATE': (self._state, 1, 1),
+            'CHECK': (self._check, 1, 2), 'LEGAL': (self._legal, 1, 1), 'CLOSE': (self._close, 1, 1),
+            'STATS': (self._stats, 0, 0),
+        }
+
+    async def start_tcp(self, host='127.0.0.1', port=7777):
+        """Starts listening on a TCP port and returns the port, which is chosen freely if port is 0."""
+        server = await asyncio.start_server(self._serve_connection, host, port)
+        self._servers.append(server)
+        return server.sockets[0].getsockname()[1]
+
+    async def start_unix(self, path):
+        """Starts listening on a Unix socket at the inputted path."""
+        server = await asyncio.start_unix_server(self._serve_connection, path)
+        self._servers.append(server)
+
+    async def serve_forever(self):
+        """Serves connections on every socket started until cancelled."""
+        await asyncio.gather(*(server.serve_forever() for server in self._servers))
+
+    async def close(self):
+        """Stops listening and shuts down the checkmate detection threads."""
+        for server in self._servers:
+            server.close()
+            await server.wait_closed()
+        self._servers = []
+        self._executor.shutdown(wait=False)
+
+    def get_stats(self):
+        """
+        Returns a dictionary of the number of games, connections and commands handled, and the
+        count and 50th, 90th, 99th percentile and maximum latency in milliseconds of each command.
+        """
+        latencies = {}
+        for command, samples in self._latencies.items():
+            ordered = sorted(samples)
+            latencies[command] = {
+                'count': len(ordered),
+                **{
+                    f'p{percentile}': round(ordered[min(len(ordered) - 1, len(ordered) * percentile // 100)] * 1000, 3)
+                    for percentile in (50, 90, 99)
+                },
+                'max': round(ordered[-1] * 1000, 3),
+            }
+        return {
+            'games': len(self._games), 'connections': self._connections,
+            'commands': self._commands, 'latency_ms': latencies
+        }
+
+    async def handle_command(self, line):
+        """Takes a command line and returns the reply line for it, without the newline."""
+        start = time.perf_counter()
+        words = line.split()
+        if not words:
+            return 'ERR empty command'
+        command = words[0].upper()
+        if command not in self._handlers:
+            return f'ERR unknown command {words[0]}'
+        handler, least, most = self._handlers[command]
+        arguments = words[1:]
+        if len(arguments) < least or (most is not None and len(arguments) > most):
+            return f'ERR wrong number of arguments for {command}'
+
+        try:
+            reply = await handler(*arguments)
+        except (KeyError, ValueError) as error:
+            reply = f'ERR {error.args[0] if error.args else error}'
+
+        self._commands += 1
+        samples = self._latencies.get(command)
+        if samples is None:
+            samples = self._latencies[command] = deque(maxlen=self._latency_samples)
+        samples.append(time.perf_counter() - start)
+        return reply
+
+    async def _serve_connection(self, reader, writer):
+        """Reads commands from a connection and writes back the replies until it closes."""
+        self._connections += 1
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                line = line.decode('ascii', 'replace').strip()
+                if line.upper() == 'QUIT':
+                    break
+                # Replies can echo back input that wasn't ASCII, which is sent as question marks
+                writer.write((await self.handle_command(line) + '\n').encode('ascii', 'replace'))
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            self._connections -= 1
+            writer.close()
+
+    def _game(self, game_id):
+        """Returns the game and lock for a game id, raising a KeyError if there is no such game."""
+        if game_id not in self._games:
+            raise KeyError(f'no game {game_id}')
+        return self._games[game_id], self._locks[game_id]
+
+    async def _new(self, *fen):
+        """Starts a game, from a FEN position if one is given, and replies with its id."""
+        game = XiangqiGame.from_fen(' '.join(fen)) if fen else XiangqiGame()
+        game_id = str(self._next_id)
+        self._next_id += 1
+        self._games[game_id] = game
+        self._locks[game_id] = asyncio.Lock()
+        return f'OK {game_id}'
+
+    async def _move(self, game_id, current_pos, new_pos):
+        """Makes a move in a game and replies with the game state and turn."""
+        game, lock = self._game(game_id)
+        async with lock:
+            if not game.make_move(current_pos, new_pos, update_state=False):
+                return f'ERR illegal move {current_pos}-{new_pos}'
+            # Out of check the first legal reply is found almost at once, but in check it can take
+            # trying every move, so only then is the search moved off the event loop
+            if game.is_in_check(game.get_turn()):
+                await asyncio.get_running_loop().run_in_executor(self._executor, game.update_game_state)
+            else:
+                game.update_game_state()
+            return f'OK {game.get_game_state()} {game.get_turn()}'
+
+    async def _state(self, game_id):
+        """Replies with a game's state, turn and position."""
+        game, lock = self._game(game_id)
+        async with lock:
+            return f'OK {game.get_game_state()} {game.get_turn()} {game.to_fen()}'
+
+    async def _check(self, game_id, color=None):
+        """Replies with whether a player, by default the player to move, is in check."""
+        game, lock = self._game(game_id)
+        if color not in (None, 'red', 'black'):
+            raise ValueError(f'bad color {color}')
+        async with lock:
+            return f'OK {"true" if game.is_in_check(color or game.get_turn()) else "false"}'
+
+    async def _legal(self, game_id):
+        """Replies with every legal move in a game."""
+        game, lock = self._game(game_id)
+        async with lock:
+            if game.get_game_state() != 'UNFINISHED':
+                return 'OK'
+            return ' '.join(['OK'] + [f'{current_pos}-{new_pos}' for current_pos, new_pos in game.legal_moves()])
+
+    async def _close(self, game_id):
+        """Ends a game and frees it."""
+        _, lock = self._game(game_id)
+        async with lock:
+            del self._games[game_id]
+            del self._locks[game_id]
+        return 'OK'
+
+    async def _stats(self):
+        """Replies with the server's statistics."""
+        return 'OK ' + json.dumps(self.get_stats())
+
+
+class GameClient:
+
+    """
+    Class representing a connection to a GameServer that sends one command at a time.
+    Used by tests and the load harness.
+    """
+
+    def __init__(self, reader, writer):
+        """Creates an instance of a GameClient class from an open stream reader and writer."""
+        self._reader = reader
+        self._writer = writer
+
+    @classmethod
+    async def connect(cls, host='127.0.0.1', port=7777, path=None):
+        """Connects to a server on a TCP port, or on a Unix socket if a path is given."""
+        if path is not None:
+            reader, writer = await asyncio.open_unix_connection(path)
+        else:
+            reader, writer = await asyncio.open_connection(host, port)
+        return cls(reader, writer)
+
+    async def request(self, line):
+        """Sends a command line and returns the words of the reply, raising a RuntimeError on ERR."""
+        self._writer.write(line.encode('ascii') + b'\n')
+        await self._writer.drain()
+        reply = (await self._reader.readline()).decode('ascii').split()
+        if not reply:
+            raise ConnectionError('server closed the connection')
+        if reply[0] != 'OK':
+            raise RuntimeError(' '.join(reply[1:]))
+        return reply[1:]
+
+    async def close(self):
+        """Says goodbye to the server and closes the connection."""
+        self._writer.write(b'QUIT\n')
+        await self._writer.drain()
+        self._writer.close()
+        await self._writer.wait_closed()
+
+
+async def play_random_games(client, games, max_moves, rng):
+    """
+    Plays games of random legal moves through a client, each until it ends or reaches
+    max_moves, checking the state and check status as it goes. Returns the moves made.
+    """
+    moves_made = 0
+    for _ in range(games):
+        game_id = (await client.request('NEW'))[0]
+        for _ in range(max_moves):
+            legal_moves = await client.request(f'LEGAL {game_id}')
+            if not legal_moves:
+                break
+            current_pos, new_pos = rng.choice(legal_moves).split('-')
+            state, _ = await client.request(f'MOVE {game_id} {current_pos} {new_pos}')
+            await client.request(f'CHECK {game_id}')
+            moves_made += 1
+            if state != 'UNFINISHED':
+                break
+        await client.request(f'STATE {game_id}')
+        await client.request(f'CLOSE {game_id}')
+    return moves_made
+
+
+async def run_load(clients=50, games=4, max_moves=40, seed=1, workers=4):
+    """
+    Starts a server on a Unix socket, or a local TCP port where those aren't available, connects
+    the inputted number of clients that each play games of random moves at the same time, and
+    returns the server's statistics along with the moves made and seconds taken.
+    """
+    server = GameServer(workers)
+    path = None
+    if hasattr(asyncio, 'start_unix_server'):
+        path = f'/tmp/xiangqi-server-{os.getpid()}.sock'
+        await server.start_unix(path)
+        port = None
+    else:
+        port = await server.start_tcp(port=0)
+
+    try:
+        connections = [await GameClient.connect(port=port, path=path) for _ in range(clients)]
+        start = time.perf_counter()
+        moves = await asyncio.gather(*(
+            play_random_games(client, games, max_moves, random.Random(seed + index))
+            for index, client in enumerate(connections)
+        ))
+        seconds = time.perf_counter() - start
+        stats = json.loads(' '.join(await connections[0].request('STATS')))
+        for client in connections:
+            await client.close()
+    finally:
+        await server.close()
+        if path is not None and os.path.exists(path):
+            os.unlink(path)
+
+    stats.update(moves=sum(moves), seconds=seconds)
+    return stats
+
+
+def main(argv=None):
+    """Parses the command line and either runs a server or a load run against a local server."""
+    parser = argparse.ArgumentParser(description='Host games of Xiangqi over a line protocol.')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    serve_parser = commands.add_parser('serve', help='run a server until interrupted')
+    serve_parser.add_argument('--host', default='127.0.0.1')
+    serve_parser.add_argument('--port', type=int, default=7777)
+    serve_parser.add_argument('--unix', help='listen on a Unix socket at this path instead')
+    serve_parser.add_argument('--workers', type=int, default=4, help='threads used for checkmate detection')
+
+    load_parser = commands.add_parser('load', help='play random games against a local server')
+    load_parser.add_argument('--clients', type=int, default=50)
+    load_parser.add_argument('--games', type=int, default=4, help='games played by each client')
+    load_parser.add_argument('--moves', type=int, default=40, help='most moves played in each game')
+    load_parser.add_argument('--seed', type=int, default=1)
+    load_parser.add_argument('--workers', type=int, default=4, help='threads used for checkmate detection')
+
+    args = parser.parse_args(argv)
+    if args.command == 'load':
+        stats = asyncio.run(run_load(args.clients, args.games, args.moves, args.seed, args.workers))
+        print(f'{args.clients} clients made {stats["moves"]} moves in {stats["seconds"]:.2f} s '
+              f'({stats["commands"] / stats["seconds"]:,.0f} commands/s)')
+        for command, latency in sorted(stats['latency_ms'].items()):
+            print(f'  {command}: {latency["count"]} recent, p50 {latency["p50"]} ms, p90 {latency["p90"]} ms, '
+                  f'p99 {latency["p99"]} ms, max {latency["max"]} ms')
+        return 0
+
+    async def serve():
+        server = GameServer(args.workers)
+        if args.unix:
+            await server.start_unix(args.unix)
+            print(f'serving on {args.unix}')
+        else:
+            port = await server.start_tcp(args.host, args.port)
+            print(f'serving on {args.host}:{port}')
+        try:
+            await server.serve_forever()
+        finally:
+            await server.close()
+
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,775 @@
+# Description: Contains the functions that generate endgame tablebases for small sets of Xiangqi material
+#              by retrograde analysis, and a class for probing the generated tables.
+#              A table holds every placement of its pieces with either side to move, and gives the result
+#              for the player to move with best play and the number of plies to mate. Positions are
+#              worked out backwards from the mates, and captures are looked up in the smaller tables
+#              for the material left, which are generated first.
+#
+#              Material is named by FEN letters, the red pieces then the black pieces, for example KR-K
+#              for a Chariot against a bare General or KNP-KA. Each table is written with the stronger
+#              side as red and used for the other colors by turning the board around.
+#
+#              Table layout, all little-endian:
+#                  header:  magic b'XQTB', version (u16), flags (u16), material (16 bytes), positions (u32),
+#                           longest mate in plies (u16)
+#                  results: 2 bits per position, 0 illegal, 1 loss, 2 draw and 3 win for the player to move
+#                  mates:   plies to mate for each position, a u8 or a u16 if flag 1 is set
+
+import argparse
+import mmap
+import os
+import struct
+import sys
+import time
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+
+from XiangqiGame import (
+    XiangqiGame, general_attacked, sensitive_squares, square_to_location, _ATTACK_TABLES, _MOVE_TABLES, _RAYS
+)
+
+MAGIC = b'XQTB'
+VERSION = 1
+_HEADER = struct.Struct('<4sHH16sIH')
+_WIDE_MATES = 1
+
+# Results stored for each position, from the side of the player to move
+ILLEGAL, LOSS, DRAW, WIN = 0, 1, 2, 3
+RESULTS = ('ILLEGAL', 'LOSS', 'DRAW', 'WIN')
+
+# FEN letter of each piece rank, in the order pieces are listed in a material name
+_LETTERS = {
+    'General': 'K', 'Advisor': 'A', 'Elephant': 'B', 'Horse': 'N',
+    'Chariot': 'R', 'Cannon': 'C', 'Soldier': 'P'
+}
+_LETTER_ORDER = 'KABNRCP'
+_LETTER_RANKS = {letter: rank for rank, letter in _LETTERS.items()}
+# Most pieces of each rank a player starts with
+_LETTER_LIMITS = {'K': 1, 'A': 2, 'B': 2, 'N': 2, 'R': 2, 'C': 2, 'P': 5}
+# Letters from the strongest piece to the weakest, used to decide which side a table has as red
+_STRENGTH_ORDER = 'RCNPBA'
+
+# Square each square is moved to by turning the board around so red and black swap sides
+_MIRROR = [(9 - square // 9) * 9 + square % 9 for square in range(90)]
+
+# States used while a table is being generated, on top of LOSS and WIN once a position is solved
+_UNKNOWN = 4
+# Not solved yet, but a capture leads to a draw so the position can't be lost
+_CANNOT_LOSE = 5
+
+# Positions worked on in each task handed to a worker process
+_CHUNK_SIZE = 20000
+
+
+def _build_domains():
+    """
+    Returns the squares each piece rank and color can ever stand on, found by following the move
+    tables out from the starting position. Chariots and Cannons can stand anywhere.
+    """
+    domains = {}
+    for piece in XiangqiGame().get_pieces():
+        key = piece.get_rank(), piece.get_color()
+        domains.setdefault(key, set()).add(piece.get_square())
+
+    for key, squares in domains.items():
+        table = _MOVE_TABLES.get(key)
+        if table is None:
+            squares.update(range(90))
+            continue
+        frontier = list(squares)
+        while frontier:
+            for destination, _ in table[frontier.pop()]:
+                if destination not in squares:
+                    squares.add(destination)
+                    frontier.append(destination)
+    return {key: tuple(sorted(squares)) for key, squares in domains.items()}
+
+
+_DOMAINS = _build_domains()
+
+
+def _parse_material(name):
+    """
+    Takes a material name such as KR-K and returns the red and black letters, each sorted into the
+    order used by the tables. Raises ValueError if the name isn't two sets of pieces with a General each.
+    """
+    sides = name.upper().split('-')
+    if len(sides) != 2:
+        raise ValueError(f'Material must be red pieces and black pieces separated by -: {name!r}')
+
+    sorted_sides = []
+    for side in sides:
+        if any(letter not in _LETTER_ORDER for letter in side):
+            raise ValueError(f'Unknown piece letter in material {name!r}, use {_LETTER_ORDER}')
+        if side.count('K') != 1:
+            raise ValueError(f'Each side must have exactly one General (K): {name!r}')
+        for letter, limit in _LETTER_LIMITS.items():
+            if side.count(letter) > limit:
+                raise ValueError(f'Too many {_LETTER_RANKS[letter]} pieces in material {name!r}')
+        sorted_sides.append(''.join(sorted(side, key=_LETTER_ORDER.index)))
+    if len(sorted_sides[0]) + len(sorted_sides[1]) + 1 > 16:
+        raise ValueError(f'Material {name!r} has too many pieces for a tablebase')
+    return sorted_sides[0], sorted_sides[1]
+
+
+def canonical_material(name):
+    """
+    Takes a material name and returns the name of the table it is stored in, which has the
+    stronger side as red, and whether the board must be turned around to look it up.
+    """
+    red, black = _parse_material(name)
+    red_key = [red.count(letter) for letter in _STRENGTH_ORDER]
+    black_key = [black.count(letter) for letter in _STRENGTH_ORDER]
+    if black_key > red_key:
+        return f'{black}-{red}', True
+    return f'{red}-{black}', False
+
+
+class _Material:
+
+    """
+    Class representing the pieces of a table and how its positions are numbered.
+    Each piece has a slot, red pieces first, and a position's index counts through the squares
+    each slot can stand on, with the player to move in the lowest bit.
+    """
+
+    def __init__(self, name):
+        """Creates an instance of a _Material class for the inputted material name."""
+        red, black = _parse_material(name)
+        self.name = f'{red}-{black}'
+        self.ranks = [_LETTER_RANKS[letter] for letter in red + black]
+        self.colors = ['red'] * len(red) + ['black'] * len(black)
+        self.side_slots = (range(len(red)), range(len(red), len(red) + len(black)))
+        self.generals = (0, len(red))
+
+        self.domains = [_DOMAINS[rank, color] for rank, color in zip(self.ranks, self.colors)]
+        self.domain_index = []
+        for domain in self.domains:
+            index = [-1] * 90
+            for position, square in enumerate(domain):
+                index[square] = position
+            self.domain_index.append(index)
+
+        # Amount a slot's domain position adds to the index, the player to move being worth 1
+        self.strides = [2] * len(self.ranks)
+        for slot in range(len(self.ranks) - 2, -1, -1):
+            self.strides[slot] = self.strides[slot + 1] * len(self.domains[slot + 1])
+        self.size = self.strides[0] * len(self.domains[0])
+
+    def decode(self, index):
+        """Takes a position index and returns the list of squares of each slot and the side to move, 0 for red."""
+        side = index & 1
+        index >>= 1
+        squares = [0] * len(self.ranks)
+        for slot in range(len(self.ranks) - 1, -1, -1):
+            index, position = divmod(index, len(self.domains[slot]))
+            squares[slot] = self.domains[slot][position]
+        return squares, side
+
+    def encode(self, squares, side):
+        """
+        Takes the squares of each slot and the side to move and returns the position index,
+        or -1 if a piece is on a square it could never reach.
+        """
+        index = 0
+        for slot, square in enumerate(squares):
+            position = self.domain_index[slot][square]
+            if position < 0:
+                return -1
+            index = index * len(self.domains[slot]) + position
+        return index * 2 + side
+
+
+class TablebaseFile:
+
+    """
+    Class representing a generated table opened for lookups.
+    The file is memory-mapped, so looking up a position reads two bytes of it.
+    """
+
+    def __init__(self, path):
+        """Creates an instance of a TablebaseFile class for the table at the inputted path."""
+        with open(path, 'rb') as table_file:
+            self._mmap = mmap.mmap(table_file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version, flags, name, positions, self._longest_mate = _HEADER.unpack_from(self._mmap, 0)
+        if magic != MAGIC or version != VERSION:
+            self._mmap.close()
+            raise ValueError(f'{path} is not a version {VERSION} Xiangqi tablebase')
+        self._material = _Material(name.rstrip(b'\0').decode())
+        if positions != self._material.size:
+            self._mmap.close()
+            raise ValueError(f'{path} does not hold every position of {self._material.name}')
+
+        self._results_offset = _HEADER.size
+        self._mates_offset = self._results_offset + (positions + 3) // 4
+        self._wide = flags & _WIDE_MATES
+
+    def get_material(self):
+        """Returns the name of the material in the table."""
+        return self._material.name
+
+    def get_longest_mate(self):
+        """Returns the most plies to mate of any position in the table."""
+        return self._longest_mate
+
+    def __len__(self):
+        """Returns the number of positions in the table, including illegal ones."""
+        return self._material.size
+
+    def probe_index(self, index):
+        """Takes a position index and returns its result code and plies to mate."""
+        result = self._mmap[self._results_offset + (index >> 2)] >> ((index & 3) * 2) & 3
+        if self._wide:
+            offset = self._mates_offset + index * 2
+            return result, self._mmap[offset] | self._mmap[offset + 1] << 8
+        return result, self._mmap[self._mates_offset + index]
+
+    def probe_squares(self, squares, side):
+        """
+        Takes the square of each piece in the table's slot order and the side to move, 0 for red,
+        and returns the result code and plies to mate, or ILLEGAL for a position that can't occur.
+        """
+        index = self._material.encode(squares, side)
+        if index < 0:
+            return ILLEGAL, 0
+        return self.probe_index(index)
+
+    def close(self):
+        """Releases the memory mapping."""
+        self._mmap.close()
+
+
+class Tablebases:
+
+    """
+    Class representing a directory of generated tables.
+    Tables are opened the first time a position with their material is probed.
+    """
+
+    def __init__(self, directory):
+        """Creates an instance of a Tablebases class for the tables in the inputted directory."""
+        self._directory = directory
+        # Open table of each canonical material name, or None if there is no file for it
+        self._tables = {}
+        # Canonical name and whether to turn the board around for each material name probed
+        self._names = {}
+
+    def find(self, name):
+        """
+        Takes a material name and returns the TablebaseFile holding it, or None if it hasn't been
+        generated, and whether the board must be turned around to look positions up in it.
+        """
+        if name not in self._names:
+            self._names[name] = canonical_material(name)
+        canonical, mirrored = self._names[name]
+        if canonical not in self._tables:
+            path = table_path(self._directory, canonical)
+            self._tables[canonical] = TablebaseFile(path) if os.path.exists(path) else None
+        return self._tables[canonical], mirrored
+
+    def probe(self, game):
+        """
+        Takes a XiangqiGame and returns ('WIN', 'DRAW' or 'LOSS' for the player to move, plies to mate),
+        or None if there is no table for the game's material.
+        """
+        sides = {'red': [], 'black': []}
+        for piece in game.get_pieces():
+            sides[piece.get_color()].append((_LETTER_ORDER.index(_LETTERS[piece.get_rank()]), piece.get_square()))
+        red = sorted(sides['red'])
+        black = sorted(sides['black'])
+        name = ''.join(_LETTER_ORDER[order] for order, _ in red) + '-' + ''.join(
+            _LETTER_ORDER[order] for order, _ in black)
+
+        try:
+            table, mirrored = self.find(name)
+        except ValueError:
+            return None
+        if table is None:
+            return None
+
+        side = 0 if game.get_turn() == 'red' else 1
+        if mirrored:
+            squares = [_MIRROR[square] for _, square in black + red]
+            side ^= 1
+        else:
+            squares = [square for _, square in red + black]
+        result, plies = table.probe_squares(squares, side)
+        if result == ILLEGAL:
+            return None
+        return RESULTS[result], plies
+
+    def best_move(self, game):
+        """
+        Takes a XiangqiGame and returns the (from_square, to_square) move that keeps the best result
+        for the player to move, mating as fast as possible or holding out as long as possible, along
+        with the result and plies to mate. Returns None if the position or its moves aren't in the tables.
+        """
+        probe = self.probe(game)
+        if probe is None or game.get_game_state() != 'UNFINISHED':
+            return None
+        result, plies = probe
+
+        best = None
+        best_key = None
+        for from_square, to_square in list(game.legal_square_moves()):
+            game.push_move(from_square, to_square)
+            reply = self.probe(game)
+            game.pop_move()
+            if reply is None:
+                continue
+            # Prefer a reply that loses quickly when winning and one that wins slowly when losing
+            reply_result, reply_plies = reply
+            key = (
+                {'LOSS': 0, 'DRAW': 1, 'WIN': 2}[reply_result],
+                reply_plies if reply_result != 'WIN' else -reply_plies
+            )
+            if best_key is None or key < best_key:
+                best, best_key = (from_square, to_square), key
+        if best is None:
+            return None
+        return best, result, plies
+
+    def close(self):
+        """Closes every table opened."""
+        for table in self._tables.values():
+            if table is not None:
+                table.close()
+        self._tables.clear()
+
+    def __enter__(self):
+        """Returns the tablebases for use in a with statement."""
+        return self
+
+    def __exit__(self, *exc_info):
+        """Closes the tablebases at the end of a with statement."""
+        self.close()
+
+
+def table_path(directory, name):
+    """Returns the path of the table file for the inputted canonical material name."""
+    return os.path.join(directory, f'{name}.xqtb')
+
+
+class _Generator:
+
+    """
+    Class representing the move rules and position numbering used to generate one table.
+    Boards are lists of the slot on each square, or -1 for an empty square.
+    """
+
+    def __init__(self, name, directory):
+        """Creates an instance of a _Generator class for a material whose smaller tables are in directory."""
+        self._material = _Material(name)
+        self._tablebases = Tablebases(directory)
+        material = self._material
+        # Returns the (rank, color) of the piece in a slot, for the game's attack tests
+        self._describe = list(zip(material.ranks, material.colors)).__getitem__
+
+        # Table to look captures of each slot up in, whether it is turned around, and the slots
+        # left in the order of that table's slots
+        self._captures = [None] * len(material.ranks)
+        for slot, rank in enumerate(material.ranks):
+            if rank == 'General':
+                continue
+            remaining = [other for other in range(len(material.ranks)) if other != slot]
+            red = [other for other in remaining if material.colors[other] == 'red']
+            black = [other for other in remaining if material.colors[other] == 'black']
+            name = ''.join(_LETTERS[material.ranks[other]] for other in red) + '-' + ''.join(
+                _LETTERS[material.ranks[other]] for other in black)
+            table, mirrored = self._tablebases.find(name)
+            if table is None:
+                raise FileNotFoundError(f'Table {canonical_material(name)[0]} is needed to generate {material.name}')
+            self._captures[slot] = (table, mirrored, black + red if mirrored else red + black)
+
+    def _board(self, squares):
+        """Returns the board for the inputted squares of each slot."""
+        board = [-1] * 90
+        for slot, square in enumerate(squares):
+            board[square] = slot
+        return board
+
+    def _attacked(self, board, square, enemy_color):
+        """Returns whether a General on the inputted square could be captured by the enemy color."""
+        return general_attacked(square, enemy_color, board, self._describe, -1)
+
+    def _sensitive_squares(self, board, general_square, enemy_color):
+        """Returns the squares where moving a piece away or onto could expose the General, as in XiangqiGame."""
+        return sensitive_squares(general_square, enemy_color, board, self._describe, -1)
+
+    def _moves(self, board, slot, square):
+        """Yields (to_square, captured slot or -1) for every move of the piece in a slot, without check tests."""
+        rank = self._material.ranks[slot]
+        colors = self._material.colors
+        color = colors[slot]
+        if rank == 'Chariot':
+            for ray in _RAYS[square]:
+                for current in ray:
+                    target = board[current]
+                    if target < 0:
+                        yield current, -1
+                        continue
+                    if colors[target] != color:
+                        yield current, target
+                    break
+        elif rank == 'Cannon':
+            for ray in _RAYS[square]:
+                screened = False
+                for current in ray:
+                    target = board[current]
+                    if screened:
+                        if target >= 0:
+                            if colors[target] != color:
+                                yield current, target
+                            break
+                    elif target >= 0:
+                        screened = True
+                    else:
+                        yield current, -1
+        else:
+            for destination, block in _MOVE_TABLES[rank, color][square]:
+                if block is not None and board[block] >= 0:
+                    continue
+                target = board[destination]
+                if target < 0:
+                    yield destination, -1
+                elif colors[target] != color:
+                    yield destination, target
+
+    def _unmoves(self, board, slot, square):
+        """Yields every empty square the piece in a slot could have made a non-capturing move from."""
+        rank = self._material.ranks[slot]
+        color = self._material.colors[slot]
+        if rank in ('Chariot', 'Cannon'):
+            for ray in _RAYS[square]:
+                for current in ray:
+                    if board[current] >= 0:
+                        break
+                    yield current
+        elif rank in ('Horse', 'Soldier'):
+            # The horse leg is next to the square moved from, so work from the attack tables
+            for source, leg in _ATTACK_TABLES[rank, color][square]:
+                if board[source] < 0 and (leg is None or board[leg] < 0):
+                    yield source
+        else:
+            for destination, block in _MOVE_TABLES[rank, color][square]:
+                if board[destination] < 0 and (block is None or board[block] < 0):
+                    yield destination
+
+    def _capture_result(self, squares, side, slot, to_square, captured):
+        """Returns the result code and plies to mate after the piece in slot captures on to_square."""
+        table, mirrored, order = self._captures[captured]
+        moved = list(squares)
+        moved[slot] = to_square
+        if mirrored:
+            return table.probe_squares([_MIRROR[moved[other]] for other in order], side)
+        return table.probe_squares([moved[other] for other in order], side ^ 1)
+
+    def analyse(self, start, stop):
+        """
+        Works out what can be known about positions start to stop without the rest of the table.
+        Returns the state of each position, its number of legal non-capturing moves, the most plies
+        to mate after any of its captures that lose, and lists of (index, plies) for positions already won
+        through a capture or already lost.
+        """
+        material = self._material
+        colors = ('red', 'black')
+        states = bytearray(stop - start)
+        counts = array('H', bytes(2 * (stop - start)))
+        capture_plies = array('H', bytes(2 * (stop - start)))
+        wins = []
+        losses = []
+        for index in range(start, stop):
+            squares, side = material.decode(index)
+            if len(set(squares)) < len(squares):
+                continue
+            board = self._board(squares)
+            color = colors[side]
+            enemy_color = colors[side ^ 1]
+            general_slot = material.generals[side]
+            general_square = squares[general_slot]
+            # The player who just moved can't have left their General in check
+            if self._attacked(board, squares[material.generals[side ^ 1]], color):
+                continue
+
+            in_check = self._attacked(board, general_square, enemy_color)
+            sensitive_squares = self._sensitive_squares(board, general_square, enemy_color)
+            quiet_moves = 0
+            best_win = None
+            longest_capture = 0
+            cannot_lose = False
+            for slot in material.side_slots[side]:
+                from_square = squares[slot]
+                test_all = in_check or slot == general_slot or from_square in sensitive_squares
+                for to_square, captured in list(self._moves(board, slot, from_square)):
+                    if test_all or to_square in sensitive_squares:
+                        board[from_square] = -1
+                        board[to_square] = slot
+                        exposed = self._attacked(
+                            board, to_square if slot == general_slot else general_square, enemy_color)
+                        board[from_square] = slot
+                        board[to_square] = captured
+                        if exposed:
+                            continue
+                    if captured < 0:
+                        quiet_moves += 1
+                        continue
+
+                    result, plies = self._capture_result(squares, side, slot, to_square, captured)
+                    if result == LOSS:
+                        if best_win is None or plies + 1 < best_win:
+                            best_win = plies + 1
+                        # Already won, so its moves must not be counted down towards a loss
+                        cannot_lose = True
+                    elif result == WIN:
+                        longest_capture = max(longest_capture, plies)
+                    else:
+                        cannot_lose = True
+
+            offset = index - start
+            states[offset] = _CANNOT_LOSE if cannot_lose else _UNKNOWN
+            counts[offset] = quiet_moves
+            capture_plies[offset] = longest_capture
+            if best_win is not None:
+                wins.append((index, best_win))
+            elif not quiet_moves and not cannot_lose:
+                # Every move is a capture that loses, or there are no moves and the player is mated
+                losses.append((index, longest_capture + 1 if longest_capture else 0))
+        return start, bytes(states), counts.tobytes(), capture_plies.tobytes(), wins, losses
+
+    def predecessors(self, indexes):
+        """
+        Takes an array of position indexes and returns an array of the indexes of every position
+        that leads to one of them by a non-capturing move. Illegal positions may be included.
+        """
+        material = self._material
+        found = array('I')
+        for index in indexes:
+            squares, side = material.decode(index)
+            board = self._board(squares)
+            mover = side ^ 1
+            # The previous position had the other player to move
+            base = index - side + mover
+            for slot in material.side_slots[mover]:
+                square = squares[slot]
+                domain_index = material.domain_index[slot]
+                stride = material.strides[slot]
+                position = domain_index[square]
+                for from_square in self._unmoves(board, slot, square):
+                    from_position = domain_index[from_square]
+                    if from_position >= 0:
+                        found.append(base + (from_position - position) * stride)
+        return found
+
+
+# Generator of each worker process, set up once per table
+_worker_generator = None
+
+
+def _init_worker(name, directory):
+    """Sets up the generator for a worker process."""
+    global _worker_generator
+    _worker_generator = _Generator(name, directory)
+
+
+def _analyse_chunk(start, stop):
+    """Analyses a range of positions in a worker process."""
+    return _worker_generator.analyse(start, stop)
+
+
+def _predecessors_chunk(indexes):
+    """Finds the predecessors of an array of positions in a worker process."""
+    return _worker_generator.predecessors(array('I', indexes)).tobytes()
+
+
+def _dependencies(name):
+    """Returns the canonical names of the tables needed to generate the inputted material, smallest first."""
+    order = []
+
+    def visit(canonical):
+        if canonical in order:
+            return
+        red, black = _parse_material(canonical)
+        # Every capture takes one piece other than the General, which always comes first
+        smaller = {f'{red[:position]}{red[position + 1:]}-{black}' for position in range(1, len(red))}
+        smaller.update(f'{red}-{black[:position]}{black[position + 1:]}' for position in range(1, len(black)))
+        for smaller_name in sorted(smaller):
+            visit(canonical_material(smaller_name)[0])
+        order.append(canonical)
+
+    visit(canonical_material(name)[0])
+    return order
+
+
+def generate_table(name, directory, workers=None):
+    """
+    Generates the table for the inputted canonical material name into directory, whose tables for
+    every smaller material must already exist. Uses a pool of worker processes unless workers is 1.
+    Returns a dictionary with the material, the number of legal positions, wins, draws and losses,
+    the longest mate in plies and the seconds taken.
+    """
+    start_time = time.perf_counter()
+    workers = workers or os.cpu_count() or 1
+    generator = _Generator(name, directory)
+    material = generator._material
+    size = material.size
+
+    executor = None
+    if workers > 1:
+        executor = ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(name, directory))
+    try:
+        states = bytearray(size)
+        # Positions can have more than 255 non-capturing moves, so they're counted in 16 bits
+        counts = array('H', bytes(2 * size))
+        capture_plies = array('H', bytes(2 * size))
+        # Positions solved at each number of plies to mate, as lists of wins and losses
+        pending = {}
+
+        ranges = [(start, min(start + _CHUNK_SIZE, size)) for start in range(0, size, _CHUNK_SIZE)]
+        if executor:
+            analysed = executor.map(_analyse_chunk, *zip(*ranges))
+        else:
+            analysed = (generator.analyse(start, stop) for start, stop in ranges)
+        for start, chunk_states, chunk_counts, chunk_plies, wins, losses in analysed:
+            stop = start + len(chunk_states)
+            states[start:stop] = chunk_states
+            counts[start:stop] = array('H', chunk_counts)
+            capture_plies[start:stop] = array('H', chunk_plies)
+            for index, plies in wins:
+                pending.setdefault(plies, ([], []))[0].append(index)
+            for index, plies in losses:
+                pending.setdefault(plies, ([], []))[1].append(index)
+
+        # Work back from the positions solved so far one ply at a time. A position becomes a win as
+        # soon as a move reaches a loss, and a loss once every move has been found to reach a win.
+        plies_to_mate = array('H', bytes(2 * size))
+        longest_mate = 0
+        plies = 0
+        while pending:
+            wins, losses = pending.pop(plies, ([], []))
+            solved = {LOSS: array('I'), WIN: array('I')}
+            for result, indexes in ((WIN, wins), (LOSS, losses)):
+                for index in indexes:
+                    if states[index] >= _UNKNOWN:
+                        states[index] = result
+                        plies_to_mate[index] = plies
+                        solved[result].append(index)
+                if solved[result]:
+                    longest_mate = plies
+
+            for result, indexes in solved.items():
+                chunks = [indexes[start:start + _CHUNK_SIZE] for start in range(0, len(indexes), _CHUNK_SIZE)]
+                if executor and len(chunks) > 1:
+                    found = (array('I', data) for data in executor.map(_predecessors_chunk, chunks))
+                else:
+                    found = (generator.predecessors(chunk) for chunk in chunks)
+                for predecessors in found:
+                    if result == LOSS:
+                        next_wins = pending.setdefault(plies + 1, ([], []))[0]
+                        next_wins.extend(index for index in predecessors if states[index] >= _UNKNOWN)
+                        continue
+                    for index in predecessors:
+                        if states[index] != _UNKNOWN:
+                            continue
+                        counts[index] -= 1
+                        if not counts[index]:
+                            loss_plies = max(plies, capture_plies[index]) + 1
+                            pending.setdefault(loss_plies, ([], []))[1].append(index)
+            plies += 1
+    finally:
+        if executor:
+            executor.shutdown()
+
+    # Anything not solved is a draw
+    results = bytearray((size + 3) // 4)
+    totals = [0, 0, 0, 0]
+    for index, state in enumerate(states):
+        result = DRAW if state >= _UNKNOWN else state
+        totals[result] += 1
+        results[index >> 2] |= result << ((index & 3) * 2)
+
+    wide = longest_mate > 255
+    mates = plies_to_mate if wide else array('B', plies_to_mate)
+    if sys.byteorder != 'little':
+        mates.byteswap()
+    path = table_path(directory, material.name)
+    with open(path + '.tmp', 'wb') as table_file:
+        table_file.write(_HEADER.pack(
+            MAGIC, VERSION, _WIDE_MATES if wide else 0, material.name.encode(), size, longest_mate))
+        table_file.write(results)
+        table_file.write(mates.tobytes())
+    os.replace(path + '.tmp', path)
+
+    return {
+        'material': material.name, 'positions': size - totals[ILLEGAL], 'wins': totals[WIN],
+        'draws': totals[DRAW], 'losses': totals[LOSS], 'longest_mate': longest_mate,
+        'seconds': time.perf_counter() - start_time
+    }
+
+
+def generate(name, directory, workers=None):
+    """
+    Generates the table for the inputted material and every smaller table it depends on into directory,
+    skipping tables that already exist. Returns a list of the dictionaries from generate_table.
+    """
+    os.makedirs(directory, exist_ok=True)
+    generated = []
+    for canonical in _dependencies(name):
+        if not os.path.exists(table_path(directory, canonical)):
+            generated.append(generate_table(canonical, directory, workers))
+    return generated
+
+
+def generate_command(args):
+    """Generates the tables named on the command line."""
+    for name in args.materials:
+        for stats in generate(name, args.directory, args.workers):
+            print(f'{stats["material"]}: {stats["positions"]} positions, {stats["wins"]} wins, '
+                  f'{stats["draws"]} draws, {stats["losses"]} losses, longest mate {stats["longest_mate"]} '
+                  f'plies in {stats["seconds"]:.2f} s')
+    return 0
+
+
+def probe_command(args):
+    """Prints the tablebase result and best move for a position given in FEN, and times the lookup."""
+    game = XiangqiGame.from_fen(args.fen)
+    with Tablebases(args.directory) as tablebases:
+        probe = tablebases.probe(game)
+        if probe is None:
+            print('Position is not in the tablebases')
+            return 1
+        result, plies = probe
+        best = tablebases.best_move(game)
+        move = f', best move {"-".join(map(square_to_location, best[0]))}' if best else ''
+        print(f'{result} for {game.get_turn()} in {plies} plies{move}')
+
+        start = time.perf_counter()
+        for _ in range(args.repeat):
+            tablebases.probe(game)
+        print(f'lookup {(time.perf_counter() - start) / args.repeat * 1e6:.2f} us')
+    return 0
+
+
+def main(argv=None):
+    """Parses the command line and generates or probes tablebases."""
+    parser = argparse.ArgumentParser(description='Generate and probe Xiangqi endgame tablebases.')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    generate_parser = commands.add_parser('generate', help='generate the tables for some material')
+    generate_parser.add_argument('materials', nargs='+', help='material such as KR-K or KNP-KA')
+    generate_parser.add_argument('--directory', default='tablebases', help='directory the tables are kept in')
+    generate_parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    generate_parser.set_defaults(run=generate_command)
+
+    probe_parser = commands.add_parser('probe', help='look a position up')
+    probe_parser.add_argument('fen', help='position in Xiangqi FEN')
+    probe_parser.add_argument('--directory', default='tablebases', help='directory the tables are kept in')
+    probe_parser.add_argument('--repeat', type=int, default=100000, help='lookups to time')
+    probe_parser.set_defaults(run=probe_command)
+
+    args = parser.parse_args(argv)
+    return args.run(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,16 @@
+# Description: Helpers shared by the tests.
+
+import random
+
+from XiangqiGame import XiangqiGame
+
+
+def random_game(seed, max_moves=120, **options):
+    """Returns a game with the inputted options after random legal moves chosen with the inputted seed."""
+    rng = random.Random(seed)
+    game = XiangqiGame(**options)
+    for _ in range(rng.randrange(max_moves)):
+        if game.get_game_state() != 'UNFINISHED':
+            break
+        game.make_move(*rng.choice(list(game.legal_moves())))
+    return game
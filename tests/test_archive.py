@@ -0,0 +1,71 @@
+# Description: Tests of writing and reading binary game archives.
+
+import os
+import tempfile
+import unittest
+
+from XiangqiArchive import ArchiveReader, ArchiveWriter
+from XiangqiGame import location_to_square
+
+GAMES = [
+    ([('b1', 'c3'), ('b10', 'c8'), ('h3', 'h10')], 'UNFINISHED'),
+    ([], 'DRAW'),
+    ([('e4', 'e5'), ('e7', 'e6'), ('a1', 'a5')], 'UNFINISHED'),
+]
+
+
+class ArchiveTest(unittest.TestCase):
+
+    """Tests of ArchiveWriter and ArchiveReader."""
+
+    def setUp(self):
+        """Writes the games to an archive in a temporary directory."""
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, 'games.xqar')
+        with ArchiveWriter(self.path) as writer:
+            for moves, result in GAMES:
+                writer.add_game(moves, result)
+
+    def tearDown(self):
+        """Removes the archive."""
+        self.directory.cleanup()
+
+    def test_round_trip(self):
+        """Every game is read back with its result and moves as square numbers."""
+        with ArchiveReader(self.path) as reader:
+            self.assertEqual(len(reader), len(GAMES))
+            for (result, moves), (expected_moves, expected_result) in zip(reader, GAMES):
+                self.assertEqual(result, expected_result)
+                self.assertEqual(list(reader.iter_moves(moves)), [
+                    (location_to_square(current_pos), location_to_square(new_pos))
+                    for current_pos, new_pos in expected_moves
+                ])
+
+    def test_replay(self):
+        """Replaying a game gives the index of its first illegal move, or None if every move is legal."""
+        with ArchiveReader(self.path) as reader:
+            game, illegal_index = reader.replay(0)
+            self.assertIsNone(illegal_index)
+            self.assertEqual(game.get_turn(), 'black')
+            self.assertEqual(reader.replay(2)[1], 2)
+
+    def test_close_with_games_held(self):
+        """The reader closes while games read from it are still held, and the games stay readable."""
+        reader = ArchiveReader(self.path)
+        games = list(reader)
+        first = reader.get_game(0)
+        reader.close()
+        self.assertEqual(len(games), len(GAMES))
+        self.assertEqual(first, games[0])
+        self.assertEqual(len(games[0][1]), 6)
+
+    def test_not_an_archive(self):
+        """Files that aren't archives raise ValueError."""
+        with open(self.path, 'wb') as archive_file:
+            archive_file.write(bytes(64))
+        with self.assertRaises(ValueError):
+            ArchiveReader(self.path)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,51 @@
+# Description: Tests of labelling many positions at once with XiangqiBatch against XiangqiGame.
+
+import random
+import unittest
+
+import numpy as np
+
+from XiangqiBatch import check_attacks, check_game, encode_games, evaluate_batch
+from XiangqiGame import XiangqiGame
+
+
+def random_positions(seed, games, max_moves=80):
+    """Returns a clone of the game after every move of random games played with the inputted seed."""
+    rng = random.Random(seed)
+    positions = []
+    for _ in range(games):
+        game = XiangqiGame()
+        for _ in range(max_moves):
+            if game.get_game_state() != 'UNFINISHED':
+                break
+            game.make_move(*rng.choice(list(game.legal_moves())))
+            positions.append(game.clone())
+    return positions
+
+
+class EvaluateBatchTest(unittest.TestCase):
+
+    """Tests of evaluate_batch."""
+
+    def test_agrees_with_game(self):
+        """Attack maps, check flags and move counts match the game's own, across several chunks."""
+        games = random_positions(1, 10)
+        result = evaluate_batch(*encode_games(games), chunk_size=64)
+        self.assertGreater(result['in_check'].sum(), 0)
+        for index, game in enumerate(games):
+            fen = game.to_fen()
+            self.assertEqual(result['in_check'][index], game.is_in_check(game.get_turn()), msg=fen)
+            self.assertEqual((result['in_check'][index], result['mobility'][index]), check_game(game), msg=fen)
+            self.assertTrue(np.array_equal(result['attacks'][index], check_attacks(game)), msg=fen)
+
+    def test_bad_shapes(self):
+        """Boards and sides of the wrong shapes raise ValueError."""
+        boards, sides = encode_games([XiangqiGame()])
+        with self.assertRaises(ValueError):
+            evaluate_batch(boards[0], sides)
+        with self.assertRaises(ValueError):
+            evaluate_batch(boards, np.zeros(2, dtype=np.int8))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,81 @@
+# Description: Tests of building opening books from recorded games and probing them.
+
+import os
+import tempfile
+import unittest
+
+from XiangqiArchive import ArchiveWriter
+from XiangqiBook import OpeningBook, build_book
+from XiangqiGame import XiangqiGame, location_to_square
+
+# Games stored in the archive with the results they ended in
+ARCHIVED_GAMES = [
+    ([('h3', 'e3'), ('h10', 'g8')], 'RED_WON'),
+    ([('h3', 'e3'), ('b10', 'c8')], 'BLACK_WON'),
+    ([('b1', 'c3')], 'DRAW'),
+]
+
+# Games in a text file, which are replayed for their result, so this one is unfinished
+TEXT_GAMES = 'h3-e3 h10-g8\n'
+
+
+def squares(current_pos, new_pos):
+    """Returns a move in locations as a pair of square numbers."""
+    return location_to_square(current_pos), location_to_square(new_pos)
+
+
+class OpeningBookTest(unittest.TestCase):
+
+    """Tests of build_book and OpeningBook."""
+
+    def setUp(self):
+        """Writes the games to an archive and a text file in a temporary directory."""
+        self.directory = tempfile.TemporaryDirectory()
+        self.paths = [os.path.join(self.directory.name, 'games.xqar'), os.path.join(self.directory.name, 'games.txt')]
+        self.book_path = os.path.join(self.directory.name, 'book.xqbk')
+        with ArchiveWriter(self.paths[0]) as writer:
+            for moves, result in ARCHIVED_GAMES:
+                writer.add_game(moves, result)
+        with open(self.paths[1], 'w') as game_file:
+            game_file.write(TEXT_GAMES)
+
+    def tearDown(self):
+        """Removes the games and the book."""
+        self.directory.cleanup()
+
+    def test_round_trip(self):
+        """Each position's moves are probed with their counts and weights, heaviest first."""
+        self.assertEqual(build_book(self.paths, self.book_path, max_plies=2, min_count=1), (4, 4))
+        game = XiangqiGame()
+        with OpeningBook(self.book_path) as book:
+            self.assertEqual((len(book), book.get_max_plies()), (4, 2))
+            # Red scores 2 for a win, 0 for a loss and 1 for an unfinished game or a draw
+            self.assertEqual(book.probe(game.position_hash()), [
+                (*squares('h3', 'e3'), 3, 3), (*squares('b1', 'c3'), 1, 1),
+            ])
+            self.assertEqual(book.choose_move(game), squares('h3', 'e3'))
+
+            game.make_move('h3', 'e3')
+            self.assertEqual(book.get_moves(game), [(('b10', 'c8'), 1, 2), (('h10', 'g8'), 2, 1)])
+
+            game.make_move('h10', 'g8')
+            self.assertEqual(book.probe(game.position_hash()), [])
+            self.assertIsNone(book.choose_move(game))
+
+    def test_limits(self):
+        """Moves past max_plies or played fewer than min_count times are left out."""
+        self.assertEqual(build_book(self.paths, self.book_path, max_plies=1, min_count=2), (4, 1))
+        with OpeningBook(self.book_path) as book:
+            game = XiangqiGame()
+            self.assertEqual(book.probe(game.position_hash()), [(*squares('h3', 'e3'), 3, 3)])
+            game.make_move('h3', 'e3')
+            self.assertEqual(book.probe(game.position_hash()), [])
+
+    def test_not_a_book(self):
+        """Files that aren't opening books raise ValueError."""
+        with self.assertRaises(ValueError):
+            OpeningBook(self.paths[0])
+
+
+if __name__ == '__main__':
+    unittest.main()
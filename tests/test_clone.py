@@ -0,0 +1,79 @@
+# Description: Tests of copying a XiangqiGame with clone and of trying out moves with snapshot and restore.
+
+import random
+import unittest
+
+from XiangqiGame import XiangqiGame
+
+
+def play_random_moves(game, seed, moves):
+    """Makes up to the inputted number of random legal moves, chosen with the seed, until the game ends."""
+    rng = random.Random(seed)
+    for _ in range(moves):
+        if game.get_game_state() != 'UNFINISHED':
+            break
+        game.make_move(*rng.choice(list(game.legal_moves())))
+
+
+def game_state(game):
+    """Returns everything a game's moves could change, including each piece's list of valid moves."""
+    pieces = sorted(
+        (piece.get_square(), piece.get_rank(), piece.get_color(), tuple(piece.get_valid_squares()))
+        for piece in game.get_pieces()
+    )
+    return (
+        game.to_fen(), game.get_game_state(), game.position_hash(), tuple(game.get_hash_history()),
+        game.get_repetition_count(), pieces, sorted(game.legal_moves()), game.evaluate()
+    )
+
+
+class CloneTest(unittest.TestCase):
+
+    """Tests of clone, snapshot and restore with and without bitboards."""
+
+    def test_clone_is_independent(self):
+        """Moves made on a clone leave the original's board, hashes and move lists as they were."""
+        for bitboards in (False, True):
+            for seed in range(5):
+                game = XiangqiGame(bitboards=bitboards, repetition_limit=3, long_check_rules=True)
+                play_random_moves(game, seed, 30)
+                before = game_state(game)
+
+                copy = game.clone()
+                self.assertEqual(game_state(copy), before)
+                play_random_moves(copy, seed + 100, 30)
+                self.assertEqual(game_state(game), before)
+
+                # The original can still undo every move made before the clone was taken
+                while game.undo_move():
+                    pass
+                self.assertEqual(game.to_fen(), XiangqiGame().to_fen())
+
+    def test_restore(self):
+        """Restoring a snapshot after a line of moves gives back the same position, hash and history."""
+        for bitboards in (False, True):
+            for seed in range(5):
+                game = XiangqiGame(bitboards=bitboards, repetition_limit=3, long_check_rules=True)
+                play_random_moves(game, seed, 30)
+                before = game_state(game)
+                snapshot = game.snapshot()
+
+                for attempt in range(3):
+                    play_random_moves(game, seed * 10 + attempt, 20)
+                    game.restore(snapshot)
+                    self.assertEqual(game_state(game), before)
+
+                # Moves made before the snapshot can still be undone
+                while game.undo_move():
+                    pass
+                self.assertEqual(game.to_fen(), XiangqiGame().to_fen())
+
+    def test_restore_to_another_game(self):
+        """A snapshot can only be restored to the game it was taken from."""
+        game = XiangqiGame()
+        with self.assertRaises(ValueError):
+            game.clone().restore(game.snapshot())
+
+
+if __name__ == '__main__':
+    unittest.main()
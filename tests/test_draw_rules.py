@@ -0,0 +1,119 @@
+# Description: Tests of the opt-in draw rules of XiangqiGame: repetitions, perpetual check under the
+#              long check rulings, the no-capture and ply limits, and undoing moves that ended the game.
+
+import unittest
+
+from XiangqiGame import XiangqiGame
+
+# Both players move a Horse out and back, repeating the starting position every 4 plies
+HORSE_SHUFFLE = [('b1', 'c3'), ('b10', 'c8'), ('c3', 'b1'), ('c8', 'b10')]
+
+# Red checks the black General with a Chariot on every move while the General steps up and back
+PERPETUAL_CHECK_FEN = '4k4/R8/9/9/9/9/9/9/9/3K5 w - - 0 1'
+PERPETUAL_CHECK = [('a9', 'a10'), ('e10', 'e9'), ('a10', 'a9'), ('e9', 'e10')]
+
+# A red Chariot steps between a5 and a4, attacking the black Horse on d5 and then the black Cannon on d4
+# with every move, while the black General steps up and back. The first position has the Soldier on d6
+# defending the Horse and the Horse on e6 defending the Cannon, and the second leaves both undefended.
+DEFENDED_CHASE_FEN = '4k4/9/9/9/3pn4/R2n5/3c5/9/9/5K3 w - - 0 1'
+UNDEFENDED_CHASE_FEN = '4k4/9/9/9/9/R2n5/3c5/9/9/5K3 w - - 0 1'
+CHASE = [('a5', 'a4'), ('e10', 'e9'), ('a4', 'a5'), ('e9', 'e10')]
+
+
+class DrawRulesTest(unittest.TestCase):
+
+    """Tests of the draw rules, which are all off unless asked for."""
+
+    def test_repetition_is_not_a_draw_by_default(self):
+        """Repeating positions doesn't end a game created without draw rules."""
+        game = XiangqiGame()
+        self.assertIsNone(game.apply_moves(HORSE_SHUFFLE * 3))
+        self.assertEqual(game.get_game_state(), 'UNFINISHED')
+        self.assertEqual(game.get_repetition_count(), 4)
+
+    def test_horse_shuffle_draws_on_third_repetition(self):
+        """The game is drawn by the move that reaches the starting position for the third time."""
+        game = XiangqiGame(repetition_limit=3)
+        for move in HORSE_SHUFFLE * 2:
+            self.assertEqual(game.get_game_state(), 'UNFINISHED')
+            self.assertTrue(game.make_move(*move))
+        self.assertEqual(game.get_repetition_count(), 3)
+        self.assertEqual(game.get_game_state(), 'DRAW')
+        self.assertFalse(game.make_move('b1', 'c3'))
+
+    def test_apply_moves_stops_at_the_draw(self):
+        """apply_moves stops at the first move after the game was drawn."""
+        game = XiangqiGame(repetition_limit=3)
+        self.assertEqual(game.apply_moves(HORSE_SHUFFLE * 3), 8)
+        self.assertEqual(game.get_game_state(), 'DRAW')
+
+    def test_undo_restores_unfinished_state(self):
+        """Undoing the drawing move reopens the game, and making it again draws it again."""
+        game = XiangqiGame(repetition_limit=3)
+        game.apply_moves(HORSE_SHUFFLE * 2)
+        self.assertEqual(game.get_game_state(), 'DRAW')
+
+        self.assertTrue(game.undo_move())
+        self.assertEqual(game.get_game_state(), 'UNFINISHED')
+        self.assertEqual(game.get_repetition_count(), 2)
+
+        self.assertTrue(game.make_move(*HORSE_SHUFFLE[-1]))
+        self.assertEqual(game.get_game_state(), 'DRAW')
+
+    def test_undo_to_start_clears_repetitions(self):
+        """Undoing every move leaves the starting position seen once."""
+        game = XiangqiGame(repetition_limit=3, long_check_rules=True)
+        game.apply_moves(HORSE_SHUFFLE * 2)
+        while game.undo_move():
+            pass
+        self.assertEqual(game.get_repetition_count(), 1)
+        self.assertEqual(game.get_game_state(), 'UNFINISHED')
+        self.assertEqual(game.to_fen(), XiangqiGame().to_fen())
+
+    def test_perpetual_check_loses_for_the_checking_side(self):
+        """Under the long check rulings the player giving perpetual check loses the game."""
+        game = XiangqiGame.from_fen(PERPETUAL_CHECK_FEN, repetition_limit=3, long_check_rules=True)
+        for index, move in enumerate(PERPETUAL_CHECK * 2):
+            self.assertTrue(game.make_move(*move))
+            # Every red move gives check
+            self.assertEqual(game.is_in_check('black'), index % 2 == 0)
+        self.assertEqual(game.get_game_state(), 'BLACK_WON')
+
+        self.assertTrue(game.undo_move())
+        self.assertEqual(game.get_game_state(), 'UNFINISHED')
+
+    def test_perpetual_check_draws_without_long_check_rules(self):
+        """Without the long check rulings the same repetition is a draw."""
+        game = XiangqiGame.from_fen(PERPETUAL_CHECK_FEN, repetition_limit=3)
+        self.assertEqual(game.apply_moves(PERPETUAL_CHECK * 3), 8)
+        self.assertEqual(game.get_game_state(), 'DRAW')
+
+    def test_attacking_defended_pieces_is_not_a_chase(self):
+        """Repeatedly attacking defended pieces worth less than the attacker is a draw, not a loss."""
+        game = XiangqiGame.from_fen(DEFENDED_CHASE_FEN, repetition_limit=3, long_check_rules=True)
+        self.assertEqual(game.apply_moves(CHASE * 3), 8)
+        self.assertEqual(game.get_game_state(), 'DRAW')
+
+    def test_perpetual_chase_loses_for_the_chasing_side(self):
+        """Attacking an undefended piece with every move loses under the long check rulings."""
+        game = XiangqiGame.from_fen(UNDEFENDED_CHASE_FEN, repetition_limit=3, long_check_rules=True)
+        self.assertEqual(game.apply_moves(CHASE * 3), 8)
+        self.assertEqual(game.get_game_state(), 'BLACK_WON')
+
+    def test_ply_limit(self):
+        """The game is drawn once the ply limit is reached."""
+        game = XiangqiGame(ply_limit=5)
+        self.assertEqual(game.apply_moves(HORSE_SHUFFLE * 2), 5)
+        self.assertEqual(game.get_game_state(), 'DRAW')
+
+    def test_no_capture_limit(self):
+        """The game is drawn when the limit of plies without a capture is reached."""
+        game = XiangqiGame(no_capture_limit=6)
+        game.apply_moves(HORSE_SHUFFLE)
+        self.assertEqual(game.get_game_state(), 'UNFINISHED')
+        game.apply_moves(HORSE_SHUFFLE[:2])
+        self.assertEqual(game.get_game_state(), 'DRAW')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,60 @@
+# Description: Tests of the XiangqiEngine search.
+
+import unittest
+
+from XiangqiEngine import MATE_SCORE, XiangqiEngine, parallel_search
+from XiangqiEval import EvalWeights
+from XiangqiGame import XiangqiGame
+
+# Red to move has a mate in one with either Chariot, and black the same from the other side of the board
+MATE_IN_ONE = {
+    '3k5/1R7/R8/9/9/9/9/9/9/4K4 w - - 0 1': 'RED_WON',
+    '4k4/9/9/9/9/9/9/r8/1r7/5K3 b - - 0 1': 'BLACK_WON',
+}
+
+
+class EngineTest(unittest.TestCase):
+
+    """Tests of searching positions."""
+
+    def test_mate_in_one(self):
+        """The engine plays a mating move for either player and scores it as mate in one ply."""
+        for fen, state in MATE_IN_ONE.items():
+            game = XiangqiGame.from_fen(fen)
+            result = XiangqiEngine(game).search(max_depth=4)
+            self.assertEqual(result['score'], MATE_SCORE - 1, msg=fen)
+            self.assertEqual(result['pv'], [result['move']], msg=fen)
+            # The search puts the position back
+            self.assertEqual(game.to_fen(), fen)
+
+            self.assertTrue(game.make_move(*result['move']))
+            self.assertEqual(game.get_game_state(), state, msg=fen)
+
+    def test_finished_game(self):
+        """A finished game has no move to search."""
+        game = XiangqiGame.from_fen('3k5/1R7/R8/9/9/9/9/9/9/4K4 w - - 0 1')
+        game.make_move('a8', 'a10')
+        self.assertIsNone(XiangqiEngine(game).search(max_depth=2)['move'])
+
+    def test_game_keeps_its_engine(self):
+        """XiangqiGame.best_move keeps one engine and transposition table between calls, and clones don't share it."""
+        game = XiangqiGame()
+        game.make_move(*game.best_move(50))
+        engine = game._engine
+        self.assertGreater(engine.get_transposition_table().stats()['stores'], 0)
+        game.make_move(*game.best_move(50))
+        self.assertIs(game._engine, engine)
+        self.assertIsNone(game.clone()._engine)
+
+    def test_parallel_search_uses_game_options(self):
+        """The worker processes search with the game's options and weights, scoring like a search in this process."""
+        weights = EvalWeights(material={'Cannon': 2000})
+        game = XiangqiGame(weights=weights, bitboards=True)
+        game.apply_moves([('h3', 'h10'), ('i10', 'h10'), ('b3', 'e3')])
+        self.assertEqual(XiangqiGame(**game.get_options()).get_weights(), weights)
+        expected = XiangqiEngine(game).search(max_depth=2)['score']
+        self.assertEqual(parallel_search(game, 2, workers=2)['score'], expected)
+
+
+if __name__ == '__main__':
+    unittest.main()
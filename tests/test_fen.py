@@ -0,0 +1,68 @@
+# Description: Tests of reading and writing XiangqiGame positions as Xiangqi FEN.
+
+import unittest
+
+from conftest import random_game
+from XiangqiGame import XiangqiGame
+
+START_FEN = 'rnbakabnr/9/1c5c1/p1p1p1p1p/9/9/P1P1P1P1P/1C5C1/9/RNBAKABNR w - - 0 1'
+
+
+class FenTest(unittest.TestCase):
+
+    """Tests of from_fen and to_fen."""
+
+    def test_starting_position(self):
+        """The starting position is written as the standard FEN and read back as the new game."""
+        self.assertEqual(XiangqiGame().to_fen(), START_FEN)
+        game = XiangqiGame.from_fen(START_FEN)
+        self.assertEqual(game.get_position(), XiangqiGame().get_position())
+        self.assertEqual(game.position_hash(), XiangqiGame().position_hash())
+
+    def test_round_trip(self):
+        """Positions from random games keep their pieces, turn, counters, hash and legal moves."""
+        for seed in range(20):
+            game = random_game(seed)
+            copy = XiangqiGame.from_fen(game.to_fen())
+            self.assertEqual(copy.to_fen(), game.to_fen())
+            self.assertEqual(copy.get_position(), game.get_position())
+            self.assertEqual(copy.get_turn(), game.get_turn())
+            self.assertEqual(copy.position_hash(), game.position_hash())
+            self.assertEqual(sorted(copy.legal_moves()), sorted(game.legal_moves()))
+
+    def test_optional_fields(self):
+        """The side to move and the counters are optional, and r is accepted for red."""
+        self.assertEqual(XiangqiGame.from_fen(START_FEN.split()[0]).to_fen(), START_FEN)
+        game = XiangqiGame.from_fen('4k4/9/9/9/9/9/9/9/9/3K4R r')
+        self.assertEqual(game.get_turn(), 'red')
+        self.assertTrue(game.to_fen().endswith(' w - - 0 1'))
+
+    def test_counters(self):
+        """The plies since the last capture and the full move number are kept."""
+        fen = '4k4/9/9/9/9/9/9/9/9/3K4R b - - 7 30'
+        self.assertEqual(XiangqiGame.from_fen(fen).to_fen(), fen)
+
+    def test_alternative_letters(self):
+        """E and H are read as Elephants and Horses."""
+        game = XiangqiGame.from_fen('4k4/9/9/9/9/9/9/9/9/2E1KH3 w')
+        self.assertEqual(game.to_fen().split()[0], '4k4/9/9/9/9/9/9/9/9/2B1KN3')
+
+    def test_lost_position(self):
+        """A position where the player to move is checkmated is already won by the other player."""
+        game = XiangqiGame.from_fen('R2k5/1R7/9/9/9/9/9/9/9/4K4 b')
+        self.assertTrue(game.is_in_check('black'))
+        self.assertEqual(game.get_game_state(), 'RED_WON')
+
+    def test_bad_fen(self):
+        """Malformed FEN raises ValueError."""
+        for fen in (
+            '', '9/9/9', '4k4/9/9/9/9/9/9/9/9/3K4X w', '4k4/9/9/9/9/9/9/9/9/3K6 w',
+            '4k4/9/9/9/9/9/9/9/9/3K4R x', '9/9/9/9/9/9/9/9/9/3K4R w',
+            '4k4/9/9/9/9/9/9/9/9/3K4R w - - 70000 1',
+        ):
+            with self.assertRaises(ValueError, msg=fen):
+                XiangqiGame.from_fen(fen)
+
+
+if __name__ == '__main__':
+    unittest.main()
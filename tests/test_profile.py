@@ -0,0 +1,55 @@
+# Description: Tests of the counts, timings and histograms collected by GameProfiler.
+
+import unittest
+
+from XiangqiGame import XiangqiGame
+from XiangqiProfile import PROFILED_METHODS, GameProfiler
+
+
+class GameProfilerTest(unittest.TestCase):
+
+    """Tests of GameProfiler on its own and on a profiled game."""
+
+    def test_snapshot(self):
+        """Calls are counted, timed and put in the histogram bucket of the next power of two nanoseconds."""
+        calls = []
+        profiler = GameProfiler(lambda name, seconds: calls.append((name, seconds)))
+        profiler.record('make_move', 1000)
+        profiler.record('make_move', 3000)
+        profiler.record('is_in_check', 0)
+
+        snapshot = profiler.snapshot()
+        self.assertEqual(snapshot['make_move'], {
+            'phase': 'move', 'calls': 2, 'total_seconds': 4e-6, 'mean_seconds': 2e-6, 'max_seconds': 3e-6,
+            'histogram': {1024: 1, 4096: 1},
+        })
+        self.assertEqual(snapshot['is_in_check']['histogram'], {1: 1})
+        self.assertEqual(calls, [('make_move', 1e-6), ('make_move', 3e-6), ('is_in_check', 0.0)])
+
+        profiler.reset()
+        self.assertEqual(profiler.snapshot(), {})
+
+    def test_profiled_game(self):
+        """Every profiled call of a game is counted once, and none after profiling is disabled."""
+        game = XiangqiGame()
+        game.enable_profiling()
+        for move in (('b1', 'c3'), ('b10', 'c8'), ('h3', 'h10')):
+            self.assertTrue(game.make_move(*move))
+        self.assertFalse(game.is_in_check('black'))
+
+        snapshot = game.get_profile_stats()
+        self.assertEqual(snapshot['make_move']['calls'], 3)
+        self.assertEqual(snapshot['is_game_over']['calls'], 3)
+        self.assertEqual(snapshot['is_in_check']['calls'], 1)
+        for name, stats in snapshot.items():
+            self.assertEqual(stats['phase'], PROFILED_METHODS[name])
+            self.assertEqual(sum(stats['histogram'].values()), stats['calls'])
+            self.assertLessEqual(stats['max_seconds'], stats['total_seconds'])
+
+        game.disable_profiling()
+        game.make_move('b10', 'a8')
+        self.assertEqual(game.get_profile_stats()['make_move']['calls'], 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
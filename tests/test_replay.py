@@ -0,0 +1,37 @@
+# Description: Tests of validating recorded games with XiangqiReplay.
+
+import unittest
+
+from XiangqiReplay import parse_game, validate_batch, validate_game
+
+
+class ValidateGameTest(unittest.TestCase):
+
+    """Tests of parse_game, validate_game and validate_batch."""
+
+    def test_legal_game(self):
+        """A game of legal moves has no illegal index and keeps its game state."""
+        self.assertEqual(validate_game(parse_game('b1-c3 b10-c8 h3-h10')), (None, 'UNFINISHED'))
+
+    def test_first_illegal_move(self):
+        """The index of the first illegal move is returned, whatever comes after it."""
+        for line, illegal_index in (
+            ('b1-b5', 0),
+            ('b1-c3 b10-c8 c3-c3', 2),
+            ('b1-c3 b10-c8 b1-c3 z9-z9', 2),
+            ('b1-c3 c3-d5', 1),
+            ('b1-c3 b10-c8 h3', 2),
+        ):
+            self.assertEqual(validate_game(parse_game(line))[0], illegal_index, msg=line)
+
+    def test_validate_batch(self):
+        """Moves are counted up to and including the first illegal move of each game."""
+        games, moves, invalid = validate_batch([
+            ('games.txt', 1, 'b1-c3 b10-c8'),
+            ('games.txt', 2, 'b1-c3 e7-e5 h3-h10'),
+        ])
+        self.assertEqual((games, moves, invalid), (2, 4, [('games.txt', 2, 1)]))
+
+
+if __name__ == '__main__':
+    unittest.main()
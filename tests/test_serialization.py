@@ -0,0 +1,115 @@
+# Description: Tests of saving XiangqiGame objects as bytes with to_bytes and from_bytes, and of pickling them.
+
+import pickle
+import unittest
+
+from conftest import random_game
+from XiangqiEval import EvalWeights
+from XiangqiGame import XiangqiGame
+
+
+class BytesTest(unittest.TestCase):
+
+    """Tests of to_bytes and from_bytes."""
+
+    def assertSameGame(self, copy, game):
+        """Checks that two games are in the same position and state."""
+        self.assertEqual(copy.to_fen(), game.to_fen())
+        self.assertEqual(copy.get_game_state(), game.get_game_state())
+        self.assertEqual(copy.position_hash(), game.position_hash())
+        self.assertEqual(copy.evaluate(), game.evaluate())
+        self.assertEqual(sorted(copy.legal_moves()), sorted(game.legal_moves()))
+
+    def test_round_trip(self):
+        """A game saved without history is 98 bytes and loads back in the same position and state."""
+        for seed in range(20):
+            game = random_game(seed)
+            data = game.to_bytes()
+            self.assertEqual(len(data), 98)
+            self.assertSameGame(XiangqiGame.from_bytes(data), game)
+
+    def test_round_trip_with_history(self):
+        """A game saved with history can undo every move back to the starting position."""
+        for seed in range(10):
+            game = random_game(seed, repetition_limit=3, long_check_rules=True)
+            copy = XiangqiGame.from_bytes(game.to_bytes(history=True), repetition_limit=3, long_check_rules=True)
+            self.assertSameGame(copy, game)
+            self.assertEqual(copy.get_hash_history(), game.get_hash_history())
+            self.assertEqual(copy.get_repetition_count(), game.get_repetition_count())
+            while copy.undo_move():
+                pass
+            self.assertEqual(copy.to_fen(), XiangqiGame().to_fen())
+
+    def test_history_from_fen(self):
+        """The history of a game started from FEN starts from that position and its counters."""
+        fen = '4k4/9/9/9/9/9/9/9/9/R4K3 w - - 7 30'
+        game = XiangqiGame.from_fen(fen)
+        game.make_move('a1', 'a10')
+        game.make_move('e10', 'e9')
+        copy = XiangqiGame.from_bytes(game.to_bytes(history=True))
+        self.assertEqual(copy.to_fen(), game.to_fen())
+        copy.undo_move()
+        copy.undo_move()
+        self.assertEqual(copy.to_fen(), fen)
+
+    def test_large_counters(self):
+        """Move counters too large for their fields are saved as the largest they hold."""
+        game = XiangqiGame.from_fen('4k4/9/9/9/9/9/9/9/9/3K4R b - - 65535 65535')
+        game.make_move('e10', 'e9')
+        self.assertTrue(XiangqiGame.from_bytes(game.to_bytes()).to_fen().endswith(' 65535 65535'))
+
+    def test_malformed_bytes(self):
+        """Bytes that weren't written by to_bytes raise ValueError."""
+        data = XiangqiGame().to_bytes()
+        bad_piece = bytearray(data)
+        bad_piece[7 + 40] = 15
+        with_history = random_game(1).to_bytes(history=True)
+        for bad in (
+            b'', bytes(98), data[:50], bytes(bad_piece),
+            with_history[:98 + 91 + 3], with_history[:-1],
+        ):
+            with self.assertRaises(ValueError):
+                XiangqiGame.from_bytes(bad)
+
+
+class PickleTest(unittest.TestCase):
+
+    """Tests of pickling games."""
+
+    def test_pickle(self):
+        """A pickled game keeps its position, options, weights and draw rule counts."""
+        weights = EvalWeights(material={'Horse': 420})
+        for seed in range(10):
+            game = random_game(seed, bitboards=True, weights=weights, repetition_limit=3, long_check_rules=True)
+            copy = pickle.loads(pickle.dumps(game))
+            self.assertEqual(copy.to_fen(), game.to_fen())
+            self.assertEqual(copy.get_game_state(), game.get_game_state())
+            self.assertEqual(copy.get_hash_history(), game.get_hash_history())
+            self.assertEqual(copy.get_repetition_count(), game.get_repetition_count())
+            self.assertEqual(copy.get_weights().get_material('Horse'), 420)
+            self.assertEqual(copy.evaluate(), game.evaluate())
+            self.assertFalse(copy.undo_move())
+
+    def test_pickle_history(self):
+        """With pickle_history the moves made can still be undone after unpickling."""
+        game = random_game(3)
+        game.pickle_history = True
+        copy = pickle.loads(pickle.dumps(game))
+        self.assertEqual(copy.to_fen(), game.to_fen())
+        self.assertEqual(copy.get_hash_history(), game.get_hash_history())
+        while copy.undo_move():
+            pass
+        self.assertEqual(copy.to_fen(), XiangqiGame().to_fen())
+
+    def test_profiled_game(self):
+        """Profiling isn't pickled."""
+        game = XiangqiGame()
+        game.enable_profiling()
+        game.make_move('b1', 'c3')
+        copy = pickle.loads(pickle.dumps(game))
+        self.assertEqual(copy.to_fen(), game.to_fen())
+        self.assertEqual(copy.get_profile_stats(), {})
+
+
+if __name__ == '__main__':
+    unittest.main()
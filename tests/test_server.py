@@ -0,0 +1,93 @@
+# Description: Tests of the GameServer line protocol, driven through a GameClient over a local TCP port.
+
+import asyncio
+import unittest
+
+from XiangqiServer import GameClient, GameServer
+
+# Red's Chariot on a8 mates the black General on d10 by moving to a10, with the other Chariot guarding the ninth rank
+MATE_FEN = '3k5/1R7/R8/9/9/9/9/9/9/4K4 w - - 0 1'
+
+
+class GameServerTest(unittest.IsolatedAsyncioTestCase):
+
+    """Tests of the commands of a server started on a port chosen freely."""
+
+    async def asyncSetUp(self):
+        """Starts a server and connects a client to it."""
+        self.server = GameServer(workers=2)
+        self.port = await self.server.start_tcp(port=0)
+        self.client = await GameClient.connect(port=self.port)
+
+    async def asyncTearDown(self):
+        """Closes the client and the server."""
+        await self.client.close()
+        await self.server.close()
+
+    async def test_game(self):
+        """A game is started, moved in, checked, listed, read back and closed."""
+        game_id = (await self.client.request('NEW'))[0]
+        legal_moves = await self.client.request(f'LEGAL {game_id}')
+        self.assertEqual(len(legal_moves), 44)
+        self.assertIn('b1-c3', legal_moves)
+
+        self.assertEqual(await self.client.request(f'MOVE {game_id} b1 c3'), ['UNFINISHED', 'black'])
+        self.assertEqual(await self.client.request(f'CHECK {game_id}'), ['false'])
+        self.assertEqual(await self.client.request(f'CHECK {game_id} red'), ['false'])
+        state, turn, *fen = await self.client.request(f'STATE {game_id}')
+        self.assertEqual((state, turn), ('UNFINISHED', 'black'))
+        self.assertEqual(' '.join(fen), 'rnbakabnr/9/1c5c1/p1p1p1p1p/9/9/P1P1P1P1P/1CN4C1/9/R1BAKABNR b - - 1 1')
+
+        self.assertEqual(await self.client.request(f'CLOSE {game_id}'), [])
+        with self.assertRaisesRegex(RuntimeError, f'no game {game_id}'):
+            await self.client.request(f'STATE {game_id}')
+
+    async def test_checkmate(self):
+        """A game started from FEN is won by a mating move, which leaves no legal moves."""
+        game_id = (await self.client.request(f'NEW {MATE_FEN}'))[0]
+        self.assertEqual(await self.client.request(f'MOVE {game_id} a8 a10'), ['RED_WON', 'black'])
+        self.assertEqual(await self.client.request(f'CHECK {game_id}'), ['true'])
+        self.assertEqual(await self.client.request(f'LEGAL {game_id}'), [])
+
+    async def test_errors(self):
+        """Illegal moves, unknown games and colors, and bad commands are replied to as errors."""
+        game_id = (await self.client.request('NEW'))[0]
+        for line, message in (
+            (f'MOVE {game_id} b1 b5', 'illegal move b1-b5'),
+            ('MOVE 99 b1 c3', 'no game 99'),
+            (f'CHECK {game_id} green', 'bad color green'),
+            ('NEW 9/9/9', ''),
+            ('JUMP 1', 'unknown command JUMP'),
+        ):
+            with self.assertRaisesRegex(RuntimeError, message, msg=line):
+                await self.client.request(line)
+
+    async def test_argument_counts(self):
+        """Commands with too few or too many arguments are replied to as errors."""
+        game_id = (await self.client.request('NEW'))[0]
+        for line in (
+            f'MOVE {game_id} b1', f'MOVE {game_id} b1 c3 c4', 'STATE', f'STATE {game_id} {game_id}',
+            'CHECK', f'CHECK {game_id} red black', 'LEGAL', 'CLOSE', 'STATS now',
+        ):
+            with self.assertRaisesRegex(RuntimeError, 'wrong number of arguments', msg=line):
+                await self.client.request(line)
+        # The game is untouched by the rejected commands
+        self.assertEqual((await self.client.request(f'STATE {game_id}'))[:2], ['UNFINISHED', 'red'])
+
+    async def test_non_ascii_input(self):
+        """Input that isn't ASCII is replied to as an error, with the bytes echoed as question marks."""
+        reader, writer = await asyncio.open_connection('127.0.0.1', self.port)
+        try:
+            writer.write('MOVE 1 b1 c3\n'.encode('ascii') + 'STATE é\n'.encode('utf-8') + b'\xff\xfe\n')
+            await writer.drain()
+            replies = [(await reader.readline()).decode('ascii') for _ in range(3)]
+        finally:
+            writer.close()
+            await writer.wait_closed()
+        self.assertEqual(replies, ['ERR no game 1\n', 'ERR no game ??\n', 'ERR unknown command ??\n'])
+        # The connection of the client is still served
+        self.assertTrue(await self.client.request('NEW'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,110 @@
+# Description: Tests of generating and probing endgame tablebases against the moves XiangqiGame allows.
+
+import random
+import tempfile
+import unittest
+
+from XiangqiGame import XiangqiGame, square_to_location
+from XiangqiTablebase import Tablebases, generate
+
+FILES = 'abcdefghi'
+RED_PALACE = [f'{file}{rank}' for file in 'def' for rank in (1, 2, 3)]
+BLACK_PALACE = [f'{file}{rank}' for file in 'def' for rank in (8, 9, 10)]
+
+
+def fen_for(pieces, turn):
+    """Takes a dictionary of locations to FEN letters and the side to move and returns the FEN."""
+    rows = []
+    for rank in range(10, 0, -1):
+        row = ''
+        empty = 0
+        for file in FILES:
+            letter = pieces.get(f'{file}{rank}')
+            if letter is None:
+                empty += 1
+                continue
+            row += (str(empty) if empty else '') + letter
+            empty = 0
+        rows.append(row + (str(empty) if empty else ''))
+    return '/'.join(rows) + (' w' if turn == 'red' else ' b')
+
+
+def random_positions(seed, count):
+    """Returns games of a red Chariot and General against a bare black General placed at random."""
+    rng = random.Random(seed)
+    games = []
+    while len(games) < count:
+        red_general, black_general = rng.choice(RED_PALACE), rng.choice(BLACK_PALACE)
+        chariot = f'{rng.choice(FILES)}{rng.randint(1, 10)}'
+        if chariot in (red_general, black_general):
+            continue
+        game = XiangqiGame.from_fen(
+            fen_for({red_general: 'K', black_general: 'k', chariot: 'R'}, rng.choice(('red', 'black'))))
+        # Leave out positions where the player who just moved is in check
+        if not game.is_in_check('black' if game.get_turn() == 'red' else 'red'):
+            games.append(game)
+    return games
+
+
+class TablebaseTest(unittest.TestCase):
+
+    """Tests of a generated KR-K table."""
+
+    @classmethod
+    def setUpClass(cls):
+        """Generates the KR-K table, and the K-K table it depends on, into a temporary directory."""
+        cls.directory = tempfile.TemporaryDirectory()
+        generate('KR-K', cls.directory.name, workers=1)
+        cls.tablebases = Tablebases(cls.directory.name)
+
+    @classmethod
+    def tearDownClass(cls):
+        """Closes the tables and removes the directory."""
+        cls.tablebases.close()
+        cls.directory.cleanup()
+
+    def test_probe_agrees_with_legal_moves(self):
+        """Each result and number of plies to mate follows from the results after every legal move."""
+        for game in random_positions(1, 300):
+            fen = game.to_fen()
+            result, plies = self.tablebases.probe(game)
+            replies = []
+            for move in list(game.legal_moves()):
+                game.make_move(*move)
+                replies.append(self.tablebases.probe(game))
+                game.undo_move()
+
+            losses = [reply_plies for reply_result, reply_plies in replies if reply_result == 'LOSS']
+            if not replies:
+                expected = ('LOSS', 0)
+            elif losses:
+                expected = ('WIN', min(losses) + 1)
+            elif any(reply_result == 'DRAW' for reply_result, _ in replies):
+                expected = ('DRAW', 0)
+            else:
+                expected = ('LOSS', max(reply_plies for _, reply_plies in replies) + 1)
+            self.assertEqual((result, plies if result != 'DRAW' else 0), expected, msg=fen)
+
+    def test_best_move_mates(self):
+        """Playing the best move for both players ends in mate in the number of plies probed."""
+        for game in random_positions(2, 100):
+            fen = game.to_fen()
+            probe = self.tablebases.probe(game)
+            if probe[0] == 'DRAW' or game.get_game_state() != 'UNFINISHED':
+                continue
+            result, plies = probe
+            winner = game.get_turn() if result == 'WIN' else ('black' if game.get_turn() == 'red' else 'red')
+            for _ in range(plies):
+                move, _, _ = self.tablebases.best_move(game)
+                self.assertTrue(game.make_move(*map(square_to_location, move)), msg=fen)
+            self.assertEqual(game.get_game_state(), f'{winner.upper()}_WON', msg=fen)
+            self.assertIsNone(self.tablebases.best_move(game))
+
+    def test_other_material(self):
+        """Positions with material that has no table aren't probed."""
+        self.assertIsNone(self.tablebases.probe(XiangqiGame()))
+        self.assertIsNone(self.tablebases.best_move(XiangqiGame()))
+
+
+if __name__ == '__main__':
+    unittest.main()
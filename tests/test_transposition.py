@@ -0,0 +1,90 @@
+# Description: Tests of the TranspositionTable used by XiangqiEngine: packing entries, the replacement
+#              policies and the hit, miss and collision counters.
+
+import unittest
+
+from XiangqiEngine import EXACT, LOWER_BOUND, MATE_SCORE, UPPER_BOUND, TranspositionTable
+
+
+class TranspositionTableTest(unittest.TestCase):
+
+    """Tests of storing and probing search results."""
+
+    def test_round_trip(self):
+        """Every field of an entry is read back as stored, with large depths stored as 255."""
+        table = TranspositionTable(1)
+        entries = [
+            (1, 0, EXACT, 0, None),
+            (2, 5, LOWER_BOUND, MATE_SCORE - 3, (0, 89)),
+            (3, 255, UPPER_BOUND, -MATE_SCORE - 1, (89, 0)),
+            (4, 12, EXACT, -1234, (40, 49)),
+        ]
+        for key, depth, bound, score, move in entries:
+            table.store(key, depth, bound, score, move)
+        for key, depth, bound, score, move in entries:
+            self.assertEqual(table.probe(key), (depth, bound, score, move))
+
+        table.store(5, 300, EXACT, 7, (1, 2))
+        self.assertEqual(table.probe(5), (255, EXACT, 7, (1, 2)))
+
+    def test_same_key_is_replaced(self):
+        """A new result for a stored position replaces the old one in place, whatever its depth."""
+        table = TranspositionTable(1)
+        table.store(7, 9, EXACT, 100, (1, 2))
+        table.store(7, 1, UPPER_BOUND, -5, None)
+        self.assertEqual(table.probe(7), (1, UPPER_BOUND, -5, None))
+        self.assertEqual(table.stats()['used'], 1)
+
+    def test_depth_policy(self):
+        """The first slot of a bucket keeps the deepest result and the second slot is always replaced."""
+        # With no memory to spare the table is a single bucket, so every key collides
+        table = TranspositionTable(0, 'depth')
+        table.store(1, 5, EXACT, 0, None)
+        table.store(2, 3, EXACT, 0, None)
+        table.store(3, 4, EXACT, 0, None)
+        self.assertIsNotNone(table.probe(1))
+        self.assertIsNone(table.probe(2))
+        self.assertIsNotNone(table.probe(3))
+
+        table.store(4, 6, EXACT, 0, None)
+        self.assertIsNotNone(table.probe(4))
+        self.assertIsNotNone(table.probe(1))
+        self.assertIsNone(table.probe(3))
+        self.assertEqual(table.stats()['overwrites'], 2)
+
+    def test_always_policy(self):
+        """New results always take the first slot, pushing the old first slot into the second."""
+        table = TranspositionTable(0, 'always')
+        table.store(1, 5, EXACT, 0, None)
+        table.store(2, 3, EXACT, 0, None)
+        table.store(3, 1, EXACT, 0, None)
+        self.assertIsNone(table.probe(1))
+        self.assertIsNotNone(table.probe(2))
+        self.assertIsNotNone(table.probe(3))
+
+    def test_counters(self):
+        """Probes count as hits or misses, and misses on a bucket holding other keys as collisions."""
+        table = TranspositionTable(0)
+        self.assertIsNone(table.probe(1))
+        table.store(1, 2, EXACT, 0, None)
+        table.probe(1)
+        table.probe(1)
+        table.probe(2)
+        stats = table.stats()
+        self.assertEqual((stats['hits'], stats['misses'], stats['collisions']), (2, 2, 1))
+        self.assertEqual((stats['entries'], stats['used'], stats['stores']), (2, 1, 1))
+
+        table.clear()
+        stats = table.stats()
+        self.assertEqual((stats['hits'], stats['misses'], stats['used'], stats['entries']), (0, 0, 0, 2))
+
+    def test_size(self):
+        """The table uses the largest power of two number of buckets that fits, and checks its policy."""
+        self.assertEqual(TranspositionTable(1).get_size_bytes(), 1024 * 1024)
+        self.assertEqual(TranspositionTable(1.5).get_size_bytes(), 1024 * 1024)
+        with self.assertRaises(ValueError):
+            TranspositionTable(1, 'newest')
+
+
+if __name__ == '__main__':
+    unittest.main()